@@ -0,0 +1,405 @@
+"""End-to-end benchmarks for the poller.
+
+The suite talks to the local :mod:`~vevor_eml3500_24l_rs232_wifi.simulator`
+over TCP and publishes into an in-process MQTT stand-in, so it needs neither
+an inverter nor a broker. It measures:
+
+* ``poll_cycle``: wall time of the first (full) and the steady (live)
+  :func:`poller.poll_cycle` and the latency of every Modbus transaction
+  within them,
+* ``decode``: block decoding, decoding every entity from the register
+  image, :func:`modbus_client.decode_words`,
+  :func:`poller._decode_value` and :func:`poller.add_derived_power_values`
+  throughput,
+* ``publish``: :func:`poller.publish_discovery` and the per-cycle cost of
+  the :class:`~vevor_eml3500_24l_rs232_wifi.state_publisher.StatePublisher`,
+  for a full refresh and for change-driven cycles.
+
+Results are written as JSON so runs of different add-on versions can be
+compared::
+
+    python -m benchmarks.run --iterations 50 --output bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import UTC, datetime
+import json
+import math
+import platform
+from pathlib import Path
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi import poller  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.decode_plan import BlockDecoder  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    TRANSPORT_PYMODBUS,
+    TRANSPORTS,
+    ModbusRTUOverTCPClient,
+    RegisterSnapshot,
+    decode_words,
+)
+from vevor_eml3500_24l_rs232_wifi.poll_schedule import PollSchedule  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.read_planner import plan_reads  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.register_image import RegisterImage  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.simulator import InverterSimulator  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.state_publisher import StatePublisher  # noqa: E402
+
+CONFIG_YAML = (
+    Path(__file__).resolve().parents[1] / "vevor_eml3500_24l_rs232_wifi" / "config.yaml"
+)
+
+PREFIX = "vevor_eml3500"
+
+# Plausible daytime readings so decoders and derived values see real data.
+SIMULATED_VALUES: Dict[str, float | str] = {
+    "Working mode": 2,
+    "Mains voltage effective value": 230.4,
+    "Mains frequency": 50.0,
+    "Average mains power": 450,
+    "Effective value of inverter voltage": 230.0,
+    "Effective value of output voltage": 230.1,
+    "Effective value of output current": 1.9,
+    "Output frequency": 50.0,
+    "Output active power": 420,
+    "Output apparent power": 450,
+    "Average battery voltage": 52.4,
+    "Average battery current": -3.2,
+    "Average battery power": -168,
+    "Average PV voltage": 310.5,
+    "Average PV current": 2.1,
+    "Average PV power": 650,
+    "Average PV charging power": 230,
+    "Percent of load": 12,
+    "DCDC temperature": 41,
+    "Inverter temperature": 38,
+    "Battery percentage": 76,
+    "Power flow status": 0b1010_0101,
+}
+
+
+class MQTTStandIn:
+    """Record publishes the way paho would serialise them, without a broker."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.payload_bytes = 0
+        self.retained: Dict[str, bytes] = {}
+
+    def publish(
+        self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False
+    ) -> None:
+        if payload is None:
+            data = b""
+        elif isinstance(payload, (bytes, bytearray)):
+            data = bytes(payload)
+        else:
+            data = str(payload).encode("utf-8")
+        self.messages += 1
+        self.payload_bytes += len(topic) + len(data)
+        if retain:
+            self.retained[topic] = data
+
+    def subscribe(self, topic: str, qos: int = 0) -> None:
+        return None
+
+    def reset(self) -> None:
+        self.messages = 0
+        self.payload_bytes = 0
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """Summarise *samples* (seconds) in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        index = min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)
+        return ordered[max(index, 0)] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "min_ms": ordered[0] * 1000,
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def throughput(func: Callable[[], int], iterations: int) -> Dict[str, float]:
+    """Run *func* (returning the number of items it handled) and time it."""
+    items = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        items += func()
+    elapsed = time.perf_counter() - start
+    return {
+        "iterations": iterations,
+        "items": items,
+        "seconds": elapsed,
+        "items_per_second": items / elapsed if elapsed else float("inf"),
+    }
+
+
+def _due(schedule: PollSchedule, everything: bool) -> PollSchedule:
+    """Return *schedule*, with every entity due again for *everything*."""
+    if everything:
+        for slug in schedule.classes:
+            schedule.invalidate(slug)
+    return schedule
+
+
+async def bench_poll_cycle(
+    iterations: int,
+    baudrate: Optional[int],
+    turnaround: float,
+    transport: str,
+) -> tuple[Dict[str, Any], RegisterSnapshot]:
+    """Time the full and live-only ``poll_cycle`` against the simulator."""
+    # The two cycles the add-on runs: the first one reads everything the
+    # schedule polls, the steady one what is due once that was read.
+    # Write-only command registers are left out of the schedule.
+    schedule = PollSchedule(poller.polled_classes(poller.POLL_CLASSES))
+    full = schedule.due()
+    schedule.mark_read(full)
+    live = schedule.due()
+    results: Dict[str, Any] = {
+        "transport": transport,
+        "baudrate": baudrate,
+        "turnaround_s": turnaround,
+    }
+    transactions: List[float] = []
+    last = full_snapshot = RegisterSnapshot()
+    async with InverterSimulator(baudrate=baudrate, turnaround=turnaround) as sim:
+        sim.set_values(SIMULATED_VALUES)
+        client = ModbusRTUOverTCPClient(
+            "127.0.0.1", port=sim.port, read_timeout=5.0, transport=transport
+        )
+        read_registers = client.read_registers
+
+        async def recording(names: Iterable[str], **kwargs: Any) -> RegisterSnapshot:
+            nonlocal last
+            last = await read_registers(names, **kwargs)
+            transactions.extend(t.duration for t in last.transactions)
+            return last
+
+        client.read_registers = recording  # type: ignore[method-assign]
+        try:
+            for name, slugs in (("full", full), ("live", live)):
+                # Warm up the connection and the cached read plan first.
+                await poller.poll_cycle(client, _due(schedule, name == "full"))
+                cycles: List[float] = []
+                transactions.clear()
+                requests = sim.requests
+                for _ in range(iterations):
+                    _due(schedule, name == "full")
+                    start = time.perf_counter()
+                    await poller.poll_cycle(client, schedule)
+                    cycles.append(time.perf_counter() - start)
+                results[name] = {
+                    "entities": len(slugs),
+                    "registers": len(last.values),
+                    "transactions_per_cycle": len(last.transactions),
+                    "requests_per_cycle": (sim.requests - requests) / iterations,
+                    "cycle": percentiles(cycles),
+                    "transaction": percentiles(transactions),
+                }
+                if name == "full":
+                    full_snapshot = last
+        finally:
+            await client.close()
+    return results, full_snapshot
+
+
+def bench_decode(iterations: int, snapshot: RegisterSnapshot) -> Dict[str, Any]:
+    """Measure decoding throughput on the words of a real snapshot."""
+    registers = poller.RAW_REGISTERS
+    raw_items = [
+        (registers[name], words)
+        for name, words in snapshot.raw.items()
+        if name in registers
+    ]
+    decoded_items = [
+        (info, snapshot.values[info["register"]])
+        for info in poller.REGISTER_MAP.values()
+        if info["register"] in snapshot.values
+    ]
+    data = _decoded_data(snapshot)
+    blocks = []
+    for block in plan_reads(reg for reg, _ in raw_items):
+        words = [0] * block.count
+        for reg in block.registers:
+            offset = reg.address - block.address
+            words[offset : offset + reg.count] = snapshot.raw[reg.name]
+        blocks.append((BlockDecoder(block), words))
+
+    image = RegisterImage()
+    for reg, words in raw_items:
+        image.update(reg.address, words, monotonic=1.0)
+
+    def run_entity_values() -> int:
+        return len(poller.entity_values(image))
+
+    def run_decode_blocks() -> int:
+        for decoder, words in blocks:
+            decoder.decode(words)
+        return len(raw_items)
+
+    def run_decode_words() -> int:
+        for reg, words in raw_items:
+            decode_words(reg, words)
+        return len(raw_items)
+
+    def run_decode_value() -> int:
+        for info, value in decoded_items:
+            poller._decode_value(info, value)
+        return len(decoded_items)
+
+    def run_derived() -> int:
+        poller.add_derived_power_values(dict(data))
+        return 1
+
+    return {
+        "decode_blocks": throughput(run_decode_blocks, iterations),
+        "entity_values": throughput(run_entity_values, iterations),
+        "decode_words": throughput(run_decode_words, iterations),
+        "decode_value": throughput(run_decode_value, iterations),
+        "add_derived_power_values": throughput(run_derived, iterations),
+    }
+
+
+def _decoded_data(snapshot: RegisterSnapshot) -> Dict[str, Any]:
+    return {
+        slug: poller._decode_value(info, snapshot.values[info["register"]])
+        for slug, info in poller.REGISTER_MAP.items()
+        if info["register"] in snapshot.values
+    }
+
+
+def bench_publish(iterations: int, snapshot: RegisterSnapshot) -> Dict[str, Any]:
+    """Measure discovery and per-cycle publish cost into the stand-in."""
+    mqtt = MQTTStandIn()
+    data = _decoded_data(snapshot)
+    poller.add_derived_power_values(data)
+    data["last_update"] = datetime.now(UTC).isoformat()
+
+    publisher = StatePublisher(mqtt, PREFIX, poller.ALL_SENSORS)
+    publisher.publish(data)
+    grouped = StatePublisher(
+        mqtt,
+        PREFIX,
+        poller.ALL_SENSORS,
+        groups=poller.state_groups(poller.POLL_CLASSES),
+    )
+
+    results: Dict[str, Any] = {}
+    for name, func in (
+        ("discovery", lambda: poller.publish_discovery(mqtt, PREFIX)),
+        (
+            "discovery_device",
+            lambda: poller.publish_discovery(
+                mqtt, PREFIX, mode=poller.DISCOVERY_DEVICE
+            ),
+        ),
+        # Full refresh of every per-entity state topic.
+        ("state", lambda: publisher.publish(data, force=True)),
+        # Full refresh of the grouped JSON state topics.
+        ("state_grouped", lambda: grouped.publish(data, force=True)),
+        # Steady state between heartbeats with unchanged readings.
+        ("state_change_driven", lambda: publisher.publish(data)),
+    ):
+        mqtt.reset()
+        func()
+        messages, payload_bytes = mqtt.messages, mqtt.payload_bytes
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        results[name] = {
+            "messages": messages,
+            "bytes": payload_bytes,
+            "call": percentiles(samples),
+        }
+    return results
+
+
+def addon_version() -> str:
+    match = re.search(r'^version:\s*"?([^"\n]+)"?', CONFIG_YAML.read_text(), re.M)
+    return match.group(1) if match else "unknown"
+
+
+async def run_benchmarks(
+    iterations: int = 20,
+    decode_iterations: int = 200,
+    baudrate: Optional[int] = 9600,
+    turnaround: float = 0.02,
+    transport: str = TRANSPORT_PYMODBUS,
+) -> Dict[str, Any]:
+    """Run every benchmark and return the JSON-serialisable results."""
+    poll, snapshot = await bench_poll_cycle(iterations, baudrate, turnaround, transport)
+    return {
+        "version": addon_version(),
+        "timestamp": datetime.now(UTC).isoformat().replace("+00:00", "Z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "poll_cycle": poll,
+        "decode": bench_decode(decode_iterations, snapshot),
+        "publish": bench_publish(decode_iterations, snapshot),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="VEVOR EML3500 poller benchmarks")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--decode-iterations", type=int, default=200)
+    parser.add_argument(
+        "--baudrate",
+        type=int,
+        default=9600,
+        help="Serial baud rate mimicked by the simulator (0 disables it)",
+    )
+    parser.add_argument("--turnaround", type=float, default=0.02)
+    parser.add_argument("--transport", choices=TRANSPORTS, default=TRANSPORT_PYMODBUS)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark-results.json"),
+        help="Where to write the JSON results ('-' for stdout)",
+    )
+    args = parser.parse_args(argv)
+    results = asyncio.run(
+        run_benchmarks(
+            iterations=args.iterations,
+            decode_iterations=args.decode_iterations,
+            baudrate=args.baudrate or None,
+            turnaround=args.turnaround,
+            transport=args.transport,
+        )
+    )
+    text = json.dumps(results, indent=2)
+    if str(args.output) == "-":
+        print(text)
+    else:
+        args.output.write_text(text + "\n")
+        for name in ("full", "live"):
+            cycle = results["poll_cycle"][name]["cycle"]
+            print(
+                f"{name} poll cycle: p50 {cycle['p50_ms']:.1f} ms,"
+                f" p90 {cycle['p90_ms']:.1f} ms"
+            )
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("paho")
+pytest.importorskip("pymodbus")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.run import MQTTStandIn, percentiles, run_benchmarks  # noqa: E402
+
+
+def test_percentiles_in_milliseconds():
+    stats = percentiles([0.001 * i for i in range(1, 101)])
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == pytest.approx(50)
+    assert stats["p99_ms"] == pytest.approx(99)
+    assert percentiles([]) == {"count": 0}
+
+
+def test_mqtt_stand_in_counts_payload_bytes():
+    mqtt = MQTTStandIn()
+    mqtt.publish("a/b", "12", retain=True)
+    mqtt.publish("a/c", None)
+    assert mqtt.messages == 2
+    assert mqtt.payload_bytes == len("a/b") + 2 + len("a/c")
+    assert mqtt.retained == {"a/b": b"12"}
+
+
+@pytest.mark.asyncio
+async def test_run_benchmarks_produces_json_results():
+    results = await run_benchmarks(
+        iterations=1, decode_iterations=1, baudrate=None, turnaround=0.0
+    )
+    json.dumps(results)
+    assert results["poll_cycle"]["full"]["transactions_per_cycle"] > 0
+    assert results["poll_cycle"]["live"]["cycle"]["count"] == 1
+    assert results["decode"]["decode_words"]["items"] > 0
+    assert results["publish"]["discovery"]["messages"] > 0
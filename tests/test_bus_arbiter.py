@@ -0,0 +1,60 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.bus_arbiter import (  # noqa: E402
+    BusArbiter,
+    Priority,
+)
+
+
+@pytest.mark.asyncio
+async def test_arbiter_serves_waiters_by_priority():
+    arbiter = BusArbiter()
+    order = []
+
+    async def transaction(name, priority):
+        async with arbiter.transaction(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async with arbiter.transaction(Priority.POLL):
+        tasks = [
+            asyncio.create_task(transaction("poll", Priority.POLL)),
+            asyncio.create_task(transaction("refresh", Priority.REFRESH)),
+            asyncio.create_task(transaction("write", Priority.WRITE)),
+        ]
+        await asyncio.sleep(0)
+        assert arbiter.queue_depth == 3
+    await asyncio.gather(*tasks)
+
+    assert order == ["write", "refresh", "poll"]
+    assert arbiter.queue_depth == 0
+    assert arbiter.stats[Priority.WRITE].count == 1
+    assert arbiter.stats[Priority.POLL].count == 2
+
+
+@pytest.mark.asyncio
+async def test_arbiter_skips_cancelled_waiters():
+    arbiter = BusArbiter()
+    ran = []
+
+    async def transaction(name):
+        async with arbiter.transaction(Priority.WRITE):
+            ran.append(name)
+
+    async with arbiter.transaction():
+        cancelled = asyncio.create_task(transaction("cancelled"))
+        kept = asyncio.create_task(transaction("kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+    await kept
+
+    assert ran == ["kept"]
+    async with arbiter.transaction() as wait:
+        assert wait < 1
@@ -0,0 +1,93 @@
+import random
+import sys
+from dataclasses import replace
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.decode_plan import (  # noqa: E402
+    BlockDecoder,
+    make_scaler,
+    register_decoder,
+    scale_exponent,
+)
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    DEFAULT_REGISTER_CSV,
+    load_register_definitions,
+)
+from vevor_eml3500_24l_rs232_wifi.read_planner import plan_reads  # noqa: E402
+
+
+def decimal_decode(reg, words):
+    """Reference implementation of the previous Decimal based decoding."""
+    scale = Decimal(str(reg.scale))
+    if reg.data_format == "ULong":
+        return float(Decimal((words[0] << 16) + words[1]) * scale)
+    if reg.data_format == "UInt":
+        return float(Decimal(words[0]) * scale)
+    if reg.data_format == "Int":
+        raw = words[0]
+        return float(Decimal(raw - 0x10000 if raw & 0x8000 else raw) * scale)
+    if reg.data_format in {"ASC", "ASCII"}:
+        data = b"".join(r.to_bytes(2, "big") for r in words)
+        return data.decode(errors="ignore").rstrip("\x00")
+    if reg.count > 1:
+        return [float(Decimal(val) * scale) for val in words]
+    return float(Decimal(words[0]) * scale)
+
+
+@pytest.mark.parametrize(
+    "scale, expected", [(0.1, (1, -1)), (0.01, (1, -2)), (1.0, (1, 0)), (0.5, (5, -1))]
+)
+def test_scale_exponent(scale, expected):
+    assert scale_exponent(scale) == expected
+
+
+def test_scaler_matches_decimal_for_every_raw_value():
+    for scale in (0.1, 0.01, 0.5, 1.0, 10.0):
+        scaler = make_scaler(scale)
+        for raw in range(-0x8000, 0x10000, 7):
+            assert scaler(raw) == float(Decimal(raw) * Decimal(str(scale)))
+
+
+def test_block_decoder_matches_reference_on_full_map():
+    registers = load_register_definitions(DEFAULT_REGISTER_CSV)
+    readable = [r for r in registers.values() if "R" in r.access]
+    rng = random.Random(1234)
+    for block in plan_reads(readable):
+        words = [rng.randrange(0x10000) for _ in range(block.count)]
+        for reg in block.registers[:3]:
+            if reg.data_format in {"ASC", "ASCII"}:
+                text = b"EML3500-24L\x00".ljust(reg.count * 2, b"\x00")
+                offset = reg.address - block.address
+                words[offset : offset + reg.count] = [
+                    int.from_bytes(text[i : i + 2], "big")
+                    for i in range(0, len(text), 2)
+                ]
+        values = BlockDecoder(block).decode(words)
+        for reg in block.registers:
+            expected = decimal_decode(reg, block.slice(words, reg))
+            assert values[reg.name] == expected, reg.name
+            assert register_decoder(reg)(block.slice(words, reg)) == expected
+
+
+def test_block_decoder_uses_single_struct_for_contiguous_block():
+    registers = load_register_definitions(DEFAULT_REGISTER_CSV)
+    live = [r for r in registers.values() if 201 <= r.address <= 236]
+    (block,) = plan_reads(live)
+    decoder = BlockDecoder(block)
+    assert not decoder.extra
+    assert decoder.struct.size == block.count * 2
+
+
+@pytest.mark.parametrize(
+    "data_format, count", [("ULong", 1), ("ULong", 4), ("UInt", 0)]
+)
+def test_register_decoder_rejects_unsupported_width(data_format, count):
+    registers = load_register_definitions(DEFAULT_REGISTER_CSV)
+    reg = replace(next(iter(registers.values())), data_format=data_format, count=count)
+    with pytest.raises(ValueError):
+        register_decoder(reg)
@@ -0,0 +1,176 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.discovery_cache import DiscoveryCache  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.poller import (  # noqa: E402
+    DISCOVERY_AUTO,
+    DISCOVERY_DEVICE,
+    DISCOVERY_ENTITY,
+    POLL_CLASSES,
+    build_discovery_messages,
+    discovery_config_topics,
+    publish_discovery,
+    resolve_discovery_mode,
+    state_groups,
+)
+
+
+class DummyClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, retain=False):
+        self.published.append((topic, payload, retain))
+
+
+def test_publish_skips_unchanged_payloads(tmp_path):
+    path = tmp_path / "discovery_cache.json"
+    client = DummyClient()
+    messages = {"a/config": '{"name": "A"}', "b/config": '{"name": "B"}'}
+
+    assert DiscoveryCache(path).publish(client, messages) == 2
+    assert all(retain for _, _, retain in client.published)
+
+    client.published.clear()
+    cache = DiscoveryCache(path)
+    assert cache.publish(client, messages) == 0
+    assert client.published == []
+
+    messages["b/config"] = '{"name": "B2"}'
+    assert cache.publish(client, messages) == 1
+    assert client.published == [("b/config", '{"name": "B2"}', True)]
+
+
+def test_publish_force_and_removed_topics(tmp_path):
+    path = tmp_path / "discovery_cache.json"
+    client = DummyClient()
+    cache = DiscoveryCache(path)
+    cache.publish(client, {"a/config": "1", "b/config": "2"})
+
+    client.published.clear()
+    assert cache.publish(client, {"a/config": "1"}, force=True) == 2
+    assert ("a/config", "1", True) in client.published
+    assert ("b/config", "", True) in client.published
+    assert set(json.loads(path.read_text())["hashes"]) == {"a/config"}
+
+
+def test_forced_publish_limited_to_prefix(tmp_path):
+    client = DummyClient()
+    cache = DiscoveryCache(tmp_path / "discovery_cache.json")
+    cache.publish(client, {"homeassistant/a/config": "1", "p/attributes": "2"})
+
+    client.published.clear()
+    messages = {"homeassistant/a/config": "1", "p/attributes": "2"}
+    sent = cache.publish(client, messages, force=True, force_prefix="homeassistant/")
+    assert sent == 1
+    assert client.published == [("homeassistant/a/config", "1", True)]
+
+
+def test_home_assistant_birth_republishes_one_device_message(tmp_path):
+    cache = DiscoveryCache(tmp_path / "discovery_cache.json")
+    client = DummyClient()
+    publish_discovery(client, "test", cache, mode=DISCOVERY_DEVICE)
+
+    client.published.clear()
+    sent = publish_discovery(
+        client, "test", cache, force=True, mode=DISCOVERY_DEVICE, configs_only=True
+    )
+    assert sent == 1
+    assert client.published[0][0] == "homeassistant/device/test/config"
+
+
+def test_unreadable_cache_is_ignored(tmp_path):
+    path = tmp_path / "discovery_cache.json"
+    path.write_text("not json")
+    assert DiscoveryCache(path).hashes == {}
+
+
+def test_publish_discovery_uses_cache(tmp_path):
+    cache = DiscoveryCache(tmp_path / "discovery_cache.json")
+    messages = build_discovery_messages("test")
+    client = DummyClient()
+
+    assert publish_discovery(client, "test", cache) == len(messages)
+    client.published.clear()
+    assert publish_discovery(client, "test", cache) == 0
+    assert publish_discovery(client, "test", cache, force=True) == len(messages)
+
+
+def test_device_mode_publishes_single_config():
+    messages = build_discovery_messages("test", DISCOVERY_DEVICE)
+    configs = [t for t in messages if t.startswith("homeassistant/")]
+    assert configs == ["homeassistant/device/test/config"]
+    payload = json.loads(messages[configs[0]])
+    assert payload["device"]["identifiers"] == ["test"]
+    assert payload["origin"]["name"]
+    components = payload["components"]
+    entity = build_discovery_messages("test")
+    assert len(components) == len(
+        [t for t, p in entity.items() if t.endswith("/config") and p]
+    )
+    assert components["test_output_priority"]["platform"] == "select"
+    assert components["test_last_update"]["device_class"] == "timestamp"
+    assert all("device" not in config for config in components.values())
+    assert not [t for t in messages if t.endswith("/attributes")][1:]
+    attributes = json.loads(messages["test/attributes"])
+    config = components["test_output_priority"]
+    assert config["json_attributes_topic"] == "test/attributes"
+    assert config["json_attributes_template"] == (
+        "{{ value_json.output_priority | tojson }}"
+    )
+    assert attributes["output_priority"]["slug"] == "output_priority"
+
+
+def test_switching_mode_migrates_entities(tmp_path):
+    cache = DiscoveryCache(tmp_path / "discovery_cache.json")
+    client = DummyClient()
+    publish_discovery(client, "test", cache)
+    entity_topics = discovery_config_topics("test", DISCOVERY_ENTITY)
+
+    client.published.clear()
+    publish_discovery(client, "test", cache, mode=DISCOVERY_DEVICE)
+    topics = [topic for topic, _, _ in client.published]
+    device_index = topics.index("homeassistant/device/test/config")
+    for topic in entity_topics:
+        first = topics.index(topic)
+        assert first < device_index
+        assert json.loads(client.published[first][1]) == {"migrate_discovery": True}
+        last = len(topics) - 1 - topics[::-1].index(topic)
+        assert last > device_index and client.published[last][1] == ""
+
+    client.published.clear()
+    publish_discovery(client, "test", cache, mode=DISCOVERY_DEVICE)
+    assert client.published == []
+
+
+@pytest.mark.parametrize(
+    "mode, version, expected",
+    [
+        (DISCOVERY_AUTO, "2025.8.3", DISCOVERY_DEVICE),
+        (DISCOVERY_AUTO, "2024.12.0", DISCOVERY_DEVICE),
+        (DISCOVERY_AUTO, "2024.11.3", DISCOVERY_ENTITY),
+        (DISCOVERY_AUTO, None, DISCOVERY_ENTITY),
+        (DISCOVERY_AUTO, "landingpage", DISCOVERY_ENTITY),
+        (DISCOVERY_ENTITY, "2025.8.3", DISCOVERY_ENTITY),
+        (DISCOVERY_DEVICE, None, DISCOVERY_DEVICE),
+    ],
+)
+def test_resolve_discovery_mode(mode, version, expected):
+    assert resolve_discovery_mode(mode, version) == expected
+
+
+def test_grouped_discovery_uses_value_templates():
+    groups = state_groups(POLL_CLASSES)
+    messages = build_discovery_messages("test", groups=groups)
+    topic = "homeassistant/sensor/test_grid_import_energy/config"
+    payload = json.loads(messages[topic])
+    assert payload["state_topic"] == "test/state/energy"
+    assert payload["value_template"] == "{{ value_json.grid_import_energy }}"
+    payload = json.loads(messages["homeassistant/sensor/test_last_update/config"])
+    assert payload["state_topic"] == "test/state/telemetry"
+    assert set(groups.values()) == {"telemetry", "settings", "energy", "diagnostics"}
@@ -0,0 +1,89 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.energy_journal import EnergyJournal  # noqa: E402
+
+SLUGS = ["pv_energy", "pv_energy_today"]
+
+
+def _journal(tmp_path, compact_every=10):
+    return EnergyJournal(
+        tmp_path / "energy_state.json",
+        SLUGS,
+        ["pv_energy_today"],
+        compact_every=compact_every,
+    )
+
+
+def _state(total, today, date="2026-01-01"):
+    return {"pv_energy": total, "pv_energy_today": today, "daily_date": date}
+
+
+def test_journal_replay_restores_counters(tmp_path):
+    journal = _journal(tmp_path)
+    journal.load()
+    journal.flush(_state(1.0, 1.0))
+    journal.flush(_state(1.5, 1.5))
+    journal.flush(_state(1.5, 1.5))  # unchanged: nothing appended
+    lines = journal.journal_path.read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["inc"] == {"pv_energy": 0.5, "pv_energy_today": 0.5}
+    assert not journal.snapshot_path.exists()
+
+    state = _journal(tmp_path).load()
+    assert state == _state(1.5, 1.5)
+
+
+def test_day_change_resets_daily_counters_on_replay(tmp_path):
+    journal = _journal(tmp_path)
+    journal.load()
+    journal.flush(_state(2.0, 2.0))
+    journal.flush(_state(2.25, 0.25, date="2026-01-02"))
+
+    state = _journal(tmp_path).load()
+    assert state == _state(2.25, 0.25, date="2026-01-02")
+
+
+def test_compaction_writes_snapshot_and_truncates_journal(tmp_path):
+    journal = _journal(tmp_path, compact_every=2)
+    journal.load()
+    journal.flush(_state(1.0, 1.0))
+    journal.flush(_state(2.0, 2.0))
+    assert journal.journal_path.read_text() == ""
+    snapshot = json.loads(journal.snapshot_path.read_text())
+    assert snapshot["pv_energy"] == 2.0
+    assert snapshot["journal_seq"] == 2
+    assert not (tmp_path / "energy_state.json.tmp").exists()
+
+    journal.flush(_state(3.0, 3.0))
+    assert _journal(tmp_path).load() == _state(3.0, 3.0)
+
+
+def test_records_already_in_snapshot_are_not_counted_twice(tmp_path):
+    journal = _journal(tmp_path, compact_every=100)
+    journal.load()
+    journal.flush(_state(1.0, 1.0))
+    stale = journal.journal_path.read_text()
+    journal.compact(_state(1.0, 1.0))
+    # Crash between the snapshot rename and the journal truncation.
+    journal.journal_path.write_text(stale + '{"seq": 2, "date": "2026-01-01", "in')
+
+    assert _journal(tmp_path).load() == _state(1.0, 1.0)
+
+
+def test_legacy_state_file_is_imported(tmp_path):
+    legacy = tmp_path / "legacy.json"
+    legacy.write_text(json.dumps(_state(7.0, 1.0)))
+    journal = EnergyJournal(
+        tmp_path / "data" / "energy_state.json", SLUGS, ["pv_energy_today"]
+    )
+    (tmp_path / "data").mkdir()
+    assert journal.load(legacy=legacy) == _state(7.0, 1.0)
+    journal.flush(_state(8.0, 2.0))
+    assert json.loads(journal.journal_path.read_text())["inc"] == {
+        "pv_energy": 1.0,
+        "pv_energy_today": 1.0,
+    }
@@ -0,0 +1,59 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.fast_lane import FastLane  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_window_summarises_recent_samples():
+    clock = Clock()
+    received = []
+    lane = FastLane(
+        None, on_sample=lambda values, at: received.append((at, values)), clock=clock
+    )
+    for i, power in enumerate([100, 300, 200]):
+        clock.now = i + 1.0
+        lane.add(clock.now, {"pv_power": power, "mains_power": None})
+    assert len(received) == 3
+    assert len(lane.history.sensor("pv_power")) == 3
+
+    summary = lane.window(60)
+    assert summary["window"] == 60
+    assert summary["pv_power"] == {"count": 3, "mean": 200.0, "min": 100, "max": 300}
+    assert "mains_power" not in summary
+
+    clock.now = 62.5
+    lane.add(62.0, {"pv_power": 50})
+    summary = lane.window(60)
+    assert summary["pv_power"] == {"count": 2, "mean": 125.0, "min": 50, "max": 200}
+
+
+@pytest.mark.asyncio
+async def test_run_samples_periodically_and_counts_failures():
+    results = iter([None, {"pv_power": 10}, RuntimeError("bus")])
+
+    async def sample():
+        result = next(results, {"pv_power": 20})
+        if isinstance(result, Exception):
+            raise result
+        return None if result is None else (time.monotonic(), result)
+
+    lane = FastLane(sample, interval=0.01)
+    lane.start()
+    await asyncio.sleep(0.1)
+    await lane.stop()
+    assert lane.failures == 2
+    assert lane.window(60)["pv_power"]["count"] >= 2
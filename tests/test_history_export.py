@@ -0,0 +1,107 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.__main__ import main  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.history_export import (  # noqa: E402
+    parse_duration,
+    resolve_tier,
+)
+from vevor_eml3500_24l_rs232_wifi.history_store import (  # noqa: E402
+    HistoryStore,
+    iter_history,
+)
+
+BASE = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "history.sqlite3"
+    store = HistoryStore(path, counters=["pv_energy"], clock=lambda: BASE + 7200)
+    for i in range(10):
+        store.record(
+            {"pv_power": 100 + i, "battery_soc": 50, "pv_energy": i / 10},
+            BASE + i * 30,
+        )
+    store.maintain()
+    store.close()
+    return path
+
+
+def test_iter_history_streams_selected_slugs_in_batches(db):
+    rows = list(iter_history(db, ["pv_power"], end=BASE + 90, batch_size=2))
+    assert rows == [(BASE + i * 30, "pv_power", 100.0 + i) for i in range(3)]
+    assert list(iter_history(db, ["missing"])) == []
+
+
+def test_export_csv_to_file(db, tmp_path, capsys):
+    output = tmp_path / "out.csv"
+    code = main(
+        [
+            "export",
+            "--db",
+            str(db),
+            "--slug",
+            "pv_power,battery_soc",
+            "--tier",
+            "raw",
+            "--start",
+            "2026-01-01T00:01:00+00:00",
+            "--end",
+            "2026-01-01T00:02:00+00:00",
+            "-o",
+            str(output),
+        ]
+    )
+    assert code == 0
+    with output.open() as fp:
+        rows = list(csv.reader(fp))
+    assert rows[0] == ["timestamp", "slug", "value"]
+    assert rows[1] == ["2026-01-01T00:01:00.000Z", "pv_power", "102.0"]
+    assert len(rows) == 1 + 2 * 2
+    assert "Exported 4 rows" in capsys.readouterr().err
+
+
+def test_export_jsonl_from_rollup_tier(db, capsys):
+    code = main(
+        [
+            "export",
+            "--db",
+            str(db),
+            "--slug",
+            "pv_energy",
+            "--tier",
+            "minute",
+            "--format",
+            "jsonl",
+        ]
+    )
+    assert code == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [row["timestamp"] for row in lines] == [
+        f"2026-01-01T00:0{i}:00.000Z" for i in range(5)
+    ]
+    assert lines[0]["count"] == 2
+    assert sum(row["delta"] for row in lines) == pytest.approx(0.9)
+
+
+def test_export_reports_bad_arguments(tmp_path, capsys):
+    assert main(["export", "--db", str(tmp_path / "none.sqlite3")]) == 1
+    assert main(["export", "--last", "soon"]) == 2
+    assert "Invalid duration" in capsys.readouterr().err
+
+
+def test_auto_tier_follows_range_length():
+    assert parse_duration("36h") == 36 * 3600
+    assert resolve_tier("auto", 0, parse_duration("1d")) == "raw"
+    assert resolve_tier("auto", 0, parse_duration("1w")) == "minute"
+    assert resolve_tier("auto", 0, parse_duration("90d")) == "hour"
+    assert resolve_tier("auto", 0, parse_duration("3000d")) == "day"
+    assert resolve_tier("auto", None, 0) == "day"
+    assert resolve_tier("minute", None, 0) == "minute"
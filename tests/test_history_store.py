@@ -0,0 +1,152 @@
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.history_store import (  # noqa: E402
+    HistoryStore,
+    parse_retention_overrides,
+)
+
+DAY = 86400.0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 10 * DAY
+
+    def __call__(self):
+        return self.now
+
+
+def _store(tmp_path, clock, **kwargs):
+    return HistoryStore(
+        tmp_path / "history.sqlite3",
+        counters=["pv_energy"],
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_minute_rollup_and_counter_deltas(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path, clock)
+    base = clock.now
+    for i, (power, energy) in enumerate([(100, 1.0), (300, 1.5), (200, 2.0)]):
+        store.record(
+            {"pv_power": power, "pv_energy": energy, "mode": "Line"}, base + i * 20
+        )
+    store.record({"pv_power": 50, "pv_energy": 2.25}, base + 60)
+    assert store.flush() == 8
+
+    clock.now = base + 125
+    assert store.rollup() == {"minute": 4}
+    minutes = store.query("pv_power", "minute")
+    assert [row["timestamp"] for row in minutes] == [base, base + 60]
+    assert minutes[0]["count"] == 3
+    assert minutes[0]["mean"] == pytest.approx(200)
+    assert (minutes[0]["min"], minutes[0]["max"]) == (100, 300)
+    assert (minutes[0]["first"], minutes[0]["last"]) == (100, 200)
+    assert minutes[0]["delta"] is None
+    energy = store.query("pv_energy", "minute")
+    assert [row["delta"] for row in energy] == [
+        pytest.approx(1.0),
+        pytest.approx(0.25),
+    ]
+    assert store.sensors() == ["pv_energy", "pv_power"]
+
+
+def test_rollup_is_incremental_across_tiers(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path, clock)
+    base = clock.now
+    for minute in range(0, 180):
+        store.record(
+            {"pv_power": minute, "pv_energy": minute / 10}, base + minute * 60
+        )
+        store.flush()
+        clock.now = base + minute * 60 + 30
+        store.rollup()
+    # Each source row is folded in exactly once.
+    clock.now = base + 3 * 3600 + 10
+    written = store.rollup()
+    assert written == {"minute": 2, "hour": 2}
+    hours = store.query("pv_power", "hour")
+    assert [row["count"] for row in hours] == [60, 60, 60]
+    assert hours[1]["mean"] == pytest.approx(sum(range(60, 120)) / 60)
+    assert (hours[2]["first"], hours[2]["last"]) == (120, 179)
+    deltas = [row["delta"] for row in store.query("pv_energy", "hour")]
+    assert sum(deltas) == pytest.approx(17.9)
+    assert store.query("pv_power", "day") == []
+
+    clock.now = base + DAY + 10
+    assert store.rollup()["day"] == 2
+    day = store.query("pv_power", "day")[0]
+    assert day["count"] == 180
+    assert day["max"] == 179
+
+
+def test_retention_keeps_rows_not_rolled_up(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path, clock, retention={"raw": 1})
+    base = clock.now
+    store.record({"pv_power": 1}, base)
+    store.flush()
+    clock.now = base + 3 * DAY
+    assert store.purge() == 0
+
+    store.rollup()
+    assert store.purge() == 1
+    assert store.query("pv_power") == []
+    assert len(store.query("pv_power", "minute")) == 1
+
+
+def test_store_survives_reopen(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path, clock)
+    store.record({"pv_power": 5}, clock.now)
+    store.maintain()
+    store.close()
+
+    reopened = _store(tmp_path, clock)
+    reopened.record({"pv_power": 6, "battery_soc": 80}, clock.now + 1)
+    reopened.flush()
+    assert [row["value"] for row in reopened.query("pv_power")] == [5, 6]
+    with sqlite3.connect(tmp_path / "history.sqlite3") as db:
+        assert db.execute("SELECT COUNT(*) FROM sensors").fetchone() == (2,)
+
+
+def test_record_during_flush_loses_no_rows(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path, clock)
+    done = threading.Event()
+    flushed = []
+
+    def flush_until_done():
+        while not done.is_set():
+            flushed.append(store.flush())
+
+    worker = threading.Thread(target=flush_until_done)
+    worker.start()
+    for i in range(2000):
+        store.record({"pv_power": i}, clock.now + i)
+    done.set()
+    worker.join()
+    flushed.append(store.flush())
+    assert sum(flushed) == 2000
+    with sqlite3.connect(tmp_path / "history.sqlite3") as db:
+        assert db.execute("SELECT COUNT(*) FROM samples").fetchone() == (2000,)
+
+
+def test_parse_retention_overrides():
+    assert parse_retention_overrides(["raw=3", " Hour = 30"]) == {
+        "raw": 3.0,
+        "hour": 30.0,
+    }
+    for item in ("raw", "week=3", "raw=x", "raw=-1"):
+        with pytest.raises(ValueError):
+            parse_retention_overrides([item])
@@ -0,0 +1,173 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.instrumentation import (  # noqa: E402
+    Hook,
+    HookSwitch,
+    Instrumentation,
+    JsonLinesTracer,
+    SamplingProfiler,
+    parse_hook_command,
+)
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    ModbusRTUOverTCPClient,
+    RegisterDefinition,
+)
+
+
+class Recorder(Hook):
+    def __init__(self):
+        self.events = []
+
+    def start(self, span):
+        self.events.append(("start", span.name))
+
+    def end(self, span):
+        self.events.append(("end", span.name, dict(span.attrs), span.error))
+
+
+def test_span_without_hooks_is_shared_noop():
+    instrumentation = Instrumentation()
+    first = instrumentation.span("cycle")
+    assert first is instrumentation.span("decode", address=1)
+    with first as span:
+        assert span is None
+
+
+def test_hooks_see_nested_spans_and_errors():
+    instrumentation = Instrumentation()
+    recorder = Recorder()
+    instrumentation.add(recorder)
+    with pytest.raises(KeyError):
+        with instrumentation.span("cycle"):
+            with instrumentation.span("decode", source="image"):
+                pass
+            raise KeyError("x")
+    assert recorder.events == [
+        ("start", "cycle"),
+        ("start", "decode"),
+        ("end", "decode", {"source": "image"}, None),
+        ("end", "cycle", {}, "KeyError"),
+    ]
+
+
+def test_failing_hook_is_removed():
+    class Broken(Hook):
+        def end(self, span):
+            raise RuntimeError("boom")
+
+    instrumentation = Instrumentation()
+    instrumentation.add(Broken())
+    with instrumentation.span("cycle"):
+        pass
+    assert instrumentation.hooks == []
+
+
+def test_tracer_writes_json_lines_and_rotates(tmp_path):
+    instrumentation = Instrumentation()
+    tracer = JsonLinesTracer(tmp_path / "trace.jsonl", max_bytes=200)
+    instrumentation.add(tracer)
+    for address in range(4):
+        with instrumentation.span("transaction", op="read", address=address):
+            pass
+    instrumentation.remove(tracer)
+    tracer._writer.shutdown(wait=True)
+    lines = (tmp_path / "trace.jsonl.1").read_text().splitlines()
+    lines += (tmp_path / "trace.jsonl").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["address"] for record in records] == [0, 1, 2, 3]
+    assert records[0]["span"] == "transaction"
+    assert records[0]["op"] == "read"
+    assert records[0]["ms"] >= 0
+
+
+def test_tracer_writes_once_per_cycle(tmp_path):
+    instrumentation = Instrumentation()
+    tracer = JsonLinesTracer(tmp_path / "trace" / "trace.jsonl")
+    instrumentation.add(tracer)
+    with instrumentation.span("cycle"):
+        with instrumentation.span("decode"):
+            pass
+        tracer._writer.submit(lambda: None).result()
+        assert not (tmp_path / "trace").exists()
+    tracer._writer.submit(lambda: None).result()
+    lines = (tmp_path / "trace" / "trace.jsonl").read_text().splitlines()
+    assert [json.loads(line)["span"] for line in lines] == ["decode", "cycle"]
+    instrumentation.remove(tracer)
+    tracer._writer.shutdown(wait=True)
+    assert tracer._fp is None
+
+
+def test_profiler_samples_one_cycle_in_every(tmp_path):
+    instrumentation = Instrumentation()
+    profiler = SamplingProfiler(tmp_path, every=3)
+    instrumentation.add(profiler)
+    for _ in range(4):
+        with instrumentation.span("cycle"):
+            with instrumentation.span("decode"):
+                sum(range(1000))
+    assert len(set(profiler.saved)) == 2
+    assert all(path.exists() for path in profiler.saved)
+
+
+def test_hook_switch_enables_named_hooks(tmp_path):
+    instrumentation = Instrumentation()
+    switch = HookSwitch(instrumentation, tmp_path)
+    assert switch.apply("profile, trace") == "trace,profile"
+    assert len(instrumentation.hooks) == 2
+    assert switch.apply("trace") == "trace"
+    assert isinstance(instrumentation.hooks[0], JsonLinesTracer)
+    with pytest.raises(ValueError):
+        switch.apply("flamegraph")
+    assert switch.apply("off") == "off"
+    assert instrumentation.hooks == []
+    assert parse_hook_command("") == set()
+
+
+@pytest.mark.asyncio
+async def test_client_reports_transaction_and_decode_spans():
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        "power": RegisterDefinition(
+            name="power",
+            unit="W",
+            data_format="UInt",
+            address=204,
+            count=1,
+            access="R",
+            remark="",
+        )
+    }
+
+    async def fake_connect():
+        return None
+
+    async def fake_read(address, *, count=1, **kwargs):
+        class Resp:
+            registers = [42] * count
+
+            def isError(self):
+                return False
+
+        return Resp()
+
+    client.connect = fake_connect
+    client.client.read_holding_registers = fake_read
+    recorder = Recorder()
+    client.instrumentation.add(recorder)
+    await client.read_registers(["power"])
+    ends = [event for event in recorder.events if event[0] == "end"]
+    assert ends == [
+        (
+            "end",
+            "transaction",
+            {"op": "read", "address": 204, "count": 1, "attempt": 0},
+            None,
+        ),
+        ("end", "decode", {"address": 204, "count": 1}, None),
+    ]
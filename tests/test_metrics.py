@@ -0,0 +1,133 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.metrics import (  # noqa: E402
+    CycleStats,
+    Histogram,
+    MetricsServer,
+    OpenMetricsWriter,
+)
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    ModbusRTUOverTCPClient,
+    RegisterDefinition,
+)
+from vevor_eml3500_24l_rs232_wifi.poller import render_metrics  # noqa: E402
+
+
+def test_writer_renders_openmetrics_text():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    out = OpenMetricsWriter("vevor")
+    out.counter("modbus_retries", "Retries", 2)
+    out.gauge("mqtt_queue_depth", "Queue depth", 0.5, topic='a"b')
+    out.histogram("latency_seconds", "Latency", histogram, op="read")
+    assert out.render().splitlines() == [
+        "# TYPE vevor_modbus_retries counter",
+        "# HELP vevor_modbus_retries Retries",
+        "vevor_modbus_retries_total 2",
+        "# TYPE vevor_mqtt_queue_depth gauge",
+        "# HELP vevor_mqtt_queue_depth Queue depth",
+        'vevor_mqtt_queue_depth{topic="a\\"b"} 0.5',
+        "# TYPE vevor_latency_seconds histogram",
+        "# HELP vevor_latency_seconds Latency",
+        'vevor_latency_seconds_bucket{op="read",le="0.1"} 2',
+        'vevor_latency_seconds_bucket{op="read",le="1.0"} 3',
+        'vevor_latency_seconds_bucket{op="read",le="+Inf"} 4',
+        'vevor_latency_seconds_sum{op="read"} 3.65',
+        'vevor_latency_seconds_count{op="read"} 4',
+        "# EOF",
+    ]
+
+
+def test_cycle_stats_count_overruns():
+    cycles = CycleStats()
+    for duration in (2.0, 12.0, 9.0):
+        cycles.record(duration, 10)
+    assert cycles.duration.count == 3
+    assert cycles.overruns == 1
+
+
+@pytest.mark.asyncio
+async def test_server_answers_metrics_only():
+    server = MetricsServer(lambda: "# EOF\n", host="127.0.0.1", port=0)
+    await server.start()
+
+    async def request(line):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(line.encode() + b"\r\nHost: test\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    try:
+        response = await request("GET /metrics HTTP/1.1")
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert "application/openmetrics-text" in response
+        assert response.endswith("\r\n\r\n# EOF\n")
+        assert (await request("GET / HTTP/1.1")).startswith("HTTP/1.1 404")
+        assert (await request("POST /metrics HTTP/1.1")).startswith("HTTP/1.1 405")
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_render_metrics_reports_transport_and_block_age(monkeypatch):
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        "power": RegisterDefinition(
+            name="power",
+            unit="W",
+            data_format="UInt",
+            address=204,
+            count=1,
+            access="R",
+            remark="",
+        )
+    }
+
+    async def fake_connect():
+        client.stats.connects += 1
+
+    async def no_sleep(delay):
+        return None
+
+    calls = []
+
+    async def fake_read(address, *, count=1, **kwargs):
+        calls.append(address)
+        if len(calls) == 1:
+            raise asyncio.TimeoutError
+
+        class Resp:
+            registers = [42] * count
+
+            def isError(self):
+                return False
+
+        return Resp()
+
+    client.connect = fake_connect
+    client.client.read_holding_registers = fake_read
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    await client.read_registers(["power"])
+
+    cycles = CycleStats()
+    cycles.record(1.0, 60)
+    read_at = client.image.read_time(204)
+    text = render_metrics(client, cycles, now=read_at + 2.5)
+    lines = text.splitlines()
+    assert "vevor_modbus_requests_total 2" in lines
+    assert "vevor_modbus_retries_total 1" in lines
+    assert "vevor_modbus_timeouts_total 1" in lines
+    assert "vevor_modbus_reconnects_total 1" in lines
+    assert 'vevor_modbus_request_duration_seconds_count{op="read"} 1' in lines
+    assert 'vevor_modbus_block_read_age_seconds{block="204-204"} 2.5' in lines
+    assert "vevor_poll_cycle_duration_seconds_count 1" in lines
+    assert "vevor_poll_cycle_overruns_total 0" in lines
+    assert lines[-1] == "# EOF"
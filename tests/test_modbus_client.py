@@ -1,3 +1,4 @@
+import asyncio
 import sys
 from pathlib import Path
 import importlib
@@ -17,6 +18,7 @@ if not hasattr(framer_module, "FramerType"):
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    CircuitOpenError,
     DEFAULT_REGISTER_CSV,
     RegisterDefinition,
     ModbusRTUOverTCPClient,
@@ -103,3 +105,251 @@ async def test_read_register_scales_without_float_error(monkeypatch):
     client.client.read_holding_registers = fake_read
     value = await client.read_register("voltage")
     assert value == 24.9
+
+
+@pytest.mark.asyncio
+async def test_poll_once_reads_contiguous_registers_in_one_request():
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        "mode": RegisterDefinition("mode", "", "UInt", 201, 1, "R", ""),
+        "voltage": RegisterDefinition(
+            "voltage", "0.1v", "Int", 202, 1, "R", "", scale=0.1
+        ),
+        "power": RegisterDefinition("power", "1w", "Int", 204, 1, "R", ""),
+    }
+
+    async def fake_connect():
+        return None
+
+    client.connect = fake_connect
+    requests = []
+
+    async def fake_read(address, *, count=1, **kwargs):
+        requests.append((address, count))
+
+        class Resp:
+            registers = [2, 2301, 0, 0xFFF6][:count]
+
+            def isError(self):
+                return False
+
+        return Resp()
+
+    client.client.read_holding_registers = fake_read
+    await client._poll_once(["mode", "voltage", "power"])
+    assert requests == [(201, 4)]
+    assert client.values == {"mode": 2.0, "voltage": 230.1, "power": -10.0}
+
+
+@pytest.mark.asyncio
+async def test_read_registers_splits_rejected_block():
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        "remote": RegisterDefinition("remote", "", "Uint", 420, 1, "R/W", ""),
+        "force_eq": RegisterDefinition("force_eq", "", "Uint", 425, 1, "W", ""),
+    }
+
+    async def fake_connect():
+        return None
+
+    client.connect = fake_connect
+    requests = []
+
+    async def fake_read(address, *, count=1, **kwargs):
+        requests.append((address, count))
+
+        class Resp:
+            registers = [7] * count
+
+            def isError(self):
+                return address <= 425 < address + count
+
+        return Resp()
+
+    client.client.read_holding_registers = fake_read
+    snapshot = await client.read_registers(["remote", "force_eq", "missing"])
+    assert snapshot.values == {"remote": 7.0}
+    assert snapshot.raw["remote"] == [7]
+    assert set(snapshot.errors) == {"force_eq", "missing"}
+    assert [t.address for t in snapshot.transactions] == [420]
+    assert requests == [(420, 6), (420, 1), (425, 1)]
+
+    requests.clear()
+    await client.read_registers(["remote", "force_eq", "missing"])
+    assert requests == [(420, 1), (425, 1)]
+
+
+@pytest.mark.asyncio
+async def test_rejected_block_is_bisected_around_the_bad_register():
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        name: RegisterDefinition(name, "", "Uint", address, 1, "R", "")
+        for name, address in (
+            ("a", 420),
+            ("b", 421),
+            ("c", 422),
+            ("d", 423),
+            ("bad", 425),
+            ("e", 426),
+        )
+    }
+
+    async def fake_connect():
+        return None
+
+    client.connect = fake_connect
+    requests = []
+
+    async def fake_read(address, *, count=1, **kwargs):
+        requests.append((address, count))
+
+        class Resp:
+            registers = [7] * count
+
+            def isError(self):
+                return address <= 425 < address + count
+
+        return Resp()
+
+    client.client.read_holding_registers = fake_read
+    names = ["a", "b", "c", "d", "bad", "e"]
+    snapshot = await client.read_registers(names)
+    assert set(snapshot.errors) == {"bad"}
+    assert len(snapshot.values) == 5
+
+    requests.clear()
+    await client.read_registers(names)
+    assert requests == [(420, 4), (425, 1), (426, 1)]
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_aborts_cycle_and_recovers(monkeypatch):
+    client = ModbusRTUOverTCPClient("example.com", failure_threshold=3)
+    client.registers = {
+        "mode": RegisterDefinition("mode", "", "UInt", 201, 1, "R", ""),
+        "output_mode": RegisterDefinition(
+            "output_mode", "", "Uint", 300, 1, "R/W", ""
+        ),
+        "boot": RegisterDefinition("boot", "", "Uint", 406, 1, "R/W", ""),
+    }
+
+    async def fake_connect():
+        return None
+
+    async def no_sleep(delay):
+        return None
+
+    client.connect = fake_connect
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    calls = []
+    bridge_up = False
+
+    async def fake_read(address, *, count=1, **kwargs):
+        calls.append(address)
+        if not bridge_up:
+            raise ConnectionResetError("bridge gone")
+
+        class Resp:
+            registers = [1] * count
+
+            def isError(self):
+                return False
+
+        return Resp()
+
+    client.client.read_holding_registers = fake_read
+    snapshot = await client.read_registers(["mode", "output_mode", "boot"])
+    assert snapshot.aborted
+    assert set(snapshot.errors) == {"mode", "output_mode", "boot"}
+    assert calls == [201, 201, 201]
+    assert client.circuit_open
+
+    with pytest.raises(CircuitOpenError):
+        await client.read_register("mode")
+    assert len(calls) == 3
+
+    assert not await client.probe()
+    bridge_up = True
+    await client.wait_for_recovery()
+    assert not client.circuit_open
+    snapshot = await client.read_registers(["mode", "output_mode", "boot"])
+    assert not snapshot.errors
+
+
+@pytest.mark.asyncio
+async def test_block_reads_update_register_image():
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        "mode": RegisterDefinition("mode", "", "UInt", 201, 1, "R", ""),
+        "boot": RegisterDefinition("boot", "", "Uint", 406, 1, "R/W", ""),
+    }
+
+    async def fake_connect():
+        return None
+
+    client.connect = fake_connect
+    fail = set()
+
+    async def fake_read(address, *, count=1, **kwargs):
+        class Resp:
+            registers = [address - 200] * count
+
+            def isError(self):
+                return address in fail
+
+        return Resp()
+
+    client.client.read_holding_registers = fake_read
+    await client.read_registers(["mode", "boot"])
+    assert list(client.image.view(201)) == [1]
+    assert client.image.valid(406)
+    assert client.values == {"mode": 1.0, "boot": 206.0}
+
+    fail.add(406)
+    await client.read_registers(["boot"])
+    assert not client.image.valid(406)
+    assert client.values == {"mode": 1.0}
+
+
+@pytest.mark.asyncio
+async def test_write_register_closes_once_and_raises_bad_values(monkeypatch):
+    client = ModbusRTUOverTCPClient("example.com")
+    client.registers = {
+        "boot": RegisterDefinition("boot", "", "Uint", 406, 1, "R/W", ""),
+    }
+
+    async def fake_connect():
+        return None
+
+    async def no_sleep(delay):
+        return None
+
+    closes = []
+
+    async def fake_close():
+        closes.append(True)
+
+    writes = []
+
+    async def fake_write(address, value=0, **kwargs):
+        writes.append(value)
+        if len(writes) == 1:
+            raise ConnectionResetError("bridge gone")
+
+        class Resp:
+            def isError(self):
+                return False
+
+        return Resp()
+
+    client.connect = fake_connect
+    client.close = fake_close
+    client.client.write_register = fake_write
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    await client.write_register("boot", 1)
+    assert writes == [1, 1]
+    assert len(closes) == 1
+
+    with pytest.raises(ValueError):
+        await client.write_register("boot", "on")
+    assert len(writes) == 2
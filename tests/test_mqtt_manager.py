@@ -0,0 +1,169 @@
+import asyncio
+import struct
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.mqtt_manager import MQTTManager  # noqa: E402
+
+
+def _string(data, offset):
+    (length,) = struct.unpack_from(">H", data, offset)
+    return data[offset + 2 : offset + 2 + length].decode(), offset + 2 + length
+
+
+def _packet(first, body):
+    length, encoded = len(body), bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes([first]) + bytes(encoded) + body
+
+
+def _matches(pattern, topic):
+    parts, levels = pattern.split("/"), topic.split("/")
+    return len(parts) == len(levels) and all(
+        p in ("+", level) for p, level in zip(parts, levels)
+    )
+
+
+class FakeBroker:
+    """Just enough MQTT 3.1.1 to exercise sessions, QoS 1 and PINGREQ."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.published = []
+        self.subscribe_requests = 0
+        self.writers = {}
+        self.server = None
+        self.port = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self._handle, "127.0.0.1", self.port, reuse_address=True
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    def send(self, topic, payload):
+        body = struct.pack(">H", len(topic)) + topic.encode() + payload
+        for writer, client_id in self.writers.items():
+            if any(_matches(p, topic) for p in self.sessions.get(client_id, ())):
+                writer.write(_packet(0x30, body))
+
+    async def _handle(self, reader, writer):
+        client_id = None
+        try:
+            while True:
+                first = (await reader.readexactly(1))[0]
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                kind = first >> 4
+                if kind == 1:
+                    _, offset = _string(body, 0)
+                    flags = body[offset + 1]
+                    client_id, _ = _string(body, offset + 4)
+                    present = not flags & 0x02 and client_id in self.sessions
+                    if not present:
+                        self.sessions[client_id] = set()
+                    self.writers[writer] = client_id
+                    writer.write(_packet(0x20, bytes([int(present), 0])))
+                elif kind == 3:
+                    qos, retain = (first >> 1) & 3, bool(first & 1)
+                    topic, offset = _string(body, 0)
+                    if qos:
+                        packet_id = body[offset : offset + 2]
+                        offset += 2
+                        writer.write(_packet(0x40, packet_id))
+                    self.published.append((topic, body[offset:].decode(), retain))
+                elif kind == 8:
+                    self.subscribe_requests += 1
+                    offset, granted = 2, bytearray()
+                    while offset < len(body):
+                        topic, offset = _string(body, offset)
+                        granted.append(body[offset])
+                        offset += 1
+                        self.sessions[client_id].add(topic)
+                    writer.write(_packet(0x90, body[:2] + bytes(granted)))
+                elif kind == 12:
+                    writer.write(_packet(0xD0, b""))
+                elif kind == 14:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.pop(writer, None)
+            writer.close()
+
+
+async def _until(predicate, timeout=3.0):
+    for _ in range(int(timeout / 0.02)):
+        if predicate():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met")
+
+
+@pytest.mark.asyncio
+async def test_manager_runs_in_loop_and_resumes_session():
+    broker = FakeBroker()
+    await broker.start()
+    manager = MQTTManager(
+        "127.0.0.1",
+        broker.port,
+        client_id="test",
+        availability_topic="p/availability",
+        reconnect_interval=0.05,
+    )
+    sessions = []
+    received = []
+    manager.on_connected = sessions.append
+    manager.on_message = lambda msg: received.append(
+        (msg.topic, msg.payload, threading.current_thread())
+    )
+    manager.subscribe("p/+/set")
+    await manager.start()
+    try:
+        assert await manager.wait_connected(3)
+        assert sessions == [False]
+        await _until(lambda: broker.subscribe_requests == 1)
+        broker.send("p/mode/set", b"2")
+        await _until(lambda: received)
+        assert received[0][:2] == ("p/mode/set", b"2")
+        assert received[0][2] is threading.current_thread()
+
+        await broker.stop()
+        await _until(lambda: not manager.connected)
+        manager.publish("p/a", "1", retain=True)
+        manager.publish("p/a", "2", retain=True)
+        manager.publish("p/telemetry", "{}")
+        assert manager.queued == 2
+
+        await broker.start()
+        await _until(lambda: sessions == [False, True])
+        await _until(lambda: ("p/telemetry", "{}", False) in broker.published)
+        assert ("p/a", "2", True) in broker.published
+        assert ("p/a", "1", True) not in broker.published
+        assert broker.subscribe_requests == 1
+        assert manager.queued == 0
+    finally:
+        await manager.stop()
+        await broker.stop()
+    assert broker.published[-1] == ("p/availability", "offline", True)
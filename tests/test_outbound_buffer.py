@@ -0,0 +1,141 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.outbound_buffer import OutboundBuffer  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Client:
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, json.loads(payload), qos))
+        if len(self.published) == 3 and self.disconnect_after_three:
+            self.connected = False
+
+    disconnect_after_three = False
+
+
+def _snapshot(i):
+    return {"pv_power": i, "last_update": f"2026-01-01T00:00:{i:02d}+00:00"}
+
+
+@pytest.mark.asyncio
+async def test_replay_in_order_with_original_timestamps(tmp_path):
+    buffer = OutboundBuffer(tmp_path, segment_bytes=200)
+    for i in range(5):
+        buffer.append(_snapshot(i))
+    assert len(list(tmp_path.glob("*.jsonl"))) > 1
+
+    client = Client()
+    assert await buffer.replay(client, "p/history", batch_interval=0) == 5
+    assert [p["pv_power"] for _, p, _ in client.published] == list(range(5))
+    assert client.published[0][1]["timestamp"] == "2026-01-01T00:00:00+00:00"
+    assert {topic for topic, _, _ in client.published} == {"p/history"}
+    assert not buffer.pending
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+
+@pytest.mark.asyncio
+async def test_interrupted_replay_keeps_segment(tmp_path):
+    buffer = OutboundBuffer(tmp_path)
+    for i in range(4):
+        buffer.append(_snapshot(i))
+    client = Client()
+    client.disconnect_after_three = True
+    await buffer.replay(client, "p/history", batch_size=2, batch_interval=0)
+    assert buffer.pending
+
+    # Snapshots taken during the replay land in a new segment.
+    buffer.append(_snapshot(9))
+    client = Client()
+    await buffer.replay(client, "p/history", batch_interval=0)
+    assert [p["pv_power"] for _, p, _ in client.published] == [0, 1, 2, 3, 9]
+
+
+class Receipt:
+    def __init__(self):
+        self.acked = False
+
+    def is_published(self):
+        return self.acked
+
+
+class AckingClient(Client):
+    def __init__(self):
+        super().__init__()
+        self.receipts = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        super().publish(topic, payload, qos, retain)
+        self.receipts.append(Receipt())
+        return self.receipts[-1]
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_segment_until_acknowledged(tmp_path):
+    buffer = OutboundBuffer(tmp_path)
+    for i in range(3):
+        buffer.append(_snapshot(i))
+    client = AckingClient()
+    await buffer.replay(client, "p/history", batch_interval=0, ack_timeout=0)
+    assert len(client.published) == 3
+    assert buffer.pending
+
+    client = AckingClient()
+    replay = asyncio.create_task(
+        buffer.replay(client, "p/history", batch_interval=0, ack_timeout=5)
+    )
+    while len(client.receipts) < 3:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.05)
+    assert buffer.pending
+    for receipt in client.receipts:
+        receipt.acked = True
+    assert await replay == 3
+    assert not buffer.pending
+
+
+def test_limits_drop_oldest_segments(tmp_path):
+    clock = Clock()
+    buffer = OutboundBuffer(tmp_path, max_bytes=400, segment_bytes=100, clock=clock)
+    for i in range(20):
+        buffer.append(_snapshot(i))
+    assert buffer.size() <= 400 + 100
+    assert buffer.dropped > 0
+
+    # Records older than max_age are skipped when read back.
+    clock.now += buffer.max_age + 1
+    path, lines = buffer.oldest()
+    assert lines == []
+
+
+def test_buffer_survives_restart_and_torn_line(tmp_path):
+    buffer = OutboundBuffer(tmp_path)
+    buffer.append(_snapshot(1))
+    segment = next(tmp_path.glob("*.jsonl"))
+    with segment.open("a") as fp:
+        fp.write('{"timestamp": "2026')
+
+    reopened = OutboundBuffer(tmp_path)
+    assert reopened.pending
+    path, lines = reopened.oldest()
+    assert path == segment
+    assert len(lines) == 1
+    reopened.append(_snapshot(2))
+    assert len(list(tmp_path.glob("*.jsonl"))) == 2
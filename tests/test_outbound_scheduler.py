@@ -0,0 +1,173 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.outbound_scheduler import (  # noqa: E402
+    MessagePriority,
+    OutboundScheduler,
+    classify,
+    priority,
+)
+
+
+class Client:
+    def __init__(self):
+        self.connected = True
+        self.published = []
+        self.event = asyncio.Event()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published.append((topic, payload, retain))
+
+    async def wait_connected(self):
+        await self.event.wait()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_classify_topics():
+    assert classify("p/availability") is MessagePriority.AVAILABILITY
+    assert classify("homeassistant/sensor/p_x/config") is MessagePriority.DISCOVERY
+    assert classify("p/x/attributes") is MessagePriority.ATTRIBUTES
+    assert classify("p/error") is MessagePriority.COMMAND
+    assert classify("p/history") is MessagePriority.BACKGROUND
+    assert classify("p/pv_power") is MessagePriority.STATE
+
+
+def test_priority_order_and_retained_coalescing():
+    client = Client()
+    scheduler = OutboundScheduler(client, clock=Clock())
+    scheduler.publish("homeassistant/sensor/p_x/config", "{}", retain=True)
+    scheduler.publish("p/x/attributes", "{}", retain=True)
+    scheduler.publish("p/pv_power", "1", retain=True)
+    scheduler.publish("p/pv_power", "2", retain=True)
+    with priority(MessagePriority.COMMAND):
+        scheduler.publish("p/output_priority", "SBU", retain=True)
+    scheduler.publish("p/availability", "online", retain=True)
+    assert scheduler.queue_depth == 5
+    assert scheduler.coalesced == 1
+
+    while scheduler.send_one():
+        pass
+    assert [topic for topic, _, _ in client.published] == [
+        "p/availability",
+        "p/pv_power",
+        "p/output_priority",
+        "homeassistant/sensor/p_x/config",
+        "p/x/attributes",
+    ]
+    assert client.published[1][1] == "2"
+    assert scheduler.queue_depth == 0
+
+
+def test_retained_update_promotes_queued_message():
+    client = Client()
+    scheduler = OutboundScheduler(client, clock=Clock())
+    scheduler.publish("p/x/attributes", "old", retain=True)
+    scheduler.publish("p/pv_power", "1", retain=True)
+    scheduler.publish("p/x/attributes", "new", retain=True, priority=0)
+    assert scheduler.queue_depth == 2
+    while scheduler.send_one():
+        pass
+    assert client.published[0] == ("p/x/attributes", "new", True)
+    assert len(client.published) == 2
+
+
+def test_token_bucket_limits_rate():
+    clock = Clock()
+    scheduler = OutboundScheduler(Client(), rate=10, burst=2, clock=clock)
+    assert scheduler._take_token() == 0
+    assert scheduler._take_token() == 0
+    assert scheduler._take_token() == pytest.approx(0.1)
+    clock.now = 0.1
+    assert scheduler._take_token() == 0
+
+
+@pytest.mark.asyncio
+async def test_run_drains_and_waits_for_connection():
+    client = Client()
+    client.connected = False
+    scheduler = OutboundScheduler(client, rate=1000, burst=5)
+    scheduler.start()
+    for i in range(10):
+        scheduler.publish(f"p/s{i}", str(i))
+    await asyncio.sleep(0.05)
+    assert client.published == []
+
+    client.connected = True
+    client.event.set()
+    await scheduler.stop()
+    assert len(client.published) == 10
+    metrics = scheduler.metrics()
+    assert metrics["published"] == 10
+    assert metrics["max_queue_depth"] == 10
+    assert metrics["latency"]["state"]["count"] == 10
+
+
+def test_publish_returns_delivery_receipt():
+    class Info:
+        published = False
+
+        def is_published(self):
+            return self.published
+
+    info = Info()
+    client = Client()
+    client.publish = lambda *args, **kwargs: info
+    scheduler = OutboundScheduler(client, clock=Clock())
+    receipt = scheduler.publish("p/history", "{}", qos=1)
+    assert not receipt.is_published()
+    scheduler.send_one()
+    assert not receipt.is_published()
+    info.published = True
+    assert receipt.is_published()
+
+
+def test_full_queue_drops_oldest_background_then_state():
+    client = Client()
+    scheduler = OutboundScheduler(client, clock=Clock(), max_depth=4)
+    scheduler.publish("p/availability", "offline", retain=True)
+    scheduler.publish("p/history", "h1")
+    scheduler.publish("p/telemetry", "t1")
+    scheduler.publish("p/history", "h2")
+    scheduler.publish("p/telemetry", "t2")
+    scheduler.publish("p/telemetry", "t3")
+    scheduler.publish("p/telemetry", "t4")
+    assert scheduler.queue_depth == 4
+    assert scheduler.metrics()["dropped"] == 3
+
+    while scheduler.send_one():
+        pass
+    assert [payload for _, payload, _ in client.published] == [
+        "offline",
+        "t2",
+        "t3",
+        "t4",
+    ]
+
+
+def test_outage_keeps_heap_within_max_depth():
+    client = Client()
+    client.connected = False
+    scheduler = OutboundScheduler(client, clock=Clock(), max_depth=10)
+    for i in range(10_000):
+        scheduler.publish("p/history", str(i))
+        assert len(scheduler._heap) <= 10
+    assert scheduler.queue_depth == 10
+    assert scheduler.dropped == 9990
+
+    while scheduler.send_one():
+        pass
+    assert [payload for _, payload, _ in client.published] == [
+        str(i) for i in range(9990, 10_000)
+    ]
@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.poll_schedule import (  # noqa: E402
+    PollSchedule,
+    parse_poll_class_overrides,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_poll_schedule_reads_classes_at_their_rate():
+    clock = FakeClock()
+    schedule = PollSchedule(
+        {"serial": "static", "battery_type": "config", "pv_power": "live"},
+        config_refresh_interval=3600,
+        clock=clock,
+    )
+    assert schedule.due() == ["serial", "battery_type", "pv_power"]
+    schedule.mark_read(["serial", "battery_type", "pv_power"])
+
+    clock.now = 60
+    assert schedule.due() == ["pv_power"]
+    schedule.mark_read(["pv_power"])
+
+    clock.now = 3600
+    assert schedule.due() == ["battery_type", "pv_power"]
+
+
+def test_poll_schedule_retries_failed_and_invalidated_reads():
+    clock = FakeClock()
+    schedule = PollSchedule({"serial": "static", "mode": "config"}, clock=clock)
+    schedule.mark_read(["mode"])
+    assert schedule.due() == ["serial"]
+    schedule.invalidate("mode")
+    assert schedule.due() == ["serial", "mode"]
+
+
+def test_poll_schedule_backs_off_failed_slow_reads():
+    clock = FakeClock()
+    schedule = PollSchedule(
+        {"serial": "static", "mode": "config", "pv_power": "live"},
+        config_refresh_interval=3600,
+        clock=clock,
+    )
+    schedule.mark_failed(["serial", "mode", "pv_power"])
+
+    clock.now = 60
+    assert schedule.due() == ["pv_power"]
+
+    clock.now = 3600
+    assert schedule.due() == ["serial", "mode", "pv_power"]
+    schedule.mark_read(["serial"])
+    schedule.invalidate("mode")
+    assert schedule.due() == ["mode", "pv_power"]
+
+
+def test_parse_poll_class_overrides():
+    assert parse_poll_class_overrides(["battery_type = live"]) == {
+        "battery_type": "live"
+    }
+    with pytest.raises(ValueError):
+        parse_poll_class_overrides(["battery_type"])
+    with pytest.raises(ValueError):
+        parse_poll_class_overrides(["battery_type=hourly"])
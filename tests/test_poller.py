@@ -24,15 +24,57 @@ if not hasattr(framer_module, "FramerType"):
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 import vevor_eml3500_24l_rs232_wifi.poller as poller  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    ModbusRTUOverTCPClient,
+    RegisterSnapshot,
+)
 from vevor_eml3500_24l_rs232_wifi.poller import (  # noqa: E402
-    poll_once,
+    poll_cycle,
     publish_discovery,
     publish_telemetry,
     handle_command,
-    load_energy_state,
-    save_energy_state,
-    update_energy_state,
 )
+from vevor_eml3500_24l_rs232_wifi.simulator import encode_value  # noqa: E402
+
+
+def _bulk_reader(read):
+    """Wrap a per-register fake into a ``read_registers`` replacement."""
+
+    async def fake_read_registers(names, **kwargs):
+        snapshot = RegisterSnapshot()
+        for name in names:
+            try:
+                snapshot.values[name] = await read(name)
+            except Exception as exc:  # noqa: BLE001
+                snapshot.errors[name] = str(exc)
+        return snapshot
+
+    return fake_read_registers
+
+
+def _image_client(read):
+    """Return a client whose reads store the encoded values in its image."""
+    client = ModbusRTUOverTCPClient("example.com")
+    bulk = _bulk_reader(read)
+
+    async def fake_read_registers(names, **kwargs):
+        snapshot = await bulk(names)
+        for name in names:
+            reg = client.registers[name]
+            if name in snapshot.errors:
+                client.image.invalidate(reg.address, reg.count)
+            else:
+                words = encode_value(reg, snapshot.values[name])
+                client.image.update(reg.address, words, monotonic=1.0)
+        return snapshot
+
+    client.read_registers = AsyncMock(side_effect=fake_read_registers)
+    return client
+
+
+def _requested(client):
+    calls = client.read_registers.call_args_list
+    return {name for args, _ in calls for name in args[0]}
 
 
 def test_publish_discovery_includes_device_metadata():
@@ -123,8 +165,7 @@ def test_publish_telemetry_publishes_json():
 
 
 @pytest.mark.asyncio
-async def test_poll_once_reads_registers_and_decodes():
-    client = AsyncMock()
+async def test_poll_cycle_reads_registers_and_decodes():
 
     async def fake_read(name: str):
         mapping = {
@@ -152,8 +193,8 @@ async def test_poll_once_reads_registers_and_decodes():
         }
         return mapping.get(name, 0)
 
-    client.read_register.side_effect = fake_read
-    data, last_update = await poll_once(client)
+    client = _image_client(fake_read)
+    data, last_update = await poll_cycle(client)
 
     assert isinstance(last_update, str)
     assert last_update.endswith("Z")
@@ -181,10 +222,8 @@ async def test_poll_once_reads_registers_and_decodes():
     assert "Battery discharging" in data["power_flow_status"]
     assert "Mains charging" in data["power_flow_status"]
     assert "PV charging" in data["power_flow_status"]
-    client.read_register.assert_any_call("Equipment fault code")
-    client.read_register.assert_any_call(
-        "Obtain the warning code after shield processing"
-    )
+    assert "Equipment fault code" in _requested(client)
+    assert "Obtain the warning code after shield processing" in _requested(client)
 
 
 def test_format_decoded_list_truncates_long_states():
@@ -208,18 +247,17 @@ def test_add_derived_power_values_handles_signs():
 
 
 @pytest.mark.asyncio
-async def test_poll_once_logs_and_continues_on_error(caplog):
-    client = AsyncMock()
+async def test_poll_cycle_logs_and_continues_on_error(caplog):
 
     async def fake_read(register: str):
         if register == "Working mode":
             raise RuntimeError("boom")
         return 1
 
-    client.read_register.side_effect = fake_read
+    client = _image_client(fake_read)
 
     with caplog.at_level(logging.WARNING):
-        data, _ = await poll_once(client)
+        data, _ = await poll_cycle(client)
 
     assert data["working_mode"] is None
     assert data["mains_voltage"] == 1
@@ -269,7 +307,7 @@ async def test_handle_command_publishes_state():
         }
         return mapping[register]
 
-    modbus.read_register.side_effect = fake_read
+    modbus.read_registers.side_effect = _bulk_reader(fake_read)
 
     payload = json.dumps(
         {
@@ -305,8 +343,7 @@ async def test_handle_command_publishes_state():
 
 
 @pytest.mark.asyncio
-async def test_poll_once_reads_numeric_and_enum_registers():
-    client = AsyncMock()
+async def test_poll_cycle_reads_numeric_and_enum_registers():
 
     async def fake_read(name: str):
         mapping = {
@@ -315,20 +352,20 @@ async def test_poll_once_reads_numeric_and_enum_registers():
         }
         return mapping.get(name, 0)
 
-    client.read_register.side_effect = fake_read
-    data, _ = await poll_once(client)
+    client = _image_client(fake_read)
+    data, _ = await poll_cycle(client)
 
     assert data["max_charge_voltage"] == 56.0
     assert data["output_priority"] == "PV-mains-battery (SOL)"
-    client.read_register.assert_any_call("Maximum charge voltage [B]")
-    client.read_register.assert_any_call("Output priority")
+    assert "Maximum charge voltage [B]" in _requested(client)
+    assert "Output priority" in _requested(client)
 
 
 @pytest.mark.asyncio
 async def test_handle_command_writes_enum_and_publishes():
     modbus = AsyncMock()
     mqtt_client = MagicMock(spec=mqtt.Client)
-    modbus.read_register.return_value = 2
+    modbus.read_registers.side_effect = _bulk_reader(AsyncMock(return_value=2))
     await handle_command(
         modbus,
         "PV-battery-mains (SBU)",
@@ -346,7 +383,7 @@ async def test_handle_command_writes_enum_and_publishes():
 async def test_handle_command_writes_numeric_and_publishes():
     modbus = AsyncMock()
     mqtt_client = MagicMock(spec=mqtt.Client)
-    modbus.read_register.return_value = 57.0
+    modbus.read_registers.side_effect = _bulk_reader(AsyncMock(return_value=57.0))
     await handle_command(
         modbus,
         json.dumps({"max_charge_voltage": 57}),
@@ -361,14 +398,26 @@ async def test_handle_command_writes_numeric_and_publishes():
     )
 
 
-def test_energy_state_persistence(tmp_path, monkeypatch):
-    temp = tmp_path / "energy_state.json"
-    monkeypatch.setattr(poller, "ENERGY_STATE_FILE", temp)
-    state = load_energy_state()
+def _empty_energy_state():
+    state = {slug: 0.0 for slug in poller.ENERGY_SENSORS}
+    state["daily_date"] = datetime.now().date().isoformat()
+    return state
+
+
+def _integrate(data, state, seconds, integrator=None):
+    """Integrate constant *data* over *seconds* with an energy integrator."""
+    integrator = integrator or poller.EnergyIntegrator(max_gap=seconds + 1)
+    integrator.update(data, state, 1.0)
+    integrator.update(data, state, 1.0 + seconds)
+
+
+def test_energy_state_persistence(tmp_path):
+    journal = poller.energy_journal(tmp_path, compact_every=60)
+    state = journal.load()
     data = {"mains_power": 1000.0, "pv_power": 500.0, "battery_power": -200.0}
-    update_energy_state(data, state, 60)
-    save_energy_state(state)
-    reloaded = load_energy_state()
+    _integrate(data, state, 60)
+    journal.flush(state)
+    reloaded = poller.energy_journal(tmp_path, compact_every=60).load()
     assert reloaded["grid_import_energy"] == pytest.approx(1 / 60, rel=1e-3)
     assert reloaded["pv_energy"] == pytest.approx(0.5 / 60, rel=1e-3)
     assert reloaded["battery_charge_energy"] == pytest.approx(0.2 / 60, rel=1e-3)
@@ -378,23 +427,22 @@ def test_energy_state_persistence(tmp_path, monkeypatch):
     assert isinstance(reloaded["daily_date"], str)
 
 
-def test_energy_state_multiple_poll_cycles(tmp_path, monkeypatch):
-    temp = tmp_path / "energy_state.json"
-    monkeypatch.setattr(poller, "ENERGY_STATE_FILE", temp)
-
-    # First polling cycle
-    state = load_energy_state()
+def test_energy_state_multiple_poll_cycles(tmp_path):
+    # First run, compacted into the snapshot on shutdown
+    journal = poller.energy_journal(tmp_path, compact_every=60)
+    state = journal.load()
     data1 = {"mains_power": 1000.0, "pv_power": 500.0, "battery_power": -200.0}
-    update_energy_state(data1, state, 60)
-    save_energy_state(state)
+    _integrate(data1, state, 60)
+    journal.compact(state)
 
-    # Second cycle loads previous state and accumulates more energy
-    state = load_energy_state()
+    # Second run loads the previous state and accumulates more energy
+    journal = poller.energy_journal(tmp_path, compact_every=60)
+    state = journal.load()
     data2 = {"mains_power": 500.0, "pv_power": 250.0, "battery_power": -100.0}
-    update_energy_state(data2, state, 60)
-    save_energy_state(state)
+    _integrate(data2, state, 60)
+    journal.flush(state)
 
-    reloaded = load_energy_state()
+    reloaded = poller.energy_journal(tmp_path, compact_every=60).load()
     assert reloaded["grid_import_energy"] == pytest.approx(1.5 / 60, rel=1e-3)
     assert reloaded["pv_energy"] == pytest.approx(0.75 / 60, rel=1e-3)
     assert reloaded["battery_charge_energy"] == pytest.approx(0.3 / 60, rel=1e-3)
@@ -403,25 +451,25 @@ def test_energy_state_multiple_poll_cycles(tmp_path, monkeypatch):
     assert reloaded["battery_charge_energy_today"] == pytest.approx(0.3 / 60, rel=1e-3)
 
 
-def test_update_energy_state_handles_none_and_invalid_values():
+def test_energy_integrator_handles_none_and_invalid_values():
     state = {slug: 1.0 for slug in poller.ENERGY_SENSORS}
     state["daily_date"] = datetime.now().date().isoformat()
     initial = {slug: state[slug] for slug in poller.ENERGY_SENSORS}
     initial_date = state["daily_date"]
     data = {"mains_power": None, "pv_power": "invalid", "battery_power": None}
 
-    update_energy_state(data, state, 60)
+    _integrate(data, state, 60)
 
     for slug in poller.ENERGY_SENSORS:
         assert state[slug] == pytest.approx(initial[slug])
     assert state["daily_date"] == initial_date
 
 
-def test_update_energy_state_accumulates_daily_and_total(monkeypatch):
-    state = load_energy_state()
+def test_energy_integrator_accumulates_daily_and_total():
+    state = _empty_energy_state()
     original_date = state["daily_date"]
     data = {"mains_power": 1200.0, "pv_power": 300.0, "battery_power": -100.0}
-    update_energy_state(data, state, 120)
+    _integrate(data, state, 120)
     expected_grid = 1200.0 / 1000.0 * (120 / 3600.0)
     expected_pv = 300.0 / 1000.0 * (120 / 3600.0)
     expected_batt_charge = 100.0 / 1000.0 * (120 / 3600.0)
@@ -438,8 +486,50 @@ def test_update_energy_state_accumulates_daily_and_total(monkeypatch):
     assert state["daily_date"] == original_date
 
 
-def test_update_energy_state_resets_daily_counters_when_date_changes(monkeypatch):
-    state = load_energy_state()
+def test_energy_integrator_uses_trapezoid_between_sample_times():
+    integrator = poller.EnergyIntegrator(max_gap=300)
+    state = _empty_energy_state()
+    assert integrator.update({"mains_power": 1000.0}, state, 100.0) == 0.0
+    # A slow cycle: 90 s elapsed instead of the nominal interval.
+    assert integrator.update({"mains_power": 2000.0}, state, 190.0) == 90.0
+    assert state["grid_import_energy"] == pytest.approx(1.5 * 90 / 3600)
+    assert state["grid_import_energy_today"] == pytest.approx(1.5 * 90 / 3600)
+
+    # The same block read twice is not integrated again.
+    assert integrator.update({"mains_power": 2000.0}, state, 190.0) == 0.0
+    assert state["grid_import_energy"] == pytest.approx(1.5 * 90 / 3600)
+
+
+def test_energy_integrator_bridges_invalid_samples_and_skips_gaps(caplog):
+    integrator = poller.EnergyIntegrator(max_gap=300)
+    state = _empty_energy_state()
+    integrator.update({"pv_power": 600.0}, state, 10.0)
+    integrator.update({"pv_power": None}, state, 0.0)
+    integrator.update({"pv_power": 600.0}, state, 70.0)
+    assert state["pv_energy"] == pytest.approx(0.6 * 60 / 3600)
+
+    with caplog.at_level(logging.WARNING):
+        assert integrator.update({"pv_power": 600.0}, state, 1070.0) == 0.0
+    assert integrator.gaps == 1
+    assert integrator.gap_seconds == 1000.0
+    assert "not integrated" in caplog.text
+    assert state["pv_energy"] == pytest.approx(0.6 * 60 / 3600)
+
+    integrator.update({"pv_power": 600.0}, state, 1100.0)
+    assert state["pv_energy"] == pytest.approx(0.6 * 90 / 3600)
+
+
+def test_energy_sample_time_from_register_image():
+    image = poller.RegisterImage()
+    assert poller.energy_sample_time(image) == 0.0
+    image.update(200, [0] * 30, 5.0)
+    assert poller.energy_sample_time(image) == 5.0
+    image.update(223, [0], 7.0)
+    assert poller.energy_sample_time(image) == 7.0
+
+
+def test_energy_integrator_resets_daily_counters_when_date_changes(monkeypatch):
+    state = _empty_energy_state()
     state.update(
         {
             "grid_import_energy_today": 5.0,
@@ -458,7 +548,7 @@ def test_update_energy_state_resets_daily_counters_when_date_changes(monkeypatch
 
     monkeypatch.setattr(poller, "datetime", FakeDateTime)
 
-    update_energy_state({"mains_power": 600.0}, state, 60)
+    _integrate({"mains_power": 600.0}, state, 60)
 
     expected_grid = 600.0 / 1000.0 * (60 / 3600.0)
     assert state["grid_import_energy_today"] == pytest.approx(expected_grid, rel=1e-3)
@@ -466,3 +556,72 @@ def test_update_energy_state_resets_daily_counters_when_date_changes(monkeypatch
     assert state["pv_energy_today"] == 0.0
     assert state["battery_charge_energy_today"] == 0.0
     assert state["daily_date"] == "2024-01-02"
+
+
+def test_poll_classes_inferred_from_register_metadata():
+    assert poller.POLL_CLASSES["device_serial_number"] == "static"
+    assert poller.POLL_CLASSES["program_version"] == "static"
+    assert poller.POLL_CLASSES["max_charge_voltage"] == "config"
+    assert poller.POLL_CLASSES["run_log"] == "config"
+    assert poller.POLL_CLASSES["pv_power"] == "live"
+    assert poller.POLL_CLASSES["warnings"] == "live"
+    assert poller.POLL_CLASSES["run_the_log"] == "config"
+
+
+def test_history_slugs_leave_power_to_the_fast_lane():
+    cycle = poller.history_slugs(poller.POLL_CLASSES)
+    assert "pv_power" in cycle
+    assert "grid_import_power" in cycle
+    with_fast_lane = poller.history_slugs(poller.POLL_CLASSES, fast_lane=True)
+    for slug in (*poller.FAST_LANE_SLUGS, "grid_import_power", "pv_to_load_power"):
+        assert slug not in with_fast_lane
+    assert "battery_soc" in with_fast_lane
+    assert "grid_import_energy" in with_fast_lane
+
+
+def test_write_only_commands_are_not_polled():
+    classes = poller.polled_classes(poller.POLL_CLASSES)
+    for slug in ("force_eq_charge", "exit_fault_lock", "clear_records"):
+        assert poller.is_write_only(slug)
+        assert slug not in classes
+    assert "max_charge_voltage" in classes
+    assert "pv_power" in classes
+
+
+@pytest.mark.asyncio
+async def test_handle_command_reschedules_written_register():
+    modbus = AsyncMock()
+    schedule = poller.PollSchedule({"output_mode": "config"}, clock=lambda: 0.0)
+    schedule.mark_read(["output_mode"])
+    assert schedule.due() == []
+    await handle_command(modbus, "parallel", slug="output_mode", schedule=schedule)
+    assert schedule.due() == ["output_mode"]
+
+
+@pytest.mark.asyncio
+async def test_poll_cycle_reads_only_due_slugs():
+    client = _image_client(AsyncMock(return_value=5))
+    schedule = poller.PollSchedule(
+        {"pv_power": "live", "max_charge_voltage": "config"}, clock=lambda: 0.0
+    )
+    schedule.mark_read(["max_charge_voltage"])
+
+    data, _ = await poll_cycle(client, schedule)
+
+    assert _requested(client) == {"Average PV power"}
+    assert data["pv_power"] == 5
+    assert data["max_charge_voltage"] is None
+    assert schedule.due() == ["pv_power"]
+
+
+def test_entity_values_decode_from_register_image():
+    image = poller.RegisterImage()
+    image.update(201, [2, 2301], monotonic=1.0)
+    image.update(301, [1], monotonic=2.0)
+
+    data = poller.entity_values(image, ["working_mode", "mains_voltage", "pv_power"])
+
+    assert data["working_mode"] == poller.decode_working_mode(2)
+    assert data["mains_voltage"] == pytest.approx(230.1)
+    assert data["pv_power"] is None
+    assert poller.entity_values(image)["output_priority"] == "PV-mains-battery (SOL)"
@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.read_planner import (  # noqa: E402
+    MAX_READ_COUNT,
+    plan_reads,
+    split_block,
+)
+
+
+class Reg:
+    def __init__(self, name, address, count=1):
+        self.name = name
+        self.address = address
+        self.count = count
+
+
+def test_plan_reads_merges_contiguous_registers():
+    regs = [Reg("b", 202), Reg("a", 201), Reg("c", 203, 2)]
+    blocks = plan_reads(regs)
+    assert len(blocks) == 1
+    assert (blocks[0].address, blocks[0].count) == (201, 4)
+    assert [r.name for r in blocks[0].registers] == ["a", "b", "c"]
+
+
+def test_plan_reads_bridges_small_gaps_only():
+    regs = [Reg("a", 100), Reg("b", 104), Reg("c", 200)]
+    blocks = plan_reads(regs, max_gap=3)
+    assert [(b.address, b.count) for b in blocks] == [(100, 5), (200, 1)]
+    blocks = plan_reads(regs, max_gap=2)
+    assert [(b.address, b.count) for b in blocks] == [(100, 1), (104, 1), (200, 1)]
+
+
+def test_plan_reads_honours_max_count():
+    regs = [Reg(f"r{i}", 300 + i) for i in range(MAX_READ_COUNT + 10)]
+    blocks = plan_reads(regs)
+    assert [b.count for b in blocks] == [MAX_READ_COUNT, 10]
+
+
+def test_plan_reads_rejects_oversized_register():
+    with pytest.raises(ValueError):
+        plan_reads([Reg("huge", 0, MAX_READ_COUNT + 1)])
+
+
+def test_read_block_slice_returns_register_words():
+    regs = [Reg("serial", 186, 12), Reg("mode", 201)]
+    (block,) = plan_reads(regs, max_gap=10)
+    words = list(range(block.count))
+    assert list(block.slice(words, regs[1])) == [15]
+    assert len(block.slice(words, regs[0])) == 12
+
+
+def test_plan_reads_full_register_map_uses_few_transactions():
+    from vevor_eml3500_24l_rs232_wifi.modbus_client import (
+        DEFAULT_REGISTER_CSV,
+        load_register_definitions,
+    )
+
+    registers = load_register_definitions(DEFAULT_REGISTER_CSV)
+    readable = [r for r in registers.values() if "R" in r.access]
+    blocks = plan_reads(readable)
+    assert len(blocks) < len(readable) // 4
+    for block in blocks:
+        assert block.count <= MAX_READ_COUNT
+
+
+def test_split_block_keeps_aliases_together_and_skips_the_gap():
+    regs = [Reg("a", 100, 2), Reg("alias", 104), Reg("b", 104, 2), Reg("c", 108)]
+    (block,) = plan_reads(regs, max_gap=4)
+    lower, upper = split_block(block)
+    assert (lower.address, lower.count) == (100, 2)
+    assert (upper.address, upper.count) == (104, 5)
+    assert [r.name for r in upper.registers] == ["alias", "b", "c"]
+    (single,) = plan_reads([Reg("x", 10), Reg("y", 10, 2)])
+    assert split_block(single) is None
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    RegisterDefinition,
+)
+from vevor_eml3500_24l_rs232_wifi.register_image import (  # noqa: E402
+    IMAGE_END,
+    IMAGE_START,
+    RegisterImage,
+    image_decoder,
+)
+
+
+def _reg(name, address, data_format="UInt", count=1, scale=1.0):
+    return RegisterDefinition(name, "", data_format, address, count, "R", "", scale)
+
+
+def test_image_covers_documented_register_range():
+    image = RegisterImage()
+    assert len(image.words) == len(image.timestamps) == IMAGE_END - IMAGE_START
+    assert image.covers(100) and image.covers(745)
+    assert not image.covers(99) and not image.covers(745, 2)
+
+
+def test_update_stores_words_and_read_time_in_place():
+    image = RegisterImage()
+    words = image.words
+    image.update(201, [2, 2301, 0xFFF6], monotonic=12.5)
+    assert image.words is words
+    assert list(image.view(201, 3)) == [2, 2301, 0xFFF6]
+    assert image.read_time(201, 3) == 12.5
+    assert image.read_time(200, 2) == 0.0
+    image.update(95, [1] * 10, monotonic=1.0)
+    assert list(image.view(100, 5)) == [1] * 5
+
+
+def test_decode_and_invalidate():
+    image = RegisterImage()
+    voltage = _reg("voltage", 202, "Int", scale=0.1)
+    assert image.decode(voltage) is None
+    image.update(202, [0xFFF6], monotonic=1.0)
+    assert image.decode(voltage) == -1.0
+    image.invalidate(202)
+    assert image.decode(voltage) is None
+    assert image.words[202 - IMAGE_START] == 0xFFF6
+
+
+def test_decode_all_returns_only_valid_registers():
+    image = RegisterImage()
+    regs = [
+        _reg("mode", 201),
+        _reg("serial", 186, "ASC", count=12),
+        _reg("fault", 100, "ULong", count=2),
+    ]
+    decoder = image_decoder(regs, image)
+    image.update(201, [3], monotonic=1.0)
+    image.update(100, [1, 2], monotonic=1.0)
+    assert image.decode_all(decoder) == {"mode": 3.0, "fault": float(0x10002)}
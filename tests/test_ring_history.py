@@ -0,0 +1,73 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.ring_history import (  # noqa: E402
+    RecentHistory,
+    SensorHistory,
+)
+
+
+def test_ring_buffer_keeps_last_samples_in_fixed_arrays():
+    history = SensorHistory(capacity=3)
+    for t in range(1, 6):
+        assert history.append(float(t), t * 10.0)
+    assert len(history) == 3
+    assert history.series() == [(3.0, 30.0), (4.0, 40.0), (5.0, 50.0)]
+    assert history.series(since=4.0) == [(5.0, 50.0)]
+    assert history.latest() == (5.0, 50.0)
+    assert len(history.values) == 3 and history.values.typecode == "d"
+    assert history.times.typecode == "q"
+
+    # Repeated or older timestamps (same register read) are ignored.
+    assert not history.append(5.0, 99.0)
+    assert history.latest() == (5.0, 50.0)
+
+
+def test_rolling_stats_match_brute_force():
+    rng = random.Random(7)
+    history = SensorHistory(capacity=25, windows=(10.0,))
+    samples = []
+    now = 0.0
+    for _ in range(500):
+        now += rng.choice([0.5, 1.0, 2.0, 3.0])
+        value = rng.uniform(-500, 500)
+        history.append(now, value)
+        samples.append((now, value))
+        for window in (10.0, 40.0):
+            expected = [v for t, v in samples[-25:] if t >= now - window]
+            stats = history.stats(window)
+            assert stats["count"] == len(expected)
+            assert stats["mean"] == pytest.approx(sum(expected) / len(expected))
+            assert stats["min"] == min(expected)
+            assert stats["max"] == max(expected)
+
+
+def test_stats_window_ending_now_expires_old_samples():
+    history = SensorHistory()
+    history.append(1.0, 5.0)
+    history.append(2.0, 7.0)
+    assert history.stats(60, now=30.0)["mean"] == 6.0
+    assert history.stats(60, now=61.5) == {
+        "count": 1,
+        "mean": 7.0,
+        "min": 7.0,
+        "max": 7.0,
+    }
+    assert history.stats(60, now=100.0) is None
+
+
+def test_recent_history_records_only_numbers():
+    recent = RecentHistory(capacity=4)
+    recent.record(
+        {"pv_power": 120, "charger_status": "Float", "fault": True, "x": None}, 1.0
+    )
+    assert "pv_power" in recent
+    assert "charger_status" not in recent
+    assert "fault" not in recent
+    assert recent.stats("pv_power", 10)["max"] == 120.0
+    assert recent.stats("missing", 10) is None
@@ -0,0 +1,135 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.rtu_transport import (  # noqa: E402
+    FrameError,
+    NativeRTUClient,
+    RTUFrameProtocol,
+    build_read_request,
+    build_write_multiple_request,
+    build_write_single_request,
+    crc16,
+    parse_response,
+)
+
+
+def test_crc16_matches_known_frames():
+    # Reference frames from the Modbus over serial line specification.
+    assert build_read_request(1, 0x0000, 1) == bytes.fromhex("010300000001840a")
+    assert crc16(bytes.fromhex("0103000a0001")) == 0x08A4
+    assert build_write_single_request(1, 1, 3) == bytes.fromhex("010600010003980b")
+
+
+def test_write_multiple_request_layout():
+    frame = build_write_multiple_request(1, 0x0142, [0x1234, 0xABCD])
+    assert frame[:-2] == bytes.fromhex("0110014200020412" "34abcd")
+    assert crc16(frame[:-2]) == frame[-2] | (frame[-1] << 8)
+
+
+def _response(body: bytes) -> memoryview:
+    crc = crc16(body)
+    return memoryview(body + bytes((crc & 0xFF, crc >> 8)))
+
+
+def test_parse_read_response_words():
+    frame = _response(bytes.fromhex("010304000a8001"))
+    response = parse_response(frame, 1, 0x03)
+    assert not response.isError()
+    assert list(response.registers) == [10, 0x8001]
+
+
+def test_parse_exception_response():
+    response = parse_response(_response(bytes.fromhex("018302")), 1, 0x03)
+    assert response.isError()
+    assert response.exception_code == 2
+
+
+def test_parse_rejects_bad_crc_and_slave():
+    frame = bytearray(_response(bytes.fromhex("010302000a")))
+    frame[-1] ^= 0xFF
+    with pytest.raises(FrameError):
+        parse_response(memoryview(frame), 1, 0x03)
+    with pytest.raises(FrameError):
+        parse_response(_response(bytes.fromhex("020302000a")), 1, 0x03)
+
+
+@pytest.mark.asyncio
+async def test_protocol_reassembles_split_frames():
+    class Transport:
+        def write(self, data):
+            self.sent = data
+
+    protocol = RTUFrameProtocol()
+    protocol.transport = Transport()
+    future = protocol.request(build_read_request(1, 100, 2))
+    frame = bytes(_response(bytes.fromhex("01030400010002")))
+    protocol.data_received(frame[:3])
+    assert not future.done()
+    protocol.data_received(frame[3:])
+    assert list((await future).registers) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_protocol_fails_request_on_corrupted_frame():
+    class Transport:
+        def write(self, data):
+            self.sent = data
+
+    protocol = RTUFrameProtocol()
+    protocol.transport = Transport()
+    future = protocol.request(build_read_request(1, 100, 2))
+    frame = bytearray(_response(bytes.fromhex("01030400010002")))
+    frame[-1] ^= 0xFF
+    protocol.data_received(bytes(frame))
+    with pytest.raises(FrameError):
+        await future
+
+    # The buffer was reset, so the next request parses cleanly.
+    future = protocol.request(build_read_request(1, 100, 2))
+    protocol.data_received(bytes(_response(bytes.fromhex("01030400030004"))))
+    assert list((await future).registers) == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_native_client_connect_times_out(monkeypatch):
+    loop = asyncio.get_running_loop()
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(loop, "create_connection", hang)
+    client = NativeRTUClient("192.0.2.1", 502, timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await client.connect()
+    assert not client.connected
+
+
+@pytest.mark.asyncio
+async def test_native_client_round_trip():
+    async def handle(reader, writer):
+        request = await reader.readexactly(8)
+        assert request == build_read_request(1, 201, 2)
+        writer.write(bytes(_response(bytes.fromhex("0103040005fffe"))))
+        await writer.drain()
+        request = await reader.readexactly(8)
+        writer.write(request)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = NativeRTUClient("127.0.0.1", port)
+    async with server:
+        await client.connect()
+        assert client.connected
+        response = await client.read_holding_registers(201, count=2, slave=1)
+        assert list(response.registers) == [5, 0xFFFE]
+        response = await client.write_register(420, 1, slave=1)
+        assert not response.isError() and response.address == 420
+        client.close()
+    assert not client.connected
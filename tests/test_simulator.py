@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pymodbus")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.modbus_client import (  # noqa: E402
+    ModbusRTUOverTCPClient,
+)
+from vevor_eml3500_24l_rs232_wifi.rtu_transport import NativeRTUClient  # noqa: E402
+from vevor_eml3500_24l_rs232_wifi.simulator import (  # noqa: E402
+    EXC_ILLEGAL_ADDRESS,
+    EXC_MODE_LOCKED,
+    EXC_OUT_OF_RANGE,
+    EXC_READ_ONLY,
+    InverterSimulator,
+    frame_time,
+    load_error_codes,
+)
+
+
+def test_error_codes_loaded_from_csv():
+    codes = load_error_codes()
+    assert set(codes) == {EXC_READ_ONLY, EXC_OUT_OF_RANGE, EXC_MODE_LOCKED}
+
+
+def test_set_value_round_trips():
+    sim = InverterSimulator()
+    sim.set_values(
+        {
+            "Mains voltage effective value": -1.5,
+            "Equipment fault code": 0x10002,
+            "Device name": "EML3500",
+        }
+    )
+    assert sim.get_value("Mains voltage effective value") == -1.5
+    assert sim.get_value("Equipment fault code") == 0x10002
+    assert sim.get_value("Device name") == "EML3500"
+
+
+def test_frame_time_follows_baudrate():
+    assert frame_time(8, None) == 0.0
+    assert frame_time(8, 9600) == pytest.approx(8 * 10 / 9600)
+
+
+@pytest.mark.asyncio
+async def test_simulator_enforces_access_and_vendor_codes():
+    async with InverterSimulator() as sim:
+        client = NativeRTUClient("127.0.0.1", sim.port)
+        await client.connect()
+        try:
+            response = await client.read_holding_registers(425, count=1)
+            assert response.exception_code == EXC_ILLEGAL_ADDRESS
+            response = await client.write_register(201, 1)
+            assert response.exception_code == EXC_READ_ONLY
+            response = await client.write_register(301, 9)
+            assert response.exception_code == EXC_OUT_OF_RANGE
+            response = await client.write_register(301, 2)
+            assert not response.isError()
+            assert sim.get_value("Output priority") == 2
+
+            sim.set_value("Working mode", 3)
+            response = await client.write_register(460, 0xAA)
+            assert response.exception_code == EXC_MODE_LOCKED
+            sim.set_value("Working mode", 2)
+            response = await client.write_register(460, 0xAA)
+            assert not response.isError()
+        finally:
+            client.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("transport", ["pymodbus", "native"])
+async def test_client_reads_full_map_from_simulator(transport):
+    async with InverterSimulator() as sim:
+        sim.set_values({"Working mode": 2, "Average battery voltage": 52.4})
+        client = ModbusRTUOverTCPClient(
+            "127.0.0.1", port=sim.port, read_timeout=2.0, transport=transport
+        )
+        readable = [n for n, r in client.registers.items() if "R" in r.access]
+        try:
+            snapshot = await client.read_registers(readable, retries=1)
+            await client.write_register("Output priority", 1)
+        finally:
+            await client.close()
+    assert not snapshot.errors
+    assert snapshot.values["Working mode"] == 2
+    assert snapshot.values["Average battery voltage"] == pytest.approx(52.4)
+    assert len(snapshot.transactions) == len(client.plan(readable))
+    assert sim.get_value("Output priority") == 1
@@ -0,0 +1,165 @@
+import json
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from vevor_eml3500_24l_rs232_wifi.state_publisher import (  # noqa: E402
+    StatePublisher,
+    parse_deadband_overrides,
+)
+
+SENSORS = {
+    "pv_power": {"device_class": "power", "unit": "W"},
+    "battery_voltage": {"unit": "V"},
+    "output_priority": {"writable": True, "unit": "V"},
+    "working_mode": {},
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _topics(client):
+    return [args[0] for args, _ in client.publish.call_args_list]
+
+
+def test_parse_deadband_overrides():
+    assert parse_deadband_overrides(["power=10", "°C = 1.5"]) == {
+        "power": 10.0,
+        "°C": 1.5,
+    }
+    for bad in ("power", "=1", "power=abc", "power=-1"):
+        with pytest.raises(ValueError):
+            parse_deadband_overrides([bad])
+
+
+def test_publishes_only_changes_beyond_deadband():
+    client = MagicMock()
+    publisher = StatePublisher(client, "p", SENSORS, heartbeat_interval=60)
+    data = {
+        "pv_power": 100.0,
+        "battery_voltage": 52.0,
+        "output_priority": 1.0,
+        "working_mode": "Mains",
+        "last_update": "t0",
+    }
+    assert publisher.publish(data) == 5
+    assert "p/telemetry" in _topics(client)
+
+    client.reset_mock()
+    data.update(pv_power=104.0, battery_voltage=52.6, last_update="t1")
+    assert publisher.publish(data) == 2
+    assert _topics(client) == ["p/battery_voltage", "p/last_update", "p/telemetry"]
+
+    client.reset_mock()
+    # Drift is measured against the last published value, not the last cycle.
+    data.update(pv_power=105.0, output_priority=2.0, last_update="t2")
+    publisher.publish(data)
+    assert _topics(client) == [
+        "p/pv_power",
+        "p/output_priority",
+        "p/last_update",
+        "p/telemetry",
+    ]
+
+    client.reset_mock()
+    data.update(last_update="t3")
+    publisher.publish(data)
+    assert _topics(client) == ["p/last_update"]
+
+
+def test_heartbeat_and_reset_send_full_refresh():
+    client = MagicMock()
+    clock = Clock()
+    publisher = StatePublisher(
+        client, "p", SENSORS, heartbeat_interval=60, clock=clock
+    )
+    data = {"pv_power": 100.0, "working_mode": "Mains"}
+    publisher.publish(data)
+    client.reset_mock()
+    clock.now = 30
+    assert publisher.publish(data) == 0
+    assert not client.publish.called
+    clock.now = 61
+    assert publisher.publish(data) == 2
+
+    other = MagicMock()
+    publisher.reset(other)
+    assert publisher.publish(data) == 2
+    payload = json.loads(other.publish.call_args_list[-1][0][1])
+    assert payload == data
+
+
+def test_remember_tracks_command_echoes():
+    client = MagicMock()
+    publisher = StatePublisher(client, "p", SENSORS)
+    publisher.publish({"output_priority": 1.0})
+    publisher.remember({"output_priority": 2.0})
+    client.reset_mock()
+    publisher.publish({"output_priority": 1.0})
+    assert _topics(client) == ["p/output_priority", "p/telemetry"]
+
+
+def test_zero_heartbeat_publishes_every_cycle():
+    client = MagicMock()
+    publisher = StatePublisher(client, "p", SENSORS, heartbeat_interval=0)
+    publisher.publish({"pv_power": 1.0})
+    assert publisher.publish({"pv_power": 1.0}) == 1
+
+
+def test_grouped_publish_only_changed_groups():
+    client = MagicMock()
+    clock = Clock()
+    groups = {
+        "pv_power": "telemetry",
+        "battery_voltage": "telemetry",
+        "output_priority": "settings",
+        "working_mode": "diagnostics",
+    }
+    publisher = StatePublisher(
+        client, "p", SENSORS, heartbeat_interval=600, clock=clock, groups=groups
+    )
+    data = {
+        "pv_power": 100,
+        "battery_voltage": 52.0,
+        "output_priority": "SBU",
+        "working_mode": None,
+    }
+    assert publisher.publish(data) == 3
+    assert sorted(_topics(client)) == [
+        "p/state/diagnostics",
+        "p/state/settings",
+        "p/state/telemetry",
+    ]
+    payload = client.publish.call_args_list[-1].args[1]
+    assert json.loads(payload) == {"pv_power": 100, "battery_voltage": 52.0}
+
+    client.reset_mock()
+    clock.now = 10
+    assert publisher.publish({**data, "pv_power": 102}) == 0
+    assert publisher.publish({**data, "battery_voltage": 53.0}) == 1
+    assert _topics(client) == ["p/state/telemetry"]
+
+    client.reset_mock()
+    publisher.remember({"output_priority": "SUB"})
+    assert _topics(client) == ["p/state/settings"]
+    assert json.loads(client.publish.call_args.args[1]) == {
+        "output_priority": "SUB"
+    }
+
+
+def test_grouped_unknown_slug_goes_to_telemetry():
+    client = MagicMock()
+    publisher = StatePublisher(client, "p", SENSORS, groups={})
+    publisher.publish({"last_update": "now"})
+    assert _topics(client) == ["p/state/telemetry"]
+    assert json.loads(client.publish.call_args.args[1]) == {"last_update": "now"}
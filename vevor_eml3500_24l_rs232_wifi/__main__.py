@@ -0,0 +1,31 @@
+"""Command line tools: ``python -m vevor_eml3500_24l_rs232_wifi <command>``.
+
+The poller and the simulator keep their own module entry points; this one
+hosts the offline tools working on the add-on data.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Optional, Sequence
+
+from . import history_export
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m vevor_eml3500_24l_rs232_wifi")
+    commands = parser.add_subparsers(dest="command", required=True)
+    history_export.add_arguments(
+        commands.add_parser(
+            "export", help="Export the long-term history as CSV or JSON lines"
+        )
+    )
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        return history_export.run(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
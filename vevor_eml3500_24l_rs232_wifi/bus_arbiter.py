@@ -0,0 +1,102 @@
+"""Serialise Modbus transactions on the half-duplex RS232 link.
+
+The bridge forwards raw RTU frames to a single serial port, so two requests
+in flight at the same time corrupt each other. Every transaction therefore
+acquires the bus from a :class:`BusArbiter`, which grants it to waiting
+callers in priority order: user writes first, then on-demand refreshes,
+then scheduled polls. A poll cycle acquires the bus once per block, so a
+write queued in the middle of a cycle runs right after the current block.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from dataclasses import dataclass
+from enum import IntEnum
+import heapq
+import itertools
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Bus priorities; lower values are served first."""
+
+    WRITE = 0
+    REFRESH = 1
+    POLL = 2
+
+
+@dataclass
+class WaitStats:
+    """Queue wait time statistics for one priority."""
+
+    count: int = 0
+    total: float = 0.0
+    last: float = 0.0
+    max: float = 0.0
+
+    def record(self, wait: float) -> None:
+        self.count += 1
+        self.total += wait
+        self.last = wait
+        self.max = max(self.max, wait)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class BusArbiter:
+    """Grant exclusive bus access to one transaction at a time."""
+
+    def __init__(self) -> None:
+        self._busy = False
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self.stats: Dict[Priority, WaitStats] = {p: WaitStats() for p in Priority}
+
+    @property
+    def queue_depth(self) -> int:
+        """Return the number of transactions waiting for the bus."""
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    @contextlib.asynccontextmanager
+    async def transaction(
+        self, priority: Priority = Priority.POLL
+    ) -> AsyncIterator[float]:
+        """Hold the bus for one transaction, yielding the queue wait time."""
+        enqueued = time.monotonic()
+        if self._busy:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # The bus may have been handed over just before cancellation.
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+        else:
+            self._busy = True
+        wait = time.monotonic() - enqueued
+        self.stats[priority].record(wait)
+        if wait > 1.0:
+            logger.debug("%s transaction waited %.2fs for the bus", priority.name, wait)
+        try:
+            yield wait
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the bus straight to the next waiter; it stays busy.
+                waiter.set_result(None)
+                return
+        self._busy = False
@@ -0,0 +1,161 @@
+"""Precompiled decoders for register blocks.
+
+Decoding used to re-inspect ``data_format`` and build ``Decimal`` scales for
+every register on every read. Here each register is compiled once into a
+``struct`` format code plus a scaling function, and every planned block into
+a single :class:`struct.Struct`, so a block response is decoded with one
+``unpack_from`` call over its big-endian bytes.
+
+Scales are powers of ten (``0.1v``, ``0.01Hz``), kept as an integer mantissa
+and exponent: ``raw * mantissa / 10**n`` is a single correctly rounded float
+division, which gives exactly the result the ``Decimal`` arithmetic did.
+"""
+
+from __future__ import annotations
+
+from array import array
+from decimal import Decimal
+import struct
+import sys
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover - import only used for type hints
+    from .modbus_client import RegisterDefinition
+    from .read_planner import ReadBlock
+
+ASCII_FORMATS = {"ASC", "ASCII"}
+
+_SWAP_WORDS = sys.byteorder == "little"
+
+Scaler = Callable[[int], float]
+
+
+def scale_exponent(scale: float) -> Tuple[int, int]:
+    """Split *scale* into an integer mantissa and a power-of-ten exponent."""
+    sign, digits, exponent = Decimal(str(scale)).normalize().as_tuple()
+    mantissa = int("".join(map(str, digits)))
+    return (-mantissa if sign else mantissa), int(exponent)
+
+
+def make_scaler(scale: float) -> Scaler:
+    """Return a function applying *scale* to a raw integer exactly."""
+    mantissa, exponent = scale_exponent(scale)
+    if exponent < 0:
+        divisor = 10**-exponent
+        if mantissa == 1:
+            return lambda raw: raw / divisor
+        return lambda raw: raw * mantissa / divisor
+    factor = mantissa * 10**exponent
+    if factor == 1:
+        return float
+    return lambda raw: float(raw * factor)
+
+
+def _field(reg: "RegisterDefinition") -> Tuple[str, int, Callable[[tuple], Any]]:
+    """Return ``(struct code, item count, converter)`` for *reg*.
+
+    The converter receives the unpacked items belonging to the register.
+    """
+
+    if reg.data_format in ASCII_FORMATS:
+        return (
+            f"{reg.count * 2}s",
+            1,
+            lambda items: items[0].decode(errors="ignore").rstrip("\x00"),
+        )
+    if (reg.data_format == "ULong" and reg.count != 2) or reg.count < 1:
+        raise ValueError(
+            f"Unsupported width of {reg.count} registers for {reg.data_format}"
+            f" register {reg.name}"
+        )
+    scaler = make_scaler(reg.scale)
+    if reg.data_format == "ULong":
+        return "I" + "x" * (2 * (reg.count - 2)), 1, lambda items: scaler(items[0])
+    if reg.data_format == "Int":
+        return "h" + "x" * (2 * (reg.count - 1)), 1, lambda items: scaler(items[0])
+    if reg.data_format == "UInt":
+        return "H" + "x" * (2 * (reg.count - 1)), 1, lambda items: scaler(items[0])
+    if reg.count > 1:
+        return f"{reg.count}H", reg.count, lambda items: [scaler(i) for i in items]
+    return "H", 1, lambda items: scaler(items[0])
+
+
+def words_to_bytes(words: Sequence[int]) -> bytes:
+    """Return the big-endian bytes of a register word sequence."""
+    data = array("H", words)
+    if _SWAP_WORDS:
+        data.byteswap()
+    return data.tobytes()
+
+
+class RegisterDecoder:
+    """Decode the words of a single register."""
+
+    __slots__ = ("struct", "items", "convert")
+
+    def __init__(self, reg: "RegisterDefinition") -> None:
+        code, self.items, self.convert = _field(reg)
+        self.struct = struct.Struct(">" + code)
+
+    def decode_bytes(self, data: bytes | memoryview, offset: int = 0) -> Any:
+        return self.convert(self.struct.unpack_from(data, offset))
+
+    def __call__(self, words: Sequence[int]) -> Any:
+        return self.decode_bytes(words_to_bytes(words))
+
+
+class BlockDecoder:
+    """Decode every register of a planned block with one ``unpack_from``.
+
+    Registers that overlap (the vendor map has an ``Invalid data`` range
+    covering the program version) cannot share one sequential format; they
+    are decoded individually at their offset instead.
+    """
+
+    def __init__(self, block: "ReadBlock") -> None:
+        self.block = block
+        parts: List[str] = []
+        fields: List[Tuple[str, int, Callable[[tuple], Any]]] = []
+        self.extra: List[Tuple[str, int, RegisterDecoder]] = []
+        position = 0
+        for reg in block.registers:
+            offset = reg.address - block.address
+            if offset < position:
+                self.extra.append((reg.name, offset * 2, RegisterDecoder(reg)))
+                continue
+            if offset > position:
+                parts.append(f"{(offset - position) * 2}x")
+            code, items, convert = _field(reg)
+            parts.append(code)
+            fields.append((reg.name, items, convert))
+            position = offset + reg.count
+        self.struct = struct.Struct(">" + "".join(parts))
+        self.fields = fields
+
+    def decode_bytes(self, data: bytes | memoryview) -> Dict[str, Any]:
+        """Decode the big-endian response bytes of the block."""
+        items = self.struct.unpack_from(data)
+        values: Dict[str, Any] = {}
+        index = 0
+        for name, count, convert in self.fields:
+            values[name] = convert(items[index : index + count])
+            index += count
+        for name, offset, decoder in self.extra:
+            values[name] = decoder.decode_bytes(data, offset)
+        return values
+
+    def decode(self, words: Sequence[int]) -> Dict[str, Any]:
+        """Decode the block from its response words."""
+        return self.decode_bytes(words_to_bytes(words))
+
+
+_REGISTER_DECODERS: Dict[Tuple[str, int, float], RegisterDecoder] = {}
+
+
+def register_decoder(reg: "RegisterDefinition") -> RegisterDecoder:
+    """Return the (shared) compiled decoder for *reg*."""
+    key = (reg.data_format, reg.count, reg.scale)
+    decoder = _REGISTER_DECODERS.get(key)
+    if decoder is None:
+        decoder = _REGISTER_DECODERS[key] = RegisterDecoder(reg)
+    return decoder
@@ -0,0 +1,116 @@
+"""Skip republishing unchanged Home Assistant discovery payloads.
+
+Discovery and attributes messages are retained, so the broker already holds
+them after the first start. :class:`DiscoveryCache` stores a hash of every
+payload published per topic on disk and, on later starts and reconnects,
+only sends the topics whose payload changed. Topics that are no longer
+generated are cleared with an empty retained message so Home Assistant
+removes the entity. A forced publish (used when Home Assistant announces
+itself ``online``) resends everything.
+
+When the discovery layout changes between per-entity and device-based
+discovery, the old topics are handed over with Home Assistant's
+``migrate_discovery`` payload before being cleared, so the entities keep
+their registry entries and history.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_PREFIX = "homeassistant/"
+HA_STATUS_TOPIC = DISCOVERY_PREFIX + "status"
+MIGRATE_DISCOVERY_PAYLOAD = json.dumps({"migrate_discovery": True})
+
+
+def payload_digest(payload: str) -> str:
+    """Return the hash stored for a discovery payload."""
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class DiscoveryCache:
+    """Payload hashes of the retained discovery topics, persisted as JSON.
+
+    Without a *path* the hashes are only kept in memory.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self.hashes: Dict[str, str] = self._load()
+
+    def _load(self) -> Dict[str, str]:
+        if self.path is None:
+            return {}
+        try:
+            with self.path.open("r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as err:
+            logger.warning("Ignoring unreadable discovery cache %s: %s", self.path, err)
+            return {}
+        hashes = data.get("hashes") if isinstance(data, dict) else None
+        if not isinstance(hashes, dict):
+            return {}
+        return {str(topic): str(digest) for topic, digest in hashes.items()}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as fp:
+                json.dump({"hashes": self.hashes}, fp)
+            os.replace(tmp, self.path)
+        except OSError as err:
+            logger.warning("Could not save discovery cache %s: %s", self.path, err)
+
+    def publish(
+        self,
+        client: Any,
+        messages: Dict[str, str],
+        force: bool = False,
+        migrate: Iterable[str] = (),
+        force_prefix: str = "",
+    ) -> int:
+        """Publish changed (or, with *force*, all) messages retained.
+
+        Topics in *migrate* hold discovery configs whose entities move into
+        *messages*: they are marked for migration first and cleared last.
+        *force_prefix* limits a forced refresh to the topics starting with
+        it; the others are still only sent when they changed.
+        Returns the number of messages sent, including removals.
+        """
+
+        sent = 0
+        migrating = set(migrate) - messages.keys()
+        for topic in sorted(migrating):
+            client.publish(topic, MIGRATE_DISCOVERY_PAYLOAD, retain=True)
+            sent += 1
+        hashes: Dict[str, str] = {}
+        for topic, payload in messages.items():
+            digest = hashes[topic] = payload_digest(payload)
+            forced = force and topic.startswith(force_prefix)
+            if forced or self.hashes.get(topic) != digest:
+                client.publish(topic, payload, retain=True)
+                sent += 1
+        for topic in sorted((self.hashes.keys() - hashes.keys()) | migrating):
+            client.publish(topic, "", retain=True)
+            sent += 1
+        if hashes != self.hashes:
+            self.hashes = hashes
+            self.save()
+        logger.info(
+            "Published %d of %d discovery messages%s",
+            sent,
+            len(messages),
+            " (full refresh)" if force else "",
+        )
+        return sent
@@ -0,0 +1,221 @@
+"""Crash-safe persistence of the integrated energy counters.
+
+Rewriting the whole state file on every poll cycle wears out SD cards and
+loses every lifetime counter if the add-on dies mid-write. The counters are
+instead persisted as:
+
+* an append-only journal (``<name>.journal``) with one JSON line per flush
+  holding the counter increments since the previous flush, and
+* a snapshot (``<name>.json``) written atomically (temp file, ``fsync``,
+  rename) every ``compact_every`` flushes, after which the journal is
+  truncated.
+
+Journal records carry a sequence number and the snapshot stores the last
+one it includes, so a crash between the rename and the truncation does not
+count an increment twice. A day change is recorded with the record's date:
+replaying a record from a new day resets the daily counters first, exactly
+as the live integration does.
+
+All methods block; call them through ``asyncio.to_thread``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 60.0
+DEFAULT_COMPACT_EVERY = 60
+
+
+def write_snapshot(path: Path, payload: Dict[str, Any]) -> None:
+    """Replace *path* with *payload* atomically and durably."""
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fp:
+        json.dump(payload, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp, path)
+    try:
+        fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class EnergyJournal:
+    """Snapshot plus increment journal for a set of energy counters."""
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        slugs: Iterable[str],
+        daily_slugs: Iterable[str],
+        compact_every: int = DEFAULT_COMPACT_EVERY,
+    ) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path.with_suffix(".journal")
+        self.slugs = list(slugs)
+        self.daily_slugs = set(daily_slugs)
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._records = 0
+        self._flushed: Dict[str, float] = {}
+        self._date: Optional[str] = None
+
+    def _empty(self, date: str) -> Dict[str, Any]:
+        state: Dict[str, Any] = {slug: 0.0 for slug in self.slugs}
+        state["daily_date"] = date
+        return state
+
+    def _apply_values(self, state: Dict[str, Any], data: Dict[str, Any]) -> None:
+        for slug in self.slugs:
+            if slug in data:
+                state[slug] = _as_float(data[slug])
+        if isinstance(data.get("daily_date"), str):
+            state["daily_date"] = data["daily_date"]
+
+    def load(self, legacy: Optional[Path] = None) -> Dict[str, Any]:
+        """Rebuild the counters from the snapshot and the journal.
+
+        *legacy* is a plain state file from earlier releases, read only
+        when neither the snapshot nor the journal exist yet.
+        """
+
+        with self._lock:
+            state = self._empty(datetime.now().date().isoformat())
+            snapshot_seq = 0
+            source = self.snapshot_path
+            if (
+                legacy is not None
+                and not self.snapshot_path.exists()
+                and not self.journal_path.exists()
+            ):
+                source = legacy
+            try:
+                with source.open("r", encoding="utf-8") as fp:
+                    data = json.load(fp)
+                if isinstance(data, dict):
+                    self._apply_values(state, data)
+                    snapshot_seq = int(data.get("journal_seq", 0))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as err:
+                logger.error("Ignoring unreadable energy snapshot %s: %s", source, err)
+            self._seq = snapshot_seq
+            self._records = 0
+            replayed = 0
+            try:
+                with self.journal_path.open("r", encoding="utf-8") as fp:
+                    lines = fp.readlines()
+            except FileNotFoundError:
+                lines = []
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                    seq = int(record["seq"])
+                    increments = record["inc"]
+                except (ValueError, KeyError, TypeError):
+                    # A torn last line from a crash mid-append.
+                    continue
+                self._records += 1
+                if seq <= snapshot_seq:
+                    continue
+                self._replay(state, record.get("date"), increments)
+                self._seq = max(self._seq, seq)
+                replayed += 1
+            if replayed:
+                logger.info("Replayed %d energy journal records", replayed)
+            self._remember(state)
+            return state
+
+    def _replay(
+        self, state: Dict[str, Any], date: Any, increments: Dict[str, Any]
+    ) -> None:
+        if isinstance(date, str) and date != state.get("daily_date"):
+            for slug in self.daily_slugs:
+                state[slug] = 0.0
+            state["daily_date"] = date
+        for slug, amount in increments.items():
+            if slug in state:
+                state[slug] = _as_float(state[slug]) + _as_float(amount)
+
+    def _remember(self, state: Dict[str, Any]) -> None:
+        self._flushed = {slug: _as_float(state.get(slug)) for slug in self.slugs}
+        self._date = state.get("daily_date")
+
+    def flush(self, state: Dict[str, Any]) -> None:
+        """Journal the increments since the last flush; compact when due."""
+        with self._lock:
+            date = state.get("daily_date")
+            base = dict(self._flushed)
+            if date != self._date:
+                base.update(dict.fromkeys(self.daily_slugs, 0.0))
+            increments = {
+                slug: value - base.get(slug, 0.0)
+                for slug in self.slugs
+                if (value := _as_float(state.get(slug))) != base.get(slug, 0.0)
+            }
+            if not increments and date == self._date:
+                return
+            self._seq += 1
+            line = json.dumps(
+                {"seq": self._seq, "date": date, "inc": increments},
+                separators=(",", ":"),
+            )
+            try:
+                with self.journal_path.open("a", encoding="utf-8") as fp:
+                    fp.write(line + "\n")
+                    fp.flush()
+                    os.fsync(fp.fileno())
+            except OSError as err:
+                logger.error("Could not append to energy journal: %s", err)
+                self._seq -= 1
+                return
+            self._records += 1
+            self._remember(state)
+            if self._records >= self.compact_every:
+                self._compact(state)
+
+    def compact(self, state: Dict[str, Any]) -> None:
+        """Write the snapshot now and truncate the journal (on shutdown)."""
+        with self._lock:
+            self._compact(state)
+
+    def _compact(self, state: Dict[str, Any]) -> None:
+        payload: Dict[str, Any] = {
+            slug: _as_float(state.get(slug)) for slug in self.slugs
+        }
+        payload["daily_date"] = state.get("daily_date")
+        payload["journal_seq"] = self._seq
+        try:
+            write_snapshot(self.snapshot_path, payload)
+            # Records up to journal_seq are in the snapshot now; replay
+            # skips them even if this truncation never happens.
+            with self.journal_path.open("w", encoding="utf-8"):
+                pass
+        except OSError as err:
+            logger.error("Could not write energy snapshot: %s", err)
+            return
+        self._records = 0
+        self._remember(state)
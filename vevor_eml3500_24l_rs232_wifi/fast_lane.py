@@ -0,0 +1,115 @@
+"""High-rate sampling of the power registers between poll cycles.
+
+With one poll per ``poll_interval`` (60 s by default) the energy counters
+only see one power reading a minute, so load spikes between polls are
+missed. :class:`FastLane` reads just the power block every ``interval``
+seconds (one Modbus request, queued on the bus like any other poll) and:
+
+* hands every sample to ``on_sample`` so energy is integrated at full
+  resolution, and
+* records them in a :class:`~.ring_history.RecentHistory` so the poller can
+  publish one mean/min/max summary per poll window instead of one MQTT
+  message per sample.
+
+Slow registers keep their own schedule; the MQTT traffic grows by a single
+summary message per window.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .ring_history import RecentHistory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 2.0
+
+# ``sample()`` returns the monotonic read time and the decoded values, or
+# ``None`` when the read failed.
+Sample = Tuple[float, Dict[str, Any]]
+
+
+class FastLane:
+    """Sample a few registers at a fixed rate and summarise them per window."""
+
+    def __init__(
+        self,
+        sample: Callable[[], Awaitable[Optional[Sample]]],
+        interval: float = DEFAULT_INTERVAL,
+        on_sample: Optional[Callable[[Dict[str, Any], float], None]] = None,
+        history: Optional[RecentHistory] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.sample = sample
+        self.interval = interval
+        self.on_sample = on_sample
+        self.history = history if history is not None else RecentHistory()
+        self._clock = clock
+        self._slugs: Dict[str, None] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.failures = 0
+
+    def add(self, sampled_at: float, values: Dict[str, Any]) -> None:
+        """Record a sample and pass it on to ``on_sample``."""
+        self._slugs.update(dict.fromkeys(values))
+        self.history.record(values, sampled_at)
+        if self.on_sample is not None:
+            self.on_sample(values, sampled_at)
+
+    async def step(self) -> None:
+        """Take one sample."""
+        try:
+            result = await self.sample()
+        except Exception as err:  # noqa: BLE001
+            logger.debug("Fast lane sample failed: %s", err)
+            result = None
+        if result is None:
+            self.failures += 1
+            return
+        self.add(*result)
+
+    async def run(self) -> None:
+        """Sample every ``interval`` seconds; cancel the task to stop."""
+        next_due = self._clock()
+        while True:
+            await self.step()
+            next_due += self.interval
+            now = self._clock()
+            if next_due < now:
+                # A slow read: skip the missed ticks instead of bursting.
+                next_due = now
+            await asyncio.sleep(next_due - now)
+
+    def window(self, seconds: float) -> Dict[str, Any]:
+        """Summarise the samples of the last *seconds* per sampled value.
+
+        Numeric values get ``count``, ``mean``, ``min`` and ``max``; samples
+        where a value is missing are left out of that value's statistics.
+        """
+
+        now = self._clock()
+        summary: Dict[str, Any] = {"window": seconds}
+        for slug in self._slugs:
+            stats = self.history.stats(slug, seconds, now)
+            if stats is not None:
+                summary[slug] = {
+                    "count": stats["count"],
+                    "mean": round(stats["mean"], 1),
+                    "min": stats["min"],
+                    "max": stats["max"],
+                }
+        return summary
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
@@ -0,0 +1,201 @@
+"""Export of the long-term history as CSV or JSON lines.
+
+Used by ``python -m vevor_eml3500_24l_rs232_wifi export``. Rows stream from
+:func:`~.history_store.iter_history` through a formatter to the output one
+at a time, so exporting years of history needs no more memory than an
+hour. Rows are in long format, one line per entity and timestamp, because
+fast power samples and regular polls have different timestamps.
+
+For long ranges ``--tier auto`` reads the coarsest rollup still fine enough
+for the range instead of the raw samples.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Sequence, TextIO, Tuple
+
+from .history_store import (
+    DEFAULT_PATH,
+    RAW_FIELDS,
+    ROLLUP_FIELDS,
+    TIER_DAY,
+    TIER_HOUR,
+    TIER_MINUTE,
+    TIER_RAW,
+    TIERS,
+    iter_history,
+)
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+TIER_AUTO = "auto"
+
+# Finest tier used by ``--tier auto`` for ranges up to the given seconds.
+AUTO_TIERS: Tuple[Tuple[float, str], ...] = (
+    (2 * 86400.0, TIER_RAW),
+    (14 * 86400.0, TIER_MINUTE),
+    (730 * 86400.0, TIER_HOUR),
+)
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_duration(value: str) -> float:
+    """Parse durations such as ``90s``, ``15m``, ``24h``, ``7d`` or ``2w``."""
+    match = _DURATION.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration {value!r}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def parse_time(value: str) -> float:
+    """Parse an ISO 8601 date or time into unix seconds (local if naive)."""
+    try:
+        moment = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r}") from None
+    return moment.timestamp()
+
+
+def resolve_tier(tier: str, start: Optional[float], end: float) -> str:
+    """Return *tier*, or the tier ``auto`` picks for the range."""
+    if tier != TIER_AUTO:
+        return tier
+    if start is None:
+        return TIER_DAY
+    for span, candidate in AUTO_TIERS:
+        if end - start <= span:
+            return candidate
+    return TIER_DAY
+
+
+def _iso(timestamp: float) -> str:
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def format_rows(
+    rows: Iterable[Tuple[Any, ...]], fields: Sequence[str], fmt: str
+) -> Iterator[str]:
+    """Turn history rows into CSV or JSON-lines text, header first for CSV."""
+    if fmt == FORMAT_CSV:
+        buffer = _LineBuffer()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(fields)
+        yield buffer.take()
+        for row in rows:
+            writer.writerow((_iso(row[0]), *row[1:]))
+            yield buffer.take()
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(fields, (_iso(row[0]), *row[1:])))) + "\n"
+
+
+class _LineBuffer:
+    """Minimal file object collecting what ``csv.writer`` writes."""
+
+    def __init__(self) -> None:
+        self._parts: list = []
+
+    def write(self, text: str) -> int:
+        self._parts.append(text)
+        return len(text)
+
+    def take(self) -> str:
+        text = "".join(self._parts)
+        self._parts.clear()
+        return text
+
+
+def export(
+    output: TextIO,
+    path: Path,
+    slugs: Optional[Sequence[str]] = None,
+    tier: str = TIER_AUTO,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    fmt: str = FORMAT_CSV,
+) -> int:
+    """Write the selected history to *output*; returns the number of rows."""
+    end = time.time() if end is None else end
+    tier = resolve_tier(tier, start, end)
+    fields = RAW_FIELDS if tier == TIER_RAW else ROLLUP_FIELDS
+    count = 0
+
+    def counted(rows: Iterable[Tuple[Any, ...]]) -> Iterator[Tuple[Any, ...]]:
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    rows = counted(iter_history(path, slugs or None, tier, start, end))
+    for line in format_rows(rows, fields, fmt):
+        output.write(line)
+    return count
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--db",
+        default=str(DEFAULT_PATH),
+        help="History database written by the poller",
+    )
+    parser.add_argument(
+        "--slug",
+        action="append",
+        default=[],
+        help="Entity to export; repeat or separate with commas (default: all)",
+    )
+    parser.add_argument(
+        "--tier",
+        choices=(TIER_AUTO, *TIERS),
+        default=TIER_AUTO,
+        help="raw samples or a rollup tier; auto picks one from the range",
+    )
+    parser.add_argument("--start", help="Range start, ISO 8601 (local if no offset)")
+    parser.add_argument("--end", help="Range end, ISO 8601 (default: now)")
+    parser.add_argument(
+        "--last",
+        help="Range ending at --end, e.g. 24h or 30d (instead of --start)",
+    )
+    parser.add_argument("--format", choices=FORMATS, default=FORMAT_CSV)
+    parser.add_argument(
+        "--output", "-o", default="-", help="Output file (default: stdout)"
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    """Run the ``export`` command; returns the process exit code."""
+    try:
+        end = parse_time(args.end) if args.end else time.time()
+        if args.last:
+            start: Optional[float] = end - parse_duration(args.last)
+        else:
+            start = parse_time(args.start) if args.start else None
+    except ValueError as err:
+        print(f"error: {err}", file=sys.stderr)
+        return 2
+    slugs = [
+        slug.strip() for item in args.slug for slug in item.split(",") if slug.strip()
+    ]
+    path = Path(args.db)
+    if not path.exists():
+        print(f"error: history database {path} not found", file=sys.stderr)
+        return 1
+    if args.output == "-":
+        count = export(sys.stdout, path, slugs, args.tier, start, end, args.format)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as fp:
+            count = export(fp, path, slugs, args.tier, start, end, args.format)
+    print(f"Exported {count} rows", file=sys.stderr)
+    return 0
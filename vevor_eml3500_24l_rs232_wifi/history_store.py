@@ -0,0 +1,432 @@
+"""Long-term inverter history in a local SQLite database.
+
+Home Assistant's recorder keeps every state change of every entity at full
+resolution in one table and purges it after ten days by default, which is
+the wrong trade-off for inverter telemetry. :class:`HistoryStore` keeps it
+in a SQLite file under ``/data`` instead:
+
+* ``samples`` holds the raw values (wall-clock milliseconds), written in one
+  transaction per poll cycle;
+* ``rollup_minute``, ``rollup_hour`` and ``rollup_day`` hold per-bucket
+  ``count``/``sum``/``min``/``max``/``first``/``last`` (mean is
+  ``sum / count``) and, for energy counters, the increase (``delta``) over
+  the bucket.
+
+Rollups are incremental. Each tier stores a watermark, the end of the last
+bucket it folded in, and only reads source rows newer than that: minutes
+from raw samples, hours from minutes and days from hours. The cost of a
+rollup therefore depends on the new data only, not on the size of the
+history. Buckets are aligned to UTC.
+
+Retention is applied per tier (in days, ``0`` keeps forever), and never
+deletes rows that the next tier has not rolled up yet.
+
+All methods except :meth:`record` block; run them with
+``asyncio.to_thread``.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIER_RAW = "raw"
+TIER_MINUTE = "minute"
+TIER_HOUR = "hour"
+TIER_DAY = "day"
+# Rollup tiers, bucket size in ms and the tier they are computed from.
+ROLLUP_TIERS: Tuple[Tuple[str, int, str], ...] = (
+    (TIER_MINUTE, 60_000, TIER_RAW),
+    (TIER_HOUR, 3_600_000, TIER_MINUTE),
+    (TIER_DAY, 86_400_000, TIER_HOUR),
+)
+TIERS = (TIER_RAW, TIER_MINUTE, TIER_HOUR, TIER_DAY)
+# Columns of the rows returned by queries, per tier.
+RAW_FIELDS = ("timestamp", "slug", "value")
+ROLLUP_FIELDS = (
+    "timestamp",
+    "slug",
+    "count",
+    "mean",
+    "min",
+    "max",
+    "first",
+    "last",
+    "delta",
+)
+
+DEFAULT_PATH = Path("/data/history.sqlite3")
+
+DEFAULT_RETENTION: Dict[str, float] = {
+    TIER_RAW: 2,
+    TIER_MINUTE: 7,
+    TIER_HOUR: 365,
+    TIER_DAY: 0,
+}
+# Samples may still be written this long after their minute ended.
+ROLLUP_GRACE_MS = 5_000
+PURGE_INTERVAL = 3600.0
+
+_DAY_MS = 86_400_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensors (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    sensor INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS watermarks (
+    tier TEXT PRIMARY KEY,
+    ts INTEGER NOT NULL
+);
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_{tier} (
+    sensor INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    first REAL NOT NULL,
+    last REAL NOT NULL,
+    delta REAL,
+    PRIMARY KEY (sensor, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollup_{tier}_bucket ON rollup_{tier} (bucket);
+"""
+
+
+def parse_retention_overrides(items: Iterable[str]) -> Dict[str, float]:
+    """Parse ``tier=days`` strings into retention periods.
+
+    Raises ``ValueError`` for malformed entries, unknown tiers or negative
+    periods.
+    """
+
+    retention: Dict[str, float] = {}
+    for item in items:
+        tier, sep, value = item.partition("=")
+        tier = tier.strip().lower()
+        if not sep or not tier:
+            raise ValueError(f"Invalid retention {item!r}")
+        if tier not in TIERS:
+            raise ValueError(
+                f"Unknown history tier {tier!r}; expected one of {', '.join(TIERS)}"
+            )
+        try:
+            days = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid retention value in {item!r}") from None
+        if days < 0:
+            raise ValueError(f"Retention for {tier} must not be negative")
+        retention[tier] = days
+    return retention
+
+
+def _table(tier: str) -> str:
+    return "samples" if tier == TIER_RAW else f"rollup_{tier}"
+
+
+class HistoryStore:
+    """SQLite store of raw samples with incremental time-bucket rollups."""
+
+    def __init__(
+        self,
+        path: Path,
+        counters: Iterable[str] = (),
+        retention: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.counters = set(counters)
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Guards only the queue, so record() never waits for a flush or a
+        # rollup holding the database lock.
+        self._pending_lock = threading.Lock()
+        self._pending: List[Tuple[str, int, float]] = []
+        self._sensor_ids: Dict[str, int] = {}
+        self._purged: Optional[float] = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.executescript(SCHEMA)
+            for tier, _, _ in ROLLUP_TIERS:
+                self._db.executescript(ROLLUP_SCHEMA.format(tier=tier))
+        self._sensor_ids = dict(self._db.execute("SELECT slug, id FROM sensors"))
+
+    def record(self, values: Dict[str, Any], timestamp: float) -> None:
+        """Queue the numeric *values* sampled at unix time *timestamp*.
+
+        Nothing is written until :meth:`flush`; safe to call from the event
+        loop.
+        """
+
+        ts = int(timestamp * 1000)
+        rows = [
+            (slug, ts, float(value))
+            for slug, value in values.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        with self._pending_lock:
+            self._pending.extend(rows)
+
+    def _sensor_id(self, slug: str) -> int:
+        sensor = self._sensor_ids.get(slug)
+        if sensor is None:
+            cursor = self._db.execute("INSERT INTO sensors (slug) VALUES (?)", (slug,))
+            sensor = self._sensor_ids[slug] = int(cursor.lastrowid)
+        return sensor
+
+    def flush(self) -> int:
+        """Insert the queued samples in one transaction; returns the count."""
+        with self._lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO samples (sensor, ts, value) VALUES (?, ?, ?)",
+                    [(self._sensor_id(slug), ts, value) for slug, ts, value in rows],
+                )
+            return len(rows)
+
+    def _watermark(self, tier: str) -> int:
+        row = self._db.execute(
+            "SELECT ts FROM watermarks WHERE tier = ?", (tier,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def rollup(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Fold complete buckets into every tier; returns rows written per tier."""
+        now_ms = int((self._clock() if now is None else now) * 1000)
+        written: Dict[str, int] = {}
+        with self._lock, self._db:
+            limit = now_ms - ROLLUP_GRACE_MS
+            for tier, size, source in ROLLUP_TIERS:
+                start = self._watermark(tier)
+                until = limit - limit % size
+                if until > start:
+                    rows = self._rollup_tier(tier, size, source, start, until)
+                    if rows:
+                        written[tier] = rows
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO watermarks (tier, ts) VALUES (?, ?)",
+                        (tier, until),
+                    )
+                # The next tier may only use buckets this one has completed.
+                limit = max(until, start)
+        return written
+
+    def _rollup_tier(
+        self, tier: str, size: int, source: str, start: int, until: int
+    ) -> int:
+        if source == TIER_RAW:
+            time_col = "ts"
+            aggregates = "COUNT(*), SUM(value), MIN(value), MAX(value), NULL"
+            first_col = last_col = "value"
+        else:
+            time_col = "bucket"
+            aggregates = "SUM(count), SUM(sum), MIN(min), MAX(max), SUM(delta)"
+            first_col, last_col = "first", "last"
+        table = _table(source)
+        bucket = f"{time_col} - {time_col} % {size}"
+        where = f"WHERE {time_col} >= ? AND {time_col} < ? GROUP BY sensor, b"
+        params = (start, until)
+        rows: Dict[Tuple[int, int], List[Any]] = {}
+        for sensor, b, *values in self._db.execute(
+            f"SELECT sensor, {bucket} AS b, {aggregates} FROM {table} {where}",
+            params,
+        ):
+            count, total, low, high, delta = values
+            rows[(sensor, b)] = [count, total, low, high, None, None, delta]
+        # With a single MIN()/MAX() aggregate SQLite returns the other
+        # columns from the row holding the extreme.
+        for index, column, pick in ((4, first_col, "MIN"), (5, last_col, "MAX")):
+            for sensor, b, value, _ in self._db.execute(
+                f"SELECT sensor, {bucket} AS b, {column}, {pick}({time_col})"
+                f" FROM {table} {where}",
+                params,
+            ):
+                rows[(sensor, b)][index] = value
+        if source == TIER_RAW:
+            self._counter_deltas(tier, start, rows)
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO rollup_{tier} (sensor, bucket, count, sum, min,"
+            " max, first, last, delta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(sensor, b, *values) for (sensor, b), values in rows.items()],
+        )
+        return len(rows)
+
+    def _counter_deltas(
+        self, tier: str, start: int, rows: Dict[Tuple[int, int], List[Any]]
+    ) -> None:
+        """Set ``delta`` of counter buckets to the increase since the last one."""
+        counters = {
+            self._sensor_ids[slug] for slug in self.counters if slug in self._sensor_ids
+        }
+        previous: Dict[int, Optional[float]] = {}
+        for sensor, b in sorted(rows):
+            if sensor not in counters:
+                continue
+            if sensor not in previous:
+                row = self._db.execute(
+                    f"SELECT last FROM rollup_{tier} WHERE sensor = ? AND bucket < ?"
+                    " ORDER BY bucket DESC LIMIT 1",
+                    (sensor, start),
+                ).fetchone()
+                previous[sensor] = row[0] if row else None
+            values = rows[(sensor, b)]
+            base = previous[sensor]
+            first, last = values[4], values[5]
+            delta = last - (first if base is None else base)
+            # A counter that went backwards was reset; count from zero.
+            values[6] = last if delta < 0 else delta
+            previous[sensor] = last
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Apply the retention of every tier; returns the rows deleted."""
+        now_ms = int((self._clock() if now is None else now) * 1000)
+        deleted = 0
+        with self._lock, self._db:
+            for tier in TIERS:
+                days = self.retention.get(tier, 0)
+                if not days:
+                    continue
+                cutoff = now_ms - int(days * _DAY_MS)
+                # Keep what the next tier has not rolled up yet.
+                for rollup, _, source in ROLLUP_TIERS:
+                    if source == tier:
+                        cutoff = min(cutoff, self._watermark(rollup))
+                column = "ts" if tier == TIER_RAW else "bucket"
+                cursor = self._db.execute(
+                    f"DELETE FROM {_table(tier)} WHERE {column} < ?", (cutoff,)
+                )
+                deleted += cursor.rowcount
+        if deleted:
+            logger.info("Purged %d history rows past retention", deleted)
+        return deleted
+
+    def maintain(self) -> None:
+        """Flush, roll up and, once an hour, purge; call once per cycle."""
+        self.flush()
+        self.rollup()
+        now = self._clock()
+        if self._purged is None or now - self._purged >= PURGE_INTERVAL:
+            self._purged = now
+            self.purge()
+
+    def query(
+        self,
+        slug: str,
+        tier: str = TIER_RAW,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the rows of *slug* in *tier* between unix times *start*/*end*."""
+        if tier not in TIERS:
+            raise ValueError(f"Unknown history tier {tier!r}")
+        column = "ts" if tier == TIER_RAW else "bucket"
+        fields = (
+            "ts, value"
+            if tier == TIER_RAW
+            else "bucket, count, sum / count, min, max, first, last, delta"
+        )
+        names = (
+            ("timestamp", "value")
+            if tier == TIER_RAW
+            else ("timestamp", "count", "mean", "min", "max", "first", "last", "delta")
+        )
+        with self._lock:
+            sensor = self._sensor_ids.get(slug)
+            if sensor is None:
+                return []
+            cursor = self._db.execute(
+                f"SELECT {fields} FROM {_table(tier)} WHERE sensor = ?"
+                f" AND {column} >= ? AND {column} < ? ORDER BY {column}",
+                (
+                    sensor,
+                    0 if start is None else int(start * 1000),
+                    2**62 if end is None else int(end * 1000),
+                ),
+            )
+            rows = cursor.fetchall()
+        return [
+            {**dict(zip(names, row)), "timestamp": row[0] / 1000} for row in rows
+        ]
+
+    def sensors(self) -> List[str]:
+        return sorted(self._sensor_ids)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def iter_history(
+    path: Path,
+    slugs: Optional[Iterable[str]] = None,
+    tier: str = TIER_RAW,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    batch_size: int = 1000,
+) -> Iterator[Tuple[Any, ...]]:
+    """Stream rows of *tier* between unix times *start* and *end*, oldest first.
+
+    Rows are tuples laid out as :data:`RAW_FIELDS` or :data:`ROLLUP_FIELDS`
+    with the timestamp in unix seconds. The database is opened read-only
+    and read ``batch_size`` rows at a time, so memory use does not depend on
+    the length of the range and a running poller is not blocked.
+    """
+
+    if tier not in TIERS:
+        raise ValueError(f"Unknown history tier {tier!r}")
+    db = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        sensors = dict(db.execute("SELECT id, slug FROM sensors"))
+        if slugs is not None:
+            wanted = set(slugs)
+            sensors = {id_: slug for id_, slug in sensors.items() if slug in wanted}
+        if not sensors:
+            return
+        column = "ts" if tier == TIER_RAW else "bucket"
+        fields = (
+            "ts, sensor, value"
+            if tier == TIER_RAW
+            else "bucket, sensor, count, sum / count, min, max, first, last, delta"
+        )
+        marks = ", ".join("?" * len(sensors))
+        cursor = db.execute(
+            f"SELECT {fields} FROM {_table(tier)} WHERE {column} >= ?"
+            f" AND {column} < ? AND sensor IN ({marks}) ORDER BY {column}, sensor",
+            (
+                0 if start is None else int(start * 1000),
+                2**62 if end is None else int(end * 1000),
+                *sensors,
+            ),
+        )
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for ts, sensor, *values in batch:
+                yield (ts / 1000, sensors[sensor], *values)
+    finally:
+        db.close()
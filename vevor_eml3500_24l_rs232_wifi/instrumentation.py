@@ -0,0 +1,327 @@
+"""Timing hooks around the steps of a poll cycle.
+
+The poller and the Modbus client wrap their hot paths in
+:meth:`Instrumentation.span`: every bus transaction, block decode, derived
+value step, state publish and the whole cycle. Registered :class:`Hook`
+objects get a callback when a span starts and when it ends, with its
+duration. Without hooks ``span()`` returns a shared no-op context manager,
+so the instrumentation reads no clock and allocates nothing per span.
+
+Two hooks ship with the add-on and can be switched on at runtime through
+MQTT (see :class:`HookSwitch`), to diagnose slow cycles on a live device
+without a restart:
+
+* :class:`JsonLinesTracer` appends one JSON object per finished span,
+  buffered in memory and written by a worker thread once per cycle;
+* :class:`SamplingProfiler` runs ``cProfile`` over one cycle in every
+  ``every`` and saves the stats next to the trace.
+"""
+
+from __future__ import annotations
+
+import cProfile
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import logging
+import pstats
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, TextIO
+
+logger = logging.getLogger(__name__)
+
+SPAN_CYCLE = "cycle"
+SPAN_TRANSACTION = "transaction"
+SPAN_DECODE = "decode"
+SPAN_DERIVE = "derive"
+SPAN_PUBLISH = "publish"
+
+HOOK_TRACE = "trace"
+HOOK_PROFILE = "profile"
+HOOKS = (HOOK_TRACE, HOOK_PROFILE)
+
+TRACE_FILE = "trace.jsonl"
+DEFAULT_TRACE_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_TRACE_FLUSH_RECORDS = 1000
+DEFAULT_PROFILE_EVERY = 10
+DEFAULT_PROFILE_TOP = 15
+
+
+class Span:
+    """One timed step; ``duration`` is set when it ends."""
+
+    __slots__ = ("_owner", "name", "attrs", "started", "wall", "duration", "error")
+
+    def __init__(
+        self, owner: "Instrumentation", name: str, attrs: Dict[str, Any]
+    ) -> None:
+        self._owner = owner
+        self.name = name
+        self.attrs = attrs
+        self.started = 0.0
+        self.wall = 0.0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def __enter__(self) -> "Span":
+        self.wall = time.time()
+        self._owner._notify("start", self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self._owner._notify("end", self)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Hook:
+    """Receives span callbacks; override the ones you need."""
+
+    def start(self, span: Span) -> None:
+        pass
+
+    def end(self, span: Span) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class Instrumentation:
+    """Registry of hooks notified around instrumented steps.
+
+    Hooks run in the event loop thread and must be quick. A hook that
+    raises is removed so it cannot break polling.
+    """
+
+    def __init__(self) -> None:
+        self.hooks: List[Hook] = []
+
+    def add(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+
+    def remove(self, hook: Hook) -> None:
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+        hook.close()
+
+    def span(self, name: str, **attrs: Any):
+        """Return a context manager timing the step *name*."""
+        if not self.hooks:
+            return _NULL_SPAN
+        return Span(self, name, attrs)
+
+    def _notify(self, event: str, span: Span) -> None:
+        for hook in list(self.hooks):
+            try:
+                getattr(hook, event)(span)
+            except Exception:  # noqa: BLE001
+                logger.exception("Instrumentation hook %r failed; removed", hook)
+                self.remove(hook)
+
+
+class JsonLinesTracer(Hook):
+    """Append every finished span to a JSON-lines file.
+
+    Each line holds the wall clock start ``ts``, the span name, its
+    duration in milliseconds and its attributes. Records are collected in
+    memory and handed to a worker thread when a cycle span ends (or after
+    *flush_records* spans), so the event loop never waits for the disk.
+    The worker also opens the file on its first batch and closes it, and
+    rotates it to ``<name>.1`` when it grows past *max_bytes*.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = DEFAULT_TRACE_MAX_BYTES,
+        flush_records: int = DEFAULT_TRACE_FLUSH_RECORDS,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.flush_records = flush_records
+        self._fp: Optional[TextIO] = None
+        self._records: List[Dict[str, Any]] = []
+        # One worker keeps the batches in order; only it touches the file.
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="trace")
+
+    def end(self, span: Span) -> None:
+        record = {
+            "ts": round(span.wall, 6),
+            "span": span.name,
+            "ms": round(span.duration * 1000, 3),
+            **span.attrs,
+        }
+        if span.error:
+            record["error"] = span.error
+        self._records.append(record)
+        if span.name == SPAN_CYCLE or len(self._records) >= self.flush_records:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the buffered records to the writer thread."""
+        if self._records:
+            records, self._records = self._records, []
+            self._writer.submit(self._write, records)
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            if self._fp is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fp = open(self.path, "a", encoding="utf-8")
+            for record in records:
+                self._fp.write(json.dumps(record, default=str) + "\n")
+                if self.max_bytes and self._fp.tell() >= self.max_bytes:
+                    self._fp.close()
+                    self.path.replace(self.path.with_name(self.path.name + ".1"))
+                    self._fp = open(self.path, "a", encoding="utf-8")
+            self._fp.flush()
+        except OSError:
+            logger.exception("Cannot write trace to %s", self.path)
+
+    def _close_file(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def close(self) -> None:
+        """Write the remaining records and close the file, without waiting."""
+        self.flush()
+        self._writer.submit(self._close_file)
+        self._writer.shutdown(wait=False)
+
+
+class SamplingProfiler(Hook):
+    """Profile one *span* in every *every* with ``cProfile``.
+
+    The profile covers everything the event loop runs while the span is
+    open, including concurrent tasks. Stats are saved as
+    ``profile-<time>-<n>.prof`` in *directory* (readable with ``pstats`` or
+    snakeviz) and the top functions by cumulative time are logged.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        every: int = DEFAULT_PROFILE_EVERY,
+        span: str = SPAN_CYCLE,
+        top: int = DEFAULT_PROFILE_TOP,
+    ) -> None:
+        self.directory = Path(directory)
+        self.every = max(int(every), 1)
+        self.span = span
+        self.top = top
+        self._seen = 0
+        self._active: Optional[Span] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self.saved: List[Path] = []
+
+    def start(self, span: Span) -> None:
+        if span.name != self.span or self._active is not None:
+            return
+        self._seen += 1
+        if (self._seen - 1) % self.every:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as err:
+            # Another profiler is already attached to the interpreter.
+            logger.warning("Cannot start profiler: %s", err)
+            return
+        self._active = span
+        self._profile = profile
+
+    def end(self, span: Span) -> None:
+        if span is not self._active or self._profile is None:
+            return
+        self._profile.disable()
+        profile, self._profile, self._active = self._profile, None, None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(span.wall))
+        path = self.directory / f"profile-{stamp}-{self._seen}.prof"
+        profile.dump_stats(path)
+        self.saved.append(path)
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(
+            self.top
+        )
+        logger.info(
+            "Profiled %s of %.3f s, saved to %s\n%s",
+            span.name,
+            span.duration,
+            path,
+            report.getvalue().strip(),
+        )
+
+    def close(self) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile = self._active = None
+
+
+def parse_hook_command(payload: str) -> Set[str]:
+    """Parse ``trace``, ``profile``, ``trace,profile`` or ``off``."""
+    names = {part.strip().lower() for part in payload.split(",") if part.strip()}
+    if names <= {"off", "none"}:
+        return set()
+    unknown = names - set(HOOKS)
+    if unknown:
+        names = ", ".join(sorted(unknown))
+        raise ValueError(f"Unknown instrumentation hook(s): {names}")
+    return names
+
+
+class HookSwitch:
+    """Enable the built-in hooks by name, e.g. from an MQTT command."""
+
+    def __init__(
+        self,
+        instrumentation: Instrumentation,
+        directory: Path,
+        profile_every: int = DEFAULT_PROFILE_EVERY,
+    ) -> None:
+        self.instrumentation = instrumentation
+        directory = Path(directory)
+        self._factories: Dict[str, Callable[[], Hook]] = {
+            HOOK_TRACE: lambda: JsonLinesTracer(directory / TRACE_FILE),
+            HOOK_PROFILE: lambda: SamplingProfiler(directory, profile_every),
+        }
+        self.enabled: Dict[str, Hook] = {}
+
+    @property
+    def state(self) -> str:
+        return ",".join(name for name in HOOKS if name in self.enabled) or "off"
+
+    def apply(self, payload: str) -> str:
+        """Enable exactly the hooks named in *payload*; returns the new state."""
+        wanted = parse_hook_command(payload)
+        for name in [name for name in self.enabled if name not in wanted]:
+            self.instrumentation.remove(self.enabled.pop(name))
+            logger.info("Instrumentation hook %s disabled", name)
+        for name in HOOKS:
+            if name in wanted and name not in self.enabled:
+                hook = self._factories[name]()
+                self.enabled[name] = hook
+                self.instrumentation.add(hook)
+                logger.info("Instrumentation hook %s enabled", name)
+        return self.state
+
+    def close(self) -> None:
+        self.apply("off")
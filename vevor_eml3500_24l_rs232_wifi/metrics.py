@@ -0,0 +1,195 @@
+"""OpenMetrics exposition for Prometheus, served from the poller event loop.
+
+:class:`Histogram` collects latency distributions where they are measured
+(Modbus transactions, poll cycles). Everything else is read from the live
+objects when Prometheus scrapes: the poller passes a ``render`` callback
+that fills an :class:`OpenMetricsWriter`, so idle metrics cost nothing.
+
+:class:`MetricsServer` is a minimal HTTP/1.1 server built on
+``asyncio.start_server``: it runs on the poller's loop without a thread or
+an extra dependency and answers ``GET /metrics`` only.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9105
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds; spans a fast local bridge up to the 5 s read timeout.
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CYCLE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+REQUEST_TIMEOUT = 5.0
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class CycleStats:
+    """Durations of poll cycles and how often they overran the interval."""
+
+    def __init__(self) -> None:
+        self.duration = Histogram(CYCLE_BUCKETS)
+        self.overruns = 0
+
+    def record(self, duration: float, interval: float) -> None:
+        self.duration.observe(duration)
+        if duration > interval:
+            self.overruns += 1
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_bound(bound: float) -> str:
+    # OpenMetrics wants canonical floats in ``le``: "1.0", not "1".
+    if bound == float("inf"):
+        return "+Inf"
+    return repr(float(bound))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class OpenMetricsWriter:
+    """Build an OpenMetrics text exposition.
+
+    Samples of one metric family must be written one after another; the
+    ``TYPE`` and ``HELP`` lines are emitted before the first one.
+    """
+
+    def __init__(self, namespace: str = "") -> None:
+        self.namespace = namespace
+        self._lines: List[str] = []
+        self._families: Dict[str, str] = {}
+
+    def _family(self, name: str, kind: str, help_text: str) -> str:
+        name = f"{self.namespace}_{name}" if self.namespace else name
+        if name not in self._families:
+            self._families[name] = kind
+            self._lines.append(f"# TYPE {name} {kind}")
+            self._lines.append(f"# HELP {name} {_escape(help_text)}")
+        return name
+
+    def _sample(
+        self, name: str, value: float, labels: Optional[Dict[str, str]] = None
+    ) -> None:
+        if labels:
+            rendered = ",".join(
+                f'{key}="{_escape(str(val))}"' for key, val in labels.items()
+            )
+            name = f"{name}{{{rendered}}}"
+        self._lines.append(f"{name} {_format_value(value)}")
+
+    def counter(
+        self, name: str, help_text: str, value: float, **labels: str
+    ) -> None:
+        family = self._family(name, "counter", help_text)
+        self._sample(f"{family}_total", value, labels)
+
+    def gauge(self, name: str, help_text: str, value: float, **labels: str) -> None:
+        family = self._family(name, "gauge", help_text)
+        self._sample(family, value, labels)
+
+    def histogram(
+        self, name: str, help_text: str, histogram: Histogram, **labels: str
+    ) -> None:
+        family = self._family(name, "histogram", help_text)
+        cumulative = 0
+        bounds = (*histogram.buckets, float("inf"))
+        for bound, count in zip(bounds, histogram.counts):
+            cumulative += count
+            self._sample(
+                f"{family}_bucket", cumulative, {**labels, "le": _format_bound(bound)}
+            )
+        self._sample(f"{family}_sum", histogram.sum, labels)
+        self._sample(f"{family}_count", histogram.count, labels)
+
+    def render(self) -> str:
+        return "\n".join([*self._lines, "# EOF"]) + "\n"
+
+
+class MetricsServer:
+    """Serve ``render()`` on ``GET /metrics``."""
+
+    def __init__(
+        self,
+        render: Callable[[], str],
+        host: str = "0.0.0.0",
+        port: int = DEFAULT_PORT,
+    ) -> None:
+        self.render = render
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        sockets = self._server.sockets or ()
+        if sockets:
+            self.port = sockets[0].getsockname()[1]
+        logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            method, _, rest = request.decode("latin-1").partition(" ")
+            path = rest.split(" ", 1)[0].split("?", 1)[0]
+            if method not in ("GET", "HEAD"):
+                status, content_type, body = "405 Method Not Allowed", "text/plain", b""
+            elif path != "/metrics":
+                status, content_type, body = "404 Not Found", "text/plain", b""
+            else:
+                status, content_type = "200 OK", CONTENT_TYPE
+                body = self.render().encode()
+            head = (
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            )
+            writer.write(head.encode() + (body if method == "GET" else b""))
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to serve metrics")
+        finally:
+            writer.close()
@@ -9,16 +9,31 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import csv
-from dataclasses import dataclass
-from decimal import Decimal
+from dataclasses import dataclass, field
 import inspect
 import logging
 from pathlib import Path
-from typing import Callable, Dict, Iterable, Optional
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
 from pymodbus.framer import FramerType
 
+from .bus_arbiter import BusArbiter, Priority
+from .decode_plan import BlockDecoder, register_decoder
+from .instrumentation import SPAN_DECODE, SPAN_TRANSACTION, Instrumentation
+from .metrics import Histogram
+from .read_planner import (
+    DEFAULT_MAX_GAP,
+    ReadBlock,
+    covering_block,
+    plan_reads,
+    split_block,
+)
+from .register_image import RegisterImage
+from .rtu_transport import NativeRTUClient
+
 logger = logging.getLogger(__name__)
 
 
@@ -36,6 +51,74 @@ class RegisterDefinition:
     scale: float = 1.0
 
 
+class ModbusResponseError(RuntimeError):
+    """Raised when the inverter answers a request with an exception response."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of talking to a bridge that is considered unreachable."""
+
+
+# Errors raised by the network path to the bridge, as opposed to the inverter
+# rejecting a request. ``asyncio.TimeoutError`` is listed separately because it
+# is an ``OSError`` subclass on recent Python versions.
+TRANSPORT_ERRORS = (ConnectionError, OSError, ModbusException)
+
+TRANSPORT_PYMODBUS = "pymodbus"
+TRANSPORT_NATIVE = "native"
+TRANSPORTS = (TRANSPORT_PYMODBUS, TRANSPORT_NATIVE)
+
+
+@dataclass
+class Transaction:
+    """Timing of a single block read."""
+
+    address: int
+    count: int
+    timestamp: float
+    monotonic: float
+    duration: float
+
+
+@dataclass
+class TransportStats:
+    """Modbus transport counters since startup, exported as metrics.
+
+    ``latency`` holds the duration of successful requests on the wire, per
+    operation (``read``/``write``), without the time spent waiting for the
+    bus.
+    """
+
+    requests: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    connects: int = 0
+    latency: Dict[str, Histogram] = field(
+        default_factory=lambda: {"read": Histogram(), "write": Histogram()}
+    )
+
+
+@dataclass
+class RegisterSnapshot:
+    """Result of a bulk read, keyed by register name.
+
+    ``values`` holds the scaled values and ``raw`` the words they were decoded
+    from. ``timestamps`` (wall clock) and ``monotonic`` record when the block
+    containing each register was received. Registers whose block could not be
+    read are listed in ``errors`` instead; ``aborted`` is set when the circuit
+    breaker opened and the rest of the request was skipped.
+    """
+
+    values: Dict[str, Any] = field(default_factory=dict)
+    raw: Dict[str, List[int]] = field(default_factory=dict)
+    timestamps: Dict[str, float] = field(default_factory=dict)
+    monotonic: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    transactions: List[Transaction] = field(default_factory=list)
+    aborted: bool = False
+
+
 def _parse_scale(unit: str) -> float:
     """Extract numeric scale from the unit string.
 
@@ -132,6 +215,12 @@ def load_register_definitions(csv_path: Path) -> Dict[str, RegisterDefinition]:
     return registers
 
 
+def decode_words(reg: RegisterDefinition, words: Sequence[int]) -> float | str:
+    """Convert the raw words of *reg* into a scaled value."""
+
+    return register_decoder(reg)(words)
+
+
 DEFAULT_REGISTER_CSV = (
     Path(__file__).resolve().parent.parent
     / "docs"
@@ -140,7 +229,20 @@ DEFAULT_REGISTER_CSV = (
 
 
 class ModbusRTUOverTCPClient:
-    """Asynchronous Modbus client with periodic polling and retry logic."""
+    """Asynchronous Modbus client with periodic polling and retry logic.
+
+    A connection-level circuit breaker opens after ``failure_threshold``
+    consecutive transport failures (timeouts, refused or dropped
+    connections). While open, reads and writes fail immediately with
+    :class:`CircuitOpenError` until :meth:`probe` succeeds.
+
+    All bus traffic goes through :attr:`arbiter`, so concurrent callers
+    (the poll loop and MQTT commands) never interleave frames on the link.
+
+    Every block read is copied into :attr:`image`, a
+    :class:`~.register_image.RegisterImage` holding the last known words of
+    the whole register map.
+    """
 
     def __init__(
         self,
@@ -150,140 +252,432 @@ class ModbusRTUOverTCPClient:
         poll_interval: float = 5.0,
         read_timeout: float = 5.0,
         registers: Optional[Dict[str, RegisterDefinition]] = None,
+        max_gap: int = DEFAULT_MAX_GAP,
+        failure_threshold: int = 3,
+        probe_interval: float = 1.0,
+        max_probe_interval: float = 60.0,
+        transport: str = TRANSPORT_PYMODBUS,
     ) -> None:
         self.host = host
         self.port = port
         self.unit = unit
         self.poll_interval = poll_interval
         self.read_timeout = read_timeout
-        self.client = AsyncModbusTcpClient(host, port=port, framer=FramerType.RTU)
+        if transport == TRANSPORT_NATIVE:
+            self.client = NativeRTUClient(host, port=port)
+        elif transport == TRANSPORT_PYMODBUS:
+            self.client = AsyncModbusTcpClient(
+                host, port=port, framer=FramerType.RTU
+            )
+        else:
+            raise ValueError(f"Unknown modbus transport {transport!r}")
+        self.transport = transport
         params = inspect.signature(
             self.client.read_holding_registers
         ).parameters
-        if "unit" in params:
-            self._slave_kwarg = "unit"
-        elif "slave" in params:
-            self._slave_kwarg = "slave"
+        for kwarg in ("unit", "slave", "device_id"):
+            if kwarg in params:
+                self._slave_kwarg: Optional[str] = kwarg
+                break
         else:
             self._slave_kwarg = None
         self.registers = registers or load_register_definitions(DEFAULT_REGISTER_CSV)
-        self.values: Dict[str, float | str] = {}
+        self.max_gap = max_gap
+        self._plans: Dict[Tuple[str, ...], List[ReadBlock]] = {}
+        self._decoders: Dict[Tuple[Any, ...], BlockDecoder] = {}
+        self.image = RegisterImage()
         self._poll_task: Optional[asyncio.Task] = None
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self._consecutive_failures = 0
+        self.arbiter = BusArbiter()
+        self.stats = TransportStats()
+        self.instrumentation = Instrumentation()
+
+    @property
+    def values(self) -> Dict[str, float | str]:
+        """Return the decoded value of every register held in :attr:`image`."""
+        values: Dict[str, float | str] = {}
+        for name, reg in self.registers.items():
+            value = self.image.decode(reg)
+            if value is not None:
+                values[name] = value
+        return values
+
+    @property
+    def circuit_open(self) -> bool:
+        """Return ``True`` while the bridge is considered unreachable."""
+        return self._consecutive_failures >= self.failure_threshold
+
+    def _record_success(self) -> None:
+        if self.circuit_open:
+            logger.info("Bridge %s:%s reachable again", self.host, self.port)
+        self._consecutive_failures = 0
+
+    async def _record_failure(self, label: str, err: BaseException) -> None:
+        was_open = self.circuit_open
+        self._consecutive_failures += 1
+        await self.close()
+        if self.circuit_open and not was_open:
+            logger.error(
+                "Bridge %s:%s unreachable after %d consecutive failures (%s: %s)",
+                self.host,
+                self.port,
+                self._consecutive_failures,
+                label,
+                str(err) or type(err).__name__,
+            )
+
+    def _check_circuit(self, label: str) -> None:
+        if self.circuit_open:
+            raise CircuitOpenError(f"Bridge unreachable, skipped {label}")
+
+    async def probe(self) -> bool:
+        """Try a single cheap read and close the circuit if it succeeds."""
+        reg = self.registers.get("Working mode") or min(
+            self.registers.values(), key=lambda r: r.address
+        )
+        kwargs = {self._slave_kwarg: self.unit} if self._slave_kwarg else {}
+        try:
+            async with self.arbiter.transaction(Priority.POLL):
+                await self.connect()
+                await asyncio.wait_for(
+                    self.client.read_holding_registers(
+                        reg.address, count=1, **kwargs
+                    ),
+                    timeout=self.read_timeout,
+                )
+        except (asyncio.TimeoutError, *TRANSPORT_ERRORS) as err:
+            logger.debug("Probe of %s:%s failed: %s", self.host, self.port, err)
+            await self.close()
+            return False
+        # Any answer, even an exception response, proves the link is up.
+        self._record_success()
+        return True
+
+    async def wait_for_recovery(self) -> None:
+        """Probe the bridge with exponential backoff until it answers."""
+        delay = self.probe_interval
+        while not await self.probe():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_probe_interval)
 
     async def connect(self) -> None:
-        """Connect the underlying pymodbus client if not connected."""
+        """Connect the underlying transport client if not connected."""
         if not self.client.connected:
+            self.stats.connects += 1
             result = self.client.connect()
             if asyncio.iscoroutine(result):
                 await result
 
     async def close(self) -> None:
-        """Close the underlying pymodbus client."""
+        """Close the underlying transport client."""
         result = self.client.close()
         if asyncio.iscoroutine(result):
             await result
 
-    async def read_register(self, name: str, retries: int = 3) -> float | str:
-        """Read a register by name and return the scaled value."""
-        reg = self.registers[name]
+    def plan(self, names: Iterable[str]) -> List[ReadBlock]:
+        """Return the block reads covering the named registers."""
+        key = tuple(names)
+        blocks = self._plans.get(key)
+        if blocks is None:
+            blocks = plan_reads(
+                (self.registers[name] for name in key), max_gap=self.max_gap
+            )
+            self._plans[key] = blocks
+        return blocks
+
+    def blocks(self) -> List[ReadBlock]:
+        """Return every distinct block of the cached read plans."""
+        unique: Dict[Tuple[int, int], ReadBlock] = {}
+        for plan in self._plans.values():
+            for block in plan:
+                unique.setdefault((block.address, block.count), block)
+        return [unique[key] for key in sorted(unique)]
+
+    def _block_decoder(self, block: ReadBlock) -> BlockDecoder:
+        key = (block.address, block.count, tuple(r.name for r in block.registers))
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            decoder = self._decoders[key] = BlockDecoder(block)
+        return decoder
+
+    async def read_block(
+        self,
+        block: ReadBlock,
+        retries: int = 3,
+        priority: Priority = Priority.POLL,
+    ) -> List[int]:
+        """Read a planned register block and return the raw words."""
         kwargs = {self._slave_kwarg: self.unit} if self._slave_kwarg else {}
+        label = block.describe()
         for attempt in range(retries):
+            self._check_circuit(label)
+            if attempt:
+                self.stats.retries += 1
             try:
-                await self.connect()
-                response = await asyncio.wait_for(
-                    self.client.read_holding_registers(
-                        reg.address, count=reg.count, **kwargs
-                    ),
-                    timeout=self.read_timeout,
+                async with self.arbiter.transaction(priority):
+                    await self.connect()
+                    self.stats.requests += 1
+                    started = time.monotonic()
+                    with self.instrumentation.span(
+                        SPAN_TRANSACTION,
+                        op="read",
+                        address=block.address,
+                        count=block.count,
+                        attempt=attempt,
+                    ):
+                        response = await asyncio.wait_for(
+                            self.client.read_holding_registers(
+                                block.address, count=block.count, **kwargs
+                            ),
+                            timeout=self.read_timeout,
+                        )
+                    self.stats.latency["read"].observe(time.monotonic() - started)
+            except asyncio.TimeoutError as err:
+                self.stats.timeouts += 1
+                logger.warning("Timeout reading %s, retry %d", label, attempt + 1)
+                await self._record_failure(label, err)
+            except TRANSPORT_ERRORS as err:
+                self.stats.errors += 1
+                logger.warning(
+                    "Connection error reading %s, retry %d: %s",
+                    label,
+                    attempt + 1,
+                    err,
                 )
+                await self._record_failure(label, err)
+            else:
+                self._record_success()
                 if response.isError():
-                    raise RuntimeError(f"Read failed for {name}: {response}")
+                    raise ModbusResponseError(f"Read failed for {label}: {response}")
 
                 if not getattr(response, "registers", None):
                     raise RuntimeError(
-                        f"No data returned for {name} at {reg.address}"
+                        f"No data returned for {label} at {block.address}"
                     )
-                if len(response.registers) < reg.count:
+                if len(response.registers) < block.count:
                     raise RuntimeError(
-                        f"Expected {reg.count} registers for {name} but received"
-                        f" {len(response.registers)}"
+                        f"Expected {block.count} registers for {label} but"
+                        f" received {len(response.registers)}"
                     )
+                return response.registers
+            self._check_circuit(label)
+            await asyncio.sleep(1)
+        raise RuntimeError(f"Failed to read register {label}")
 
-                if reg.data_format == "ULong":
-                    value = (response.registers[0] << 16) + response.registers[1]
-                    scaled = Decimal(value) * Decimal(str(reg.scale))
-                    return float(scaled)
-                if reg.data_format == "UInt":
-                    value = response.registers[0]
-                    scaled = Decimal(value) * Decimal(str(reg.scale))
-                    return float(scaled)
-                if reg.data_format == "Int":
-                    raw = response.registers[0]
-                    value = raw - 0x10000 if raw & 0x8000 else raw
-                    scaled = Decimal(value) * Decimal(str(reg.scale))
-                    return float(scaled)
-                if reg.data_format in {"ASC", "ASCII"}:
-                    data = b"".join(r.to_bytes(2, "big") for r in response.registers)
-                    return data.decode(errors="ignore").rstrip("\x00")
-                if reg.count > 1:
-                    scale = Decimal(str(reg.scale))
-                    return [float(Decimal(val) * scale) for val in response.registers]
-                scaled = Decimal(response.registers[0]) * Decimal(str(reg.scale))
-                return float(scaled)
-            except asyncio.TimeoutError:
-                logger.warning("Timeout reading %s, retry %d", name, attempt + 1)
-                await self.close()
-                await asyncio.sleep(1)
-        raise RuntimeError(f"Failed to read register {name}")
+    async def read_registers(
+        self,
+        names: Iterable[str],
+        retries: int = 3,
+        priority: Priority = Priority.POLL,
+    ) -> RegisterSnapshot:
+        """Read many registers with as few requests as possible.
+
+        Failures are reported per register in ``RegisterSnapshot.errors`` so a
+        single bad block does not discard the rest of the snapshot. When the
+        inverter rejects a merged block, it is bisected until the rejected
+        registers are isolated, and the cached plan is split around them so
+        later cycles skip the rejected request.
+        The bus is acquired at *priority* separately for every block.
+        """
+        snapshot = RegisterSnapshot()
+        known: List[str] = []
+        for name in dict.fromkeys(names):
+            if name in self.registers:
+                known.append(name)
+            else:
+                snapshot.errors[name] = f"Unknown register {name}"
+        plan = self.plan(known)
+        for block in list(plan):
+            parts = await self._read_or_split(snapshot, block, retries, priority)
+            if len(parts) > 1:
+                position = plan.index(block)
+                plan[position : position + 1] = self._rejoin(snapshot, parts)
+        return snapshot
+
+    async def _read_or_split(
+        self,
+        snapshot: RegisterSnapshot,
+        block: ReadBlock,
+        retries: int,
+        priority: Priority,
+    ) -> List[ReadBlock]:
+        """Read *block*, bisecting it when the inverter rejects it.
+
+        Returns the blocks that replace *block* in the read plan.
+        """
+        if snapshot.aborted:
+            for reg in block.registers:
+                snapshot.errors[reg.name] = "Bridge unreachable"
+            return [block]
+        try:
+            await self._read_into(snapshot, block, retries, priority)
+        except CircuitOpenError as exc:
+            # Keep the image: the data is stale, not wrong.
+            snapshot.aborted = True
+            for reg in block.registers:
+                snapshot.errors[reg.name] = str(exc)
+        except ModbusResponseError as exc:
+            halves = split_block(block)
+            if halves is not None:
+                logger.info("%s; splitting it", exc)
+                parts: List[ReadBlock] = []
+                for half in halves:
+                    parts += await self._read_or_split(
+                        snapshot, half, retries, priority
+                    )
+                return parts
+            for reg in block.registers:
+                snapshot.errors[reg.name] = str(exc)
+            self.image.invalidate(block.address, block.count)
+        except Exception as exc:  # noqa: BLE001
+            for reg in block.registers:
+                snapshot.errors[reg.name] = str(exc)
+            self.image.invalidate(block.address, block.count)
+        return [block]
+
+    @staticmethod
+    def _rejoin(snapshot: RegisterSnapshot, parts: List[ReadBlock]) -> List[ReadBlock]:
+        """Merge adjacent parts of a split block that were read successfully."""
+
+        def accepted(block: ReadBlock) -> bool:
+            return not any(reg.name in snapshot.errors for reg in block.registers)
+
+        joined: List[ReadBlock] = []
+        for part in parts:
+            previous = joined[-1] if joined else None
+            if (
+                previous is not None
+                and part.address <= previous.end
+                and accepted(previous)
+                and accepted(part)
+            ):
+                joined[-1] = covering_block(previous.registers + part.registers)
+            else:
+                joined.append(part)
+        return joined
+
+    async def _read_into(
+        self,
+        snapshot: RegisterSnapshot,
+        block: ReadBlock,
+        retries: int,
+        priority: Priority,
+    ) -> None:
+        started = time.monotonic()
+        words = await self.read_block(block, retries, priority)
+        received = time.monotonic()
+        timestamp = time.time()
+        snapshot.transactions.append(
+            Transaction(
+                block.address, block.count, timestamp, received, received - started
+            )
+        )
+        self.image.update(block.address, words, received)
+        with self.instrumentation.span(
+            SPAN_DECODE, address=block.address, count=block.count
+        ):
+            snapshot.values.update(self._block_decoder(block).decode(words))
+        for reg in block.registers:
+            snapshot.raw[reg.name] = list(block.slice(words, reg))
+            snapshot.timestamps[reg.name] = timestamp
+            snapshot.monotonic[reg.name] = received
+
+    async def read_register(
+        self, name: str, retries: int = 3, priority: Priority = Priority.REFRESH
+    ) -> float | str:
+        """Read a register by name and return the scaled value."""
+        reg = self.registers[name]
+        words = await self.read_block(
+            ReadBlock(reg.address, reg.count, (reg,)), retries, priority
+        )
+        self.image.update(reg.address, words, time.monotonic())
+        return decode_words(reg, words)
 
     async def write_register(
         self, name: str, value: float | str, retries: int = 3
     ) -> None:
-        """Write a scaled value to a register with retry and reconnect logic."""
+        """Write a scaled value to a register with retry and reconnect logic.
+
+        Transport errors and rejected writes are retried; anything else,
+        such as a value that cannot be converted, is raised at once.
+        """
         reg = self.registers[name]
         if "W" not in reg.access:
             raise PermissionError(f"Register {name} is not writable")
+        kwargs = {self._slave_kwarg: self.unit} if self._slave_kwarg else {}
         for attempt in range(retries):
+            self._check_circuit(name)
+            if attempt:
+                self.stats.retries += 1
             try:
-                await self.connect()
-                kwargs = {self._slave_kwarg: self.unit} if self._slave_kwarg else {}
-                if reg.data_format in {"ASC", "ASCII"} and isinstance(value, str):
-                    data = value.encode()
-                    data = data.ljust(reg.count * 2, b"\x00")[: reg.count * 2]
-                    regs = [
-                        int.from_bytes(data[i : i + 2], "big")
-                        for i in range(0, len(data), 2)
-                    ]
-                    response = await self.client.write_registers(
-                        reg.address, regs, **kwargs
-                    )
-                else:
-                    raw = int(float(value) / reg.scale)
-                    if reg.data_format == "ULong" or reg.count > 1:
-                        hi = (raw >> 16) & 0xFFFF
-                        lo = raw & 0xFFFF
-                        response = await self.client.write_registers(
-                            reg.address, [hi, lo], **kwargs
-                        )
-                    else:
-                        response = await self.client.write_register(
-                            reg.address, value=raw, **kwargs
-                        )
+                async with self.arbiter.transaction(Priority.WRITE):
+                    await self.connect()
+                    self.stats.requests += 1
+                    started = time.monotonic()
+                    with self.instrumentation.span(
+                        SPAN_TRANSACTION,
+                        op="write",
+                        address=reg.address,
+                        count=reg.count,
+                        attempt=attempt,
+                    ):
+                        response = await self._send_write(reg, value, kwargs)
+                    self.stats.latency["write"].observe(time.monotonic() - started)
+            except asyncio.TimeoutError as err:
+                self.stats.timeouts += 1
+                logger.warning("Timeout writing %s, retry %d", name, attempt + 1)
+                await self._record_failure(name, err)
+            except TRANSPORT_ERRORS as err:
+                self.stats.errors += 1
+                logger.warning(
+                    "Connection error writing %s, retry %d: %s",
+                    name,
+                    attempt + 1,
+                    err,
+                )
+                await self._record_failure(name, err)
+            else:
+                # The bridge answered, so the connection is fine even when
+                # the inverter rejected the value.
+                self._record_success()
                 if not response.isError():
                     return
-            except Exception:
-                pass
-            await self.close()
+                logger.warning(
+                    "Write to %s rejected, retry %d: %s", name, attempt + 1, response
+                )
             await asyncio.sleep(1)
         raise RuntimeError(f"Failed to write register {name}")
 
-    async def _poll_once(self, regs: Iterable[str]) -> None:
-        for name in regs:
-            try:
-                self.values[name] = await self.read_register(name)
-            except Exception:
-                await self.close()
-                raise
+    async def _send_write(
+        self, reg: RegisterDefinition, value: float | str, kwargs: Dict[str, int]
+    ) -> Any:
+        if reg.data_format in {"ASC", "ASCII"} and isinstance(value, str):
+            data = value.encode()
+            data = data.ljust(reg.count * 2, b"\x00")[: reg.count * 2]
+            regs = [
+                int.from_bytes(data[i : i + 2], "big")
+                for i in range(0, len(data), 2)
+            ]
+            return await self.client.write_registers(reg.address, regs, **kwargs)
+        raw = round(float(value) / reg.scale)
+        if reg.data_format == "ULong" or reg.count > 1:
+            hi = (raw >> 16) & 0xFFFF
+            lo = raw & 0xFFFF
+            return await self.client.write_registers(
+                reg.address, [hi, lo], **kwargs
+            )
+        return await self.client.write_register(reg.address, value=raw, **kwargs)
+
+    async def _poll_once(self, regs: Iterable[str]) -> RegisterSnapshot:
+        snapshot = await self.read_registers(regs)
+        if snapshot.errors:
+            await self.close()
+            name, error = next(iter(snapshot.errors.items()))
+            raise RuntimeError(f"Failed to read register {name}: {error}")
+        return snapshot
 
     async def poll_forever(
         self,
@@ -294,12 +688,15 @@ class ModbusRTUOverTCPClient:
         regs = list(regs or self.registers.keys())
         while True:
             try:
-                await self._poll_once(regs)
+                snapshot = await self._poll_once(regs)
                 if callback:
                     for name in regs:
-                        callback(name, self.values[name])
+                        callback(name, snapshot.values[name])
             except Exception:
-                await asyncio.sleep(1)
+                if self.circuit_open:
+                    await self.wait_for_recovery()
+                else:
+                    await asyncio.sleep(1)
                 continue
             await asyncio.sleep(self.poll_interval)
 
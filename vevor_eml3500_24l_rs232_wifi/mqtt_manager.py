@@ -0,0 +1,327 @@
+"""Run the paho MQTT client inside the poller's asyncio event loop.
+
+paho's ``loop_start()`` runs the network loop in a background thread, so
+every incoming command hopped threads and a failed publish used to throw
+the client away, followed by a full discovery and state republish.
+:class:`MQTTManager` instead drives the socket from the event loop
+(``add_reader``/``add_writer`` plus a ``loop_misc`` task, as in paho's
+asyncio example) and owns the connection for the poller's whole life:
+
+* the session is persistent (``clean_session=False`` with a fixed client
+  id), so the broker keeps the command subscriptions and QoS 1 commands
+  sent while the add-on was offline;
+* lost connections are re-established with exponential backoff;
+* messages published while disconnected are queued and flushed on
+  reconnect: retained topics keep only their latest payload, other
+  messages are kept up to ``queue_limit``.
+
+Callbacks (``on_message``, ``on_connected``) run in the event loop thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_LIMIT = 1000
+
+QueuedMessage = Tuple[str, Any, int, bool]
+
+
+class MQTTManager:
+    """Own one persistent MQTT session for the lifetime of the poller."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 1883,
+        *,
+        client_id: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        keepalive: int = 60,
+        availability_topic: Optional[str] = None,
+        reconnect_interval: float = 1.0,
+        max_reconnect_interval: float = 60.0,
+        queue_limit: int = DEFAULT_QUEUE_LIMIT,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.availability_topic = availability_topic
+        self.reconnect_interval = reconnect_interval
+        self.max_reconnect_interval = max_reconnect_interval
+        self.available = True
+        self.on_message: Optional[Callable[[mqtt.MQTTMessage], None]] = None
+        # Called with ``session_present`` after every successful connection.
+        self.on_connected: Optional[Callable[[bool], None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriptions: Dict[str, int] = {}
+        self._retained: "OrderedDict[str, QueuedMessage]" = OrderedDict()
+        self._queue: Deque[QueuedMessage] = deque(maxlen=queue_limit)
+        self._connected = asyncio.Event()
+        self._misc_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._delay = reconnect_interval
+        self.dropped = 0
+
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=client_id,
+            clean_session=False,
+            reconnect_on_failure=False,
+        )
+        if username:
+            self.client.username_pw_set(username, password or "")
+        if availability_topic:
+            self.client.will_set(availability_topic, "offline", qos=1, retain=True)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    @property
+    def queued(self) -> int:
+        """Number of messages waiting for the connection to come back."""
+        return len(self._retained) + len(self._queue)
+
+    # -- event loop integration -------------------------------------------
+
+    def _call_in_loop(self, func: Callable[..., Any], *args: Any) -> None:
+        # The initial connect runs in an executor thread, every other
+        # callback is already on the loop.
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            func(*args)
+        else:
+            loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, client: mqtt.Client, userdata: Any, sock: Any) -> None:
+        self._call_in_loop(self._watch_socket, sock)
+
+    def _watch_socket(self, sock: Any) -> None:
+        self._loop.add_reader(sock, self.client.loop_read)
+        if self._misc_task is None or self._misc_task.done():
+            self._misc_task = self._loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client: mqtt.Client, userdata: Any, sock: Any) -> None:
+        self._call_in_loop(self._unwatch_socket, sock)
+
+    def _unwatch_socket(self, sock: Any) -> None:
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+
+    def _on_socket_register_write(
+        self, client: mqtt.Client, userdata: Any, sock: Any
+    ) -> None:
+        self._call_in_loop(self._loop.add_writer, sock, self.client.loop_write)
+
+    def _on_socket_unregister_write(
+        self, client: mqtt.Client, userdata: Any, sock: Any
+    ) -> None:
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    async def _misc_loop(self) -> None:
+        # Keepalive pings and retry of unacknowledged QoS 1 messages.
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    # -- connection handling ----------------------------------------------
+
+    async def start(self) -> None:
+        """Start connecting in the background; returns immediately."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._schedule_reconnect(initial=True)
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the session is up; ``False`` on timeout."""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _schedule_reconnect(self, initial: bool = False) -> None:
+        if self._stopping:
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self._loop.create_task(
+                self._reconnect(0.0 if initial else self._backoff())
+            )
+
+    def _backoff(self) -> float:
+        # Grows across refused or dropped attempts until a CONNACK succeeds.
+        delay = self._delay
+        self._delay = min(delay * 2, self.max_reconnect_interval)
+        return delay
+
+    async def _reconnect(self, delay: float) -> None:
+        while not self._stopping:
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                # Name resolution and the TCP handshake block; keep them off
+                # the loop. paho only hands the socket over via callbacks.
+                await self._loop.run_in_executor(
+                    None, self.client.connect, self.host, self.port, self.keepalive
+                )
+            except (OSError, ValueError) as err:
+                logger.warning(
+                    "MQTT connect to %s:%s failed: %s", self.host, self.port, err
+                )
+                delay = self._backoff()
+                continue
+            return
+
+    def _on_connect(
+        self,
+        client: mqtt.Client,
+        userdata: Any,
+        flags: Any,
+        reason_code: Any,
+        properties: Any = None,
+    ) -> None:
+        if reason_code.is_failure:
+            logger.warning("MQTT broker refused the connection: %s", reason_code)
+            return
+        session_present = bool(getattr(flags, "session_present", False))
+        logger.info(
+            "Connected to MQTT broker %s:%s (session %s)",
+            self.host,
+            self.port,
+            "resumed" if session_present else "new",
+        )
+        self._connected.set()
+        self._delay = self.reconnect_interval
+        if not session_present:
+            for topic, qos in self._subscriptions.items():
+                self.client.subscribe(topic, qos)
+        if self.availability_topic:
+            self.client.publish(
+                self.availability_topic,
+                "online" if self.available else "offline",
+                qos=1,
+                retain=True,
+            )
+        self._flush()
+        if self.on_connected:
+            self.on_connected(session_present)
+
+    def _on_disconnect(
+        self,
+        client: mqtt.Client,
+        userdata: Any,
+        flags: Any,
+        reason_code: Any,
+        properties: Any = None,
+    ) -> None:
+        was_connected = self.connected
+        self._connected.clear()
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+        if self._stopping:
+            return
+        if was_connected:
+            logger.warning("MQTT connection lost (%s), reconnecting", reason_code)
+        self._schedule_reconnect()
+
+    def _on_message(
+        self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage
+    ) -> None:
+        if self.on_message:
+            self.on_message(msg)
+
+    async def stop(self) -> None:
+        """Mark the device offline and disconnect, keeping the session."""
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self.connected:
+            if self.availability_topic:
+                info = self.client.publish(
+                    self.availability_topic, "offline", qos=1, retain=True
+                )
+                for _ in range(20):
+                    if info.is_published():
+                        break
+                    await asyncio.sleep(0.05)
+            self.client.disconnect()
+            for _ in range(20):
+                if not self.connected:
+                    break
+                await asyncio.sleep(0.05)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+
+    # -- publish / subscribe ----------------------------------------------
+
+    def subscribe(self, topic: str, qos: int = 1) -> None:
+        """Subscribe now (if connected) and after every new session."""
+        self._subscriptions[topic] = qos
+        if self.connected:
+            self.client.subscribe(topic, qos)
+
+    def set_available(self, available: bool) -> None:
+        """Publish the availability topic and remember it for reconnects."""
+        self.available = available
+        if self.availability_topic:
+            self.publish(
+                self.availability_topic,
+                "online" if available else "offline",
+                qos=1,
+                retain=True,
+            )
+
+    def publish(
+        self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False
+    ) -> Optional[mqtt.MQTTMessageInfo]:
+        """Publish now, or queue the message until the session is back.
+
+        Returns paho's message info, or ``None`` when the message was queued.
+        """
+        if self.connected:
+            info = self.client.publish(topic, payload, qos=qos, retain=retain)
+            if info.rc != mqtt.MQTT_ERR_NO_CONN:
+                return info
+        self._enqueue((topic, payload, qos, retain))
+        return None
+
+    def _enqueue(self, message: QueuedMessage) -> None:
+        topic, _, _, retain = message
+        if retain:
+            # Only the last retained payload of a topic matters.
+            self._retained.pop(topic, None)
+            self._retained[topic] = message
+            return
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(message)
+
+    def _flush(self) -> None:
+        if not self.queued:
+            return
+        logger.info("Sending %d MQTT messages queued while offline", self.queued)
+        retained, self._retained = self._retained, OrderedDict()
+        queue = list(self._queue)
+        self._queue.clear()
+        for topic, payload, qos, retain in [*retained.values(), *queue]:
+            self.publish(topic, payload, qos=qos, retain=retain)
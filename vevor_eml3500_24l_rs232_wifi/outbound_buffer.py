@@ -0,0 +1,234 @@
+"""Store-and-forward buffer for telemetry produced while MQTT is down.
+
+While the broker is unreachable every poll result is appended as one JSON
+line to a segment file under the buffer directory. Segments are only ever
+appended to and deleted whole (no rewrites, no per-record ``fsync``), which
+keeps the write load on SD cards low. The total size and the age of the
+buffered records are bounded; the oldest segments are dropped first.
+
+Once the connection is back :meth:`OutboundBuffer.replay` publishes the
+records oldest first on a dedicated history topic, ``batch_size`` messages
+at a time with a pause in between, and deletes each segment once the broker
+acknowledged all of its records (``publish`` receipts with an
+``is_published()`` method, such as paho's ``MQTTMessageInfo``). Delivery is
+at-least-once: a segment interrupted by another outage, or not acknowledged
+within ``ack_timeout``, is replayed again from its start.
+
+The blocking file operations are meant to run in a worker thread
+(``asyncio.to_thread``); the replay coroutine does that itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_AGE = 24 * 3600.0
+DEFAULT_SEGMENT_BYTES = 256 * 1024
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_BATCH_INTERVAL = 1.0
+DEFAULT_ACK_TIMEOUT = 30.0
+ACK_POLL_INTERVAL = 0.1
+
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class OutboundBuffer:
+    """Append-only, size- and age-bounded queue of telemetry snapshots."""
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: float = DEFAULT_MAX_AGE,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_bytes = segment_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._active: Optional[Path] = None
+        self.dropped = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segments: List[Path] = sorted(
+            self.directory.glob(f"*{SEGMENT_SUFFIX}")
+        )
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._segments)
+
+    def size(self) -> int:
+        total = 0
+        for path in self._segments:
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _next_segment(self) -> Path:
+        last = int(self._segments[-1].stem) if self._segments else 0
+        path = self.directory / f"{last + 1:010d}{SEGMENT_SUFFIX}"
+        self._segments.append(path)
+        return path
+
+    def append(self, data: Dict[str, Any], timestamp: Optional[str] = None) -> None:
+        """Buffer one snapshot; *timestamp* defaults to ``data['last_update']``."""
+        record = {
+            "timestamp": timestamp or data.get("last_update"),
+            "buffered_at": self._clock(),
+            "data": data,
+        }
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            active = self._active
+            if active is None or active.stat().st_size >= self.segment_bytes:
+                active = self._active = self._next_segment()
+            with active.open("ab") as fp:
+                fp.write(line)
+            self._enforce_limits()
+
+    def _enforce_limits(self) -> None:
+        now = self._clock()
+        total = self.size()
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            try:
+                stat = oldest.stat()
+            except FileNotFoundError:
+                self._segments.pop(0)
+                continue
+            expired = now - stat.st_mtime > self.max_age
+            if total <= self.max_bytes and not expired:
+                break
+            self._drop(oldest)
+            total -= stat.st_size
+
+    def _drop(self, path: Path) -> None:
+        with path.open("rb") as fp:
+            self.dropped += sum(1 for _ in fp)
+        logger.warning("Dropping buffered telemetry segment %s", path.name)
+        self._remove(path)
+
+    def _remove(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        if path in self._segments:
+            self._segments.remove(path)
+        if path == self._active:
+            self._active = None
+
+    def oldest(self) -> Optional[Tuple[Path, List[str]]]:
+        """Return the oldest segment and its still fresh records.
+
+        The segment being written is closed first so new snapshots go to a
+        fresh one while it is replayed.
+        """
+
+        with self._lock:
+            if not self._segments:
+                return None
+            path = self._segments[0]
+            if path == self._active:
+                self._active = None
+            try:
+                lines = path.read_text(encoding="utf-8").splitlines()
+            except FileNotFoundError:
+                self._segments.pop(0)
+                return path, []
+        cutoff = self._clock() - self.max_age
+        fresh = []
+        for line in lines:
+            try:
+                if json.loads(line)["buffered_at"] >= cutoff:
+                    fresh.append(line)
+            except (ValueError, KeyError, TypeError):
+                # A torn last line after a power cut; skip it.
+                continue
+        self.dropped += len(lines) - len(fresh)
+        return path, fresh
+
+    def discard(self, path: Path) -> None:
+        """Delete a segment once it was replayed."""
+        with self._lock:
+            self._remove(path)
+
+    async def replay(
+        self,
+        client: Any,
+        topic: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_interval: float = DEFAULT_BATCH_INTERVAL,
+        ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+    ) -> int:
+        """Publish buffered records on *topic* while *client* stays connected.
+
+        Returns the number of records sent.
+        """
+
+        sent = 0
+        while self.pending and client.connected:
+            segment = await asyncio.to_thread(self.oldest)
+            if segment is None:
+                break
+            path, lines = segment
+            receipts = []
+            for start in range(0, len(lines), batch_size):
+                if not client.connected:
+                    return sent
+                for line in lines[start : start + batch_size]:
+                    receipts.append(
+                        client.publish(topic, _history_payload(line), qos=1)
+                    )
+                    sent += 1
+                await asyncio.sleep(batch_interval)
+            if not await _acknowledged(client, receipts, ack_timeout):
+                if client.connected:
+                    logger.warning(
+                        "Buffered telemetry in %s not acknowledged within %.0f s;"
+                        " it will be replayed again",
+                        path.name,
+                        ack_timeout,
+                    )
+                break
+            await asyncio.to_thread(self.discard, path)
+        if sent:
+            logger.info("Replayed %d buffered telemetry snapshots", sent)
+        return sent
+
+
+async def _acknowledged(client: Any, receipts: List[Any], timeout: float) -> bool:
+    """Wait until the broker acknowledged every publish in *receipts*.
+
+    A ``None`` receipt (a client without delivery tracking) counts as
+    acknowledged as long as the client stays connected. Returns ``False``
+    when the connection drops or *timeout* expires first.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = [receipt for receipt in receipts if receipt is not None]
+    while client.connected:
+        pending = [receipt for receipt in pending if not receipt.is_published()]
+        if not pending:
+            return True
+        if loop.time() >= deadline:
+            return False
+        await asyncio.sleep(ACK_POLL_INTERVAL)
+    return False
+
+
+def _history_payload(line: str) -> str:
+    record = json.loads(line)
+    return json.dumps({"timestamp": record["timestamp"], **record["data"]})
@@ -0,0 +1,320 @@
+"""Priority-ordered, rate-limited MQTT publishing.
+
+A (re)start publishes discovery, attributes and every state topic in one
+burst, which used to queue availability and live values behind hundreds of
+discovery messages and to overwhelm small brokers. :class:`OutboundScheduler`
+sits between the poller and the MQTT client: messages are queued by
+:class:`MessagePriority` and drained by a token bucket (``rate`` messages per
+second, bursts of up to ``burst``), most important first.
+
+A retained topic that is still queued is replaced in place by a newer
+payload, since only the last retained value matters. The scheduler pauses
+while the client is disconnected and records per-priority queue latency in
+the same :class:`~.bus_arbiter.WaitStats` the Modbus bus arbiter uses.
+Non-retained messages keep piling up during an outage, so beyond
+``max_depth`` queued messages the oldest non-retained background and then
+state messages are dropped.
+
+``publish`` returns the queued message as a delivery receipt: its
+``is_published()`` turns true once the client sent it and, for QoS 1, the
+broker acknowledged it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+from collections import deque
+from enum import IntEnum
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from .bus_arbiter import WaitStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 50.0
+DEFAULT_BURST = 100
+DEFAULT_MAX_DEPTH = 1000
+
+
+class MessagePriority(IntEnum):
+    """Outbound priorities; lower values are sent first."""
+
+    AVAILABILITY = 0
+    STATE = 1
+    COMMAND = 2
+    DISCOVERY = 3
+    ATTRIBUTES = 4
+    BACKGROUND = 5  # history replay and metrics
+
+
+# Non-retained messages given up first when the queue is full, in order.
+DROPPABLE = (MessagePriority.BACKGROUND, MessagePriority.STATE)
+
+_PRIORITY: contextvars.ContextVar[Optional[MessagePriority]] = (
+    contextvars.ContextVar("outbound_priority", default=None)
+)
+
+
+def classify(topic: str) -> MessagePriority:
+    """Infer the priority of a message from its topic."""
+    if topic.endswith("/availability"):
+        return MessagePriority.AVAILABILITY
+    if topic.startswith("homeassistant/"):
+        return MessagePriority.DISCOVERY
+    if topic.endswith("/attributes"):
+        return MessagePriority.ATTRIBUTES
+    if topic.endswith("/error"):
+        return MessagePriority.COMMAND
+    if topic.endswith("/history"):
+        return MessagePriority.BACKGROUND
+    return MessagePriority.STATE
+
+
+@contextlib.contextmanager
+def priority(value: MessagePriority) -> Iterator[None]:
+    """Publish with *value* in this task (e.g. command read-backs)."""
+    token = _PRIORITY.set(value)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+class _Message:
+    __slots__ = (
+        "topic",
+        "payload",
+        "qos",
+        "retain",
+        "priority",
+        "enqueued",
+        "sent",
+        "info",
+    )
+
+    def __init__(
+        self,
+        topic: str,
+        payload: Any,
+        qos: int,
+        retain: bool,
+        priority: MessagePriority,
+        enqueued: float,
+    ) -> None:
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.priority = priority
+        self.enqueued = enqueued
+        self.sent = False
+        self.info: Any = None
+
+    def is_published(self) -> bool:
+        """Whether the client reports the message as delivered."""
+        if not self.sent or self.info is None:
+            return False
+        try:
+            return self.info.is_published()
+        except (RuntimeError, ValueError):
+            # paho refused the message; it will never be acknowledged.
+            return False
+
+
+class OutboundScheduler:
+    """Queue messages by priority and send them through a token bucket."""
+
+    def __init__(
+        self,
+        client: Any,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        clock: Callable[[], float] = time.monotonic,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+    ) -> None:
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.max_depth = max_depth
+        self._clock = clock
+        self._tokens = float(burst)
+        self._refilled = clock()
+        self._heap: List[tuple] = []
+        self._retained: Dict[str, _Message] = {}
+        self._droppable: Dict[MessagePriority, Deque[_Message]] = {
+            p: deque() for p in DROPPABLE
+        }
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[MessagePriority, WaitStats] = {
+            p: WaitStats() for p in MessagePriority
+        }
+        self._pending = 0
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+
+    @property
+    def connected(self) -> bool:
+        return getattr(self.client, "connected", True)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending
+
+    def publish(
+        self,
+        topic: str,
+        payload: Any = None,
+        qos: int = 0,
+        retain: bool = False,
+        priority: Optional[MessagePriority] = None,
+    ) -> _Message:
+        """Queue a message; same arguments as ``paho`` ``Client.publish``."""
+        if priority is None:
+            priority = _PRIORITY.get()
+        if priority is None:
+            priority = classify(topic)
+        if retain:
+            queued = self._retained.get(topic)
+            if queued is not None and not queued.sent:
+                queued.payload, queued.qos = payload, qos
+                self.coalesced += 1
+                if priority >= queued.priority:
+                    return queued
+                # Promoted: re-queue at the higher priority.
+                queued.sent = True
+                self._pending -= 1
+        message = _Message(topic, payload, qos, retain, priority, self._clock())
+        if retain:
+            self._retained[topic] = message
+        elif priority in self._droppable:
+            self._droppable[priority].append(message)
+        heapq.heappush(self._heap, (priority, next(self._sequence), message))
+        self._pending += 1
+        if self._pending > self.max_depth:
+            self._drop_oldest()
+        if len(self._heap) > max(self.max_depth, self._pending):
+            self._compact()
+        self.max_queue_depth = max(self.max_queue_depth, self._pending)
+        self._wakeup.set()
+        return message
+
+    def _drop_oldest(self) -> None:
+        for queue in self._droppable.values():
+            while queue:
+                message = queue.popleft()
+                if message.sent:
+                    continue
+                # Marked as sent so _pop skips it; it never gets an info.
+                message.sent = True
+                self._pending -= 1
+                if not self.dropped:
+                    logger.warning(
+                        "Outbound queue full (%d messages), dropping the oldest",
+                        self.max_depth,
+                    )
+                self.dropped += 1
+                return
+
+    def _compact(self) -> None:
+        # Dropped and promoted messages stay in the heap until popped; during
+        # an outage nothing is popped, so rebuild it without them.
+        self._heap = [entry for entry in self._heap if not entry[2].sent]
+        heapq.heapify(self._heap)
+
+    def _take_token(self) -> float:
+        """Consume a token, or return how long to wait for the next one."""
+        now = self._clock()
+        self._tokens = min(
+            float(self.burst), self._tokens + (now - self._refilled) * self.rate
+        )
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _pop(self) -> Optional[_Message]:
+        while self._heap:
+            _, _, message = heapq.heappop(self._heap)
+            if message.sent:
+                continue
+            message.sent = True
+            self._pending -= 1
+            if self._retained.get(message.topic) is message:
+                del self._retained[message.topic]
+            queue = self._droppable.get(message.priority)
+            if queue and queue[0] is message:
+                queue.popleft()
+            return message
+        return None
+
+    def send_one(self) -> bool:
+        """Send the most important queued message; ``False`` when empty."""
+        message = self._pop()
+        if message is None:
+            return False
+        message.info = self.client.publish(
+            message.topic, message.payload, qos=message.qos, retain=message.retain
+        )
+        self.published += 1
+        self.stats[message.priority].record(self._clock() - message.enqueued)
+        return True
+
+    async def run(self) -> None:
+        """Drain the queue forever; cancel the task to stop."""
+        while True:
+            if not self.queue_depth:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not self.connected:
+                await self.client.wait_connected()
+                continue
+            delay = self._take_token()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            self.send_one()
+            await asyncio.sleep(0)
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self, timeout: float = 2.0) -> None:
+        """Flush what can be sent within *timeout*, then stop draining."""
+        deadline = self._clock() + timeout
+        while self.queue_depth and self.connected and self._clock() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth and per-priority latency, for the metrics topic."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "latency": {
+                p.name.lower(): {
+                    "count": s.count,
+                    "mean": round(s.mean, 4),
+                    "max": round(s.max, 4),
+                    "last": round(s.last, 4),
+                }
+                for p, s in self.stats.items()
+            },
+        }
@@ -0,0 +1,100 @@
+"""Decide which entities need to be read on each poll cycle.
+
+Entities are assigned one of three poll classes:
+
+* ``static``: identity registers read once after startup.
+* ``config``: settings refreshed on a slow interval (and after writes).
+* ``live``: telemetry read on every cycle.
+
+A failed read of a static or config entity is retried on the next config
+refresh rather than on every cycle, so a register the inverter rejects
+does not cost a request per cycle.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+POLL_CLASS_STATIC = "static"
+POLL_CLASS_CONFIG = "config"
+POLL_CLASS_LIVE = "live"
+POLL_CLASSES = (POLL_CLASS_STATIC, POLL_CLASS_CONFIG, POLL_CLASS_LIVE)
+
+DEFAULT_CONFIG_REFRESH_INTERVAL = 3600.0
+
+
+def parse_poll_class_overrides(items: Iterable[str]) -> Dict[str, str]:
+    """Parse ``slug=class`` strings into a mapping.
+
+    Raises ``ValueError`` for malformed entries or unknown classes.
+    """
+
+    overrides: Dict[str, str] = {}
+    for item in items:
+        slug, sep, poll_class = item.partition("=")
+        slug = slug.strip()
+        poll_class = poll_class.strip().lower()
+        if not sep or not slug:
+            raise ValueError(f"Invalid poll class override {item!r}")
+        if poll_class not in POLL_CLASSES:
+            raise ValueError(
+                f"Unknown poll class {poll_class!r} for {slug}; expected one of"
+                f" {', '.join(POLL_CLASSES)}"
+            )
+        overrides[slug] = poll_class
+    return overrides
+
+
+class PollSchedule:
+    """Track when each entity was last read and report which ones are due."""
+
+    def __init__(
+        self,
+        classes: Dict[str, str],
+        config_refresh_interval: float = DEFAULT_CONFIG_REFRESH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.classes = dict(classes)
+        self.intervals: Dict[str, Optional[float]] = {
+            POLL_CLASS_STATIC: None,
+            POLL_CLASS_CONFIG: config_refresh_interval,
+            POLL_CLASS_LIVE: 0.0,
+        }
+        self.retry_interval = config_refresh_interval
+        self._clock = clock
+        self._last_read: Dict[str, float] = {}
+        self._failed: Dict[str, float] = {}
+
+    def due(self) -> List[str]:
+        """Return the slugs that should be read on this cycle."""
+        now = self._clock()
+        slugs: List[str] = []
+        for slug, poll_class in self.classes.items():
+            failed = self._failed.get(slug)
+            if failed is not None and now - failed < self.retry_interval:
+                continue
+            last = self._last_read.get(slug)
+            interval = self.intervals[poll_class]
+            if last is None or (interval is not None and now - last >= interval):
+                slugs.append(slug)
+        return slugs
+
+    def mark_read(self, slugs: Iterable[str]) -> None:
+        """Record a successful read of *slugs*."""
+        now = self._clock()
+        for slug in slugs:
+            self._last_read[slug] = now
+            self._failed.pop(slug, None)
+
+    def mark_failed(self, slugs: Iterable[str]) -> None:
+        """Record a failed read; static and config slugs wait for a refresh."""
+        now = self._clock()
+        for slug in slugs:
+            if self.classes.get(slug) != POLL_CLASS_LIVE:
+                self._failed[slug] = now
+
+    def invalidate(self, slug: str) -> None:
+        """Force *slug* to be read again on the next cycle."""
+        self._last_read.pop(slug, None)
+        self._failed.pop(slug, None)
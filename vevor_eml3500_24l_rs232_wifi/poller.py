@@ -7,18 +7,72 @@ import asyncio
 import json
 import logging
 import re
+import time
 from datetime import UTC, datetime
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
 import paho.mqtt.client as mqtt
 
 from .modbus_client import (
     DEFAULT_REGISTER_CSV,
+    TRANSPORT_PYMODBUS,
+    TRANSPORTS,
     ModbusRTUOverTCPClient,
     RegisterDefinition,
+    RegisterSnapshot,
     load_register_definitions,
 )
+from .bus_arbiter import Priority
+from .decode_plan import BlockDecoder
+from .discovery_cache import DISCOVERY_PREFIX, HA_STATUS_TOPIC, DiscoveryCache
+from .energy_journal import (
+    DEFAULT_COMPACT_EVERY,
+    DEFAULT_FLUSH_INTERVAL,
+    EnergyJournal,
+)
+from .fast_lane import FastLane
+from .history_store import HistoryStore, parse_retention_overrides
+from .instrumentation import (
+    DEFAULT_PROFILE_EVERY,
+    SPAN_CYCLE,
+    SPAN_DECODE,
+    SPAN_DERIVE,
+    SPAN_PUBLISH,
+    HookSwitch,
+    Instrumentation,
+)
+from .metrics import CycleStats, MetricsServer, OpenMetricsWriter
+from .mqtt_manager import MQTTManager
+from .outbound_scheduler import (
+    DEFAULT_BURST,
+    DEFAULT_RATE,
+    MessagePriority,
+    OutboundScheduler,
+    priority as outbound_priority,
+)
+from .outbound_buffer import DEFAULT_MAX_AGE, DEFAULT_MAX_BYTES, OutboundBuffer
+from .register_image import RegisterImage, image_decoder
+from .ring_history import DEFAULT_CAPACITY as DEFAULT_RECENT_SAMPLES, RecentHistory
+from .state_publisher import (
+    DEFAULT_HEARTBEAT_INTERVAL,
+    STATE_GROUP_DIAGNOSTICS,
+    STATE_GROUP_ENERGY,
+    STATE_GROUP_SETTINGS,
+    STATE_GROUP_TELEMETRY,
+    StatePublisher,
+    group_topic,
+    parse_deadband_overrides,
+)
+from .read_planner import DEFAULT_MAX_GAP
+from .poll_schedule import (
+    DEFAULT_CONFIG_REFRESH_INTERVAL,
+    POLL_CLASS_CONFIG,
+    POLL_CLASS_LIVE,
+    POLL_CLASS_STATIC,
+    PollSchedule,
+    parse_poll_class_overrides,
+)
 from .fault_decoder import decode_faults, decode_warnings
 from .status_decoder import (
     decode_working_mode,
@@ -398,6 +452,7 @@ REGISTER_MAP = {
         "name": "Warning Mask",
         "decoder": decode_warnings,
         "entity_category": "diagnostic",
+        "poll_class": POLL_CLASS_CONFIG,
     },
     "dry_contact": {
         "register": "Dry contact",
@@ -576,6 +631,7 @@ REGISTER_MAP = {
     "protocol_identifier": {
         "register": "Invalid data",
         "name": "Protocol Identifier",
+        "poll_class": POLL_CLASS_STATIC,
     },
     "fault_record_storage_info": {
         "register": "Fault record storage information [K]",
@@ -671,6 +727,78 @@ WRITABLE_REGISTERS = {
     if info.get("writable")
 }
 
+# Identity registers that only change with new firmware or a different device.
+STATIC_REGISTERS = {
+    "Device type",
+    "Device serial number",
+    "Program version",
+    "Rated power",
+    "Rated number of cells [J]",
+}
+
+
+def _infer_poll_class(info: Dict[str, Any]) -> str:
+    """Pick the poll class of an entity from its register metadata."""
+
+    if poll_class := info.get("poll_class"):
+        return poll_class
+    if info["register"] in STATIC_REGISTERS:
+        return POLL_CLASS_STATIC
+    if info.get("writable"):
+        return POLL_CLASS_CONFIG
+    if info.get("entity_category") == "diagnostic" and not info.get("decoder"):
+        return POLL_CLASS_CONFIG
+    return POLL_CLASS_LIVE
+
+
+def _build_poll_classes(register_map: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Infer poll classes, sharing the class of entities on the same register.
+
+    Auto-generated entities follow the curated entity of their register so a
+    register is never read at two different rates.
+    """
+
+    classes: Dict[str, str] = {}
+    by_register: Dict[str, str] = {}
+    for slug, info in register_map.items():
+        poll_class = (
+            info.get("poll_class")
+            or by_register.get(info["register"])
+            or _infer_poll_class(info)
+        )
+        by_register.setdefault(info["register"], poll_class)
+        classes[slug] = poll_class
+    return classes
+
+
+POLL_CLASSES = _build_poll_classes(REGISTER_MAP)
+
+
+def is_write_only(slug: str) -> bool:
+    """Return whether the register behind *slug* can only be written."""
+
+    reg = RAW_REGISTERS.get(REGISTER_MAP[slug]["register"])
+    return reg is not None and "W" in reg.access and "R" not in reg.access
+
+
+def polled_classes(classes: Dict[str, str]) -> Dict[str, str]:
+    """Drop the write-only command entities, which are never read."""
+
+    return {slug: cls for slug, cls in classes.items() if not is_write_only(slug)}
+
+
+def resolve_poll_classes(overrides: Dict[str, str]) -> Dict[str, str]:
+    """Apply user overrides on top of the inferred poll classes."""
+
+    classes = dict(POLL_CLASSES)
+    for slug, poll_class in overrides.items():
+        if slug not in classes:
+            logger.warning("Ignoring poll class override for unknown slug %s", slug)
+            continue
+        classes[slug] = poll_class
+    return classes
+
+
 ENERGY_SENSORS = {
     "grid_import_energy": {
         "name": "Energia prelevata dalla rete",
@@ -919,6 +1047,25 @@ DERIVED_SENSORS = {
     },
 }
 
+# Registers the energy flows are derived from (see add_derived_power_values).
+ENERGY_POWER_SOURCES = (
+    "mains_power",
+    "pv_power",
+    "output_active_power",
+    "battery_power",
+)
+DEFAULT_ENERGY_MAX_GAP = 300.0
+
+# Power registers 204, 208, 213, 217, 223 and 224, sampled by the fast lane.
+FAST_LANE_SLUGS = (
+    "mains_power",
+    "inverter_power",
+    "output_active_power",
+    "battery_power",
+    "pv_power",
+    "pv_charging_power",
+)
+
 ENERGY_SENSOR_DAILY_MAP = {
     "grid_import_energy": "grid_import_energy_today",
     "grid_export_energy": "grid_export_energy_today",
@@ -1028,7 +1175,27 @@ FRIENDLY_NAMES_IT = {
     "fault_info_query_index": "Indice interrogazione guasto",
 }
 
+# Add-on persistent storage; the energy state was kept in the working
+# directory before, and is still picked up from there once.
+DATA_DIR = Path("/data")
 ENERGY_STATE_FILE = Path("energy_state.json")
+OUTBOUND_METRICS_INTERVAL = 60.0
+DISCOVERY_CACHE_FILE = DATA_DIR / "discovery_cache.json"
+# Diagnostic traces and profiles go to /share so they can be fetched easily.
+INSTRUMENTATION_DIR = Path("/share/vevor_eml3500")
+
+DISCOVERY_AUTO = "auto"
+DISCOVERY_DEVICE = "device"
+DISCOVERY_ENTITY = "entity"
+DISCOVERY_MODES = (DISCOVERY_AUTO, DISCOVERY_DEVICE, DISCOVERY_ENTITY)
+DEVICE_DISCOVERY_MIN_VERSION = (2024, 12)
+STATE_TOPICS_ENTITY = "entity"
+STATE_TOPICS_GROUPED = "grouped"
+STATE_TOPIC_MODES = (STATE_TOPICS_ENTITY, STATE_TOPICS_GROUPED)
+DISCOVERY_ORIGIN = {
+    "name": "VEVOR EML3500-24L add-on",
+    "support_url": "https://github.com/redhunt07/ha-addon-vevor-eml3500-24l-rs232-wifi",
+}
 
 
 def _safe_float(value: Any) -> float:
@@ -1143,157 +1310,264 @@ def add_derived_power_values(data: Dict[str, Any]) -> None:
     data["battery_to_load_power"] = battery_to_load
 
 
-def load_energy_state() -> Dict[str, Any]:
-    """Load persistent energy values from disk."""
-    state: Dict[str, Any] = {slug: 0.0 for slug in ENERGY_SENSORS}
-    state["daily_date"] = datetime.now().date().isoformat()
-    if ENERGY_STATE_FILE.exists():
-        try:
-            with ENERGY_STATE_FILE.open("r", encoding="utf-8") as fp:
-                data = json.load(fp)
-            for slug in ENERGY_SENSORS:
-                state[slug] = _safe_float(data.get(slug, state[slug]))
-            if isinstance(data.get("daily_date"), str):
-                state["daily_date"] = data["daily_date"]
-        except (OSError, json.JSONDecodeError):
-            pass
-    return state
-
-
-def save_energy_state(state: Dict[str, Any]) -> None:
-    """Persist energy values to disk."""
-    try:
-        with ENERGY_STATE_FILE.open("w", encoding="utf-8") as fp:
-            payload = {
-                slug: _safe_float(state.get(slug, 0.0))
-                for slug in ENERGY_SENSORS
-            }
-            daily_date = state.get("daily_date")
-            if not isinstance(daily_date, str):
-                daily_date = datetime.now().date().isoformat()
-            payload["daily_date"] = daily_date
-            json.dump(payload, fp)
-    except OSError:
-        pass
+def energy_journal(directory: Path, compact_every: int) -> EnergyJournal:
+    """Return the journal persisting the energy counters under *directory*."""
+    return EnergyJournal(
+        directory / ENERGY_STATE_FILE.name,
+        ENERGY_SENSORS,
+        ENERGY_SENSOR_DAILY_MAP.values(),
+        compact_every=compact_every,
+    )
 
 
-def update_energy_state(
-    data: Dict[str, Any], state: Dict[str, Any], interval: float
-) -> None:
-    """Integrate power readings over interval to update energies."""
-    hours = interval / 3600.0
+def energy_power_flows(data: Dict[str, Any]) -> Dict[str, float]:
+    """Return the power in W feeding each lifetime energy counter."""
 
+    mains_power = _safe_float(data.get("mains_power", 0.0))
+    battery_power = _safe_float(data.get("battery_power", 0.0))
+    pv_to_load = max(_safe_float(data.get("pv_to_load_power", 0.0)), 0.0)
+    battery_to_load = max(_safe_float(data.get("battery_to_load_power", 0.0)), 0.0)
+    return {
+        "grid_import_energy": max(mains_power, 0.0),
+        "grid_export_energy": max(-mains_power, 0.0),
+        "pv_energy": max(_safe_float(data.get("pv_power", 0.0)), 0.0),
+        "battery_discharge_energy": max(battery_power, 0.0),
+        "battery_charge_energy": max(-battery_power, 0.0),
+        "pv_to_battery_energy": max(
+            _safe_float(data.get("pv_to_battery_power", 0.0)), 0.0
+        ),
+        "grid_to_battery_energy": max(
+            _safe_float(data.get("grid_to_battery_power", 0.0)), 0.0
+        ),
+        "pv_to_load_energy": pv_to_load,
+        "load_from_grid_energy": max(
+            _safe_float(data.get("grid_to_load_power", 0.0)), 0.0
+        ),
+        "load_from_battery_energy": battery_to_load,
+        "load_from_offgrid_energy": pv_to_load + battery_to_load,
+        "load_energy": max(_safe_float(data.get("load_power", 0.0)), 0.0),
+        "load_from_pv_energy": pv_to_load,
+    }
+
+
+def _roll_daily_energy(state: Dict[str, Any]) -> None:
     current_date = datetime.now().date().isoformat()
     if state.get("daily_date") != current_date:
         for daily_slug in ENERGY_SENSOR_DAILY_MAP.values():
             state[daily_slug] = 0.0
         state["daily_date"] = current_date
 
-    def _increment(slug: str, amount: float) -> None:
-        state[slug] = _safe_float(state.get(slug, 0.0)) + amount
 
-    mains_power = _safe_float(data.get("mains_power", 0.0))
-    if mains_power > 0:
-        energy = mains_power / 1000.0 * hours
-        _increment("grid_import_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["grid_import_energy"], energy)
-    elif mains_power < 0:
-        energy = -mains_power / 1000.0 * hours
-        _increment("grid_export_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["grid_export_energy"], energy)
+def _add_energy(state: Dict[str, Any], slug: str, energy: float) -> None:
+    for target in (slug, ENERGY_SENSOR_DAILY_MAP[slug]):
+        state[target] = _safe_float(state.get(target, 0.0)) + energy
 
-    pv_power = max(_safe_float(data.get("pv_power", 0.0)), 0.0)
-    if pv_power > 0:
-        energy = pv_power / 1000.0 * hours
-        _increment("pv_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["pv_energy"], energy)
 
-    battery_power = _safe_float(data.get("battery_power", 0.0))
-    if battery_power > 0:
-        energy = battery_power / 1000.0 * hours
-        _increment("battery_discharge_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["battery_discharge_energy"], energy)
-    elif battery_power < 0:
-        energy = -battery_power / 1000.0 * hours
-        _increment("battery_charge_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["battery_charge_energy"], energy)
-
-    pv_to_battery = _safe_float(data.get("pv_to_battery_power", 0.0))
-    if pv_to_battery > 0:
-        energy = pv_to_battery / 1000.0 * hours
-        _increment("pv_to_battery_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["pv_to_battery_energy"], energy)
-
-    grid_to_battery = _safe_float(data.get("grid_to_battery_power", 0.0))
-    if grid_to_battery > 0:
-        energy = grid_to_battery / 1000.0 * hours
-        _increment("grid_to_battery_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["grid_to_battery_energy"], energy)
-
-    pv_to_load = _safe_float(data.get("pv_to_load_power", 0.0))
-    if pv_to_load > 0:
-        energy = pv_to_load / 1000.0 * hours
-        _increment("pv_to_load_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["pv_to_load_energy"], energy)
-
-    grid_to_load = _safe_float(data.get("grid_to_load_power", 0.0))
-    if grid_to_load > 0:
-        energy = grid_to_load / 1000.0 * hours
-        _increment("load_from_grid_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["load_from_grid_energy"], energy)
-
-    battery_to_load = _safe_float(data.get("battery_to_load_power", 0.0))
-    if battery_to_load > 0:
-        energy = battery_to_load / 1000.0 * hours
-        _increment("load_from_battery_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["load_from_battery_energy"], energy)
-
-    if pv_to_load > 0 or battery_to_load > 0:
-        offgrid_energy = (pv_to_load + battery_to_load) / 1000.0 * hours
-        _increment("load_from_offgrid_energy", offgrid_energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["load_from_offgrid_energy"], offgrid_energy)
-
-    load_power = _safe_float(data.get("load_power", 0.0))
-    if load_power > 0:
-        energy = load_power / 1000.0 * hours
-        _increment("load_energy", energy)
-        _increment(ENERGY_SENSOR_DAILY_MAP["load_energy"], energy)
-
-    pv_only_load = pv_to_load / 1000.0 * hours
-    if pv_only_load > 0:
-        _increment("load_from_pv_energy", pv_only_load)
-        _increment(ENERGY_SENSOR_DAILY_MAP["load_from_pv_energy"], pv_only_load)
-
-
-async def poll_once(client: ModbusRTUOverTCPClient) -> Tuple[Dict[str, Any], str]:
-    """Read all relevant registers and return slug-value mapping with timestamp."""
+def energy_sample_time(image: RegisterImage) -> float:
+    """Return when the power registers were read, or ``0.0`` if invalid."""
 
-    results: Dict[str, Any] = {}
-    for slug, info in REGISTER_MAP.items():
-        register_name = info["register"]
-        try:
-            raw_value = await client.read_register(register_name)
-            value = _decode_value(info, raw_value)
-        except Exception as exc:  # noqa: BLE001
+    times = [
+        image.read_time(reg.address, reg.count)
+        for reg in (
+            RAW_REGISTERS[REGISTER_MAP[slug]["register"]]
+            for slug in ENERGY_POWER_SOURCES
+        )
+    ]
+    return 0.0 if min(times) <= 0.0 else max(times)
+
+
+def record_recent(
+    recent: RecentHistory, data: Dict[str, Any], image: RegisterImage
+) -> None:
+    """Add the register values in *data* to *recent* at their read times.
+
+    Values whose register was not re-read since the last call keep their
+    read time and are not recorded twice.
+    """
+
+    for slug, value in data.items():
+        info = REGISTER_MAP.get(slug)
+        reg = RAW_REGISTERS.get(info["register"]) if info else None
+        if reg is None:
+            continue
+        read_at = image.read_time(reg.address, reg.count)
+        if read_at:
+            recent.add(slug, read_at, value)
+
+
+class EnergyIntegrator:
+    """Integrate the power flows between sample times (trapezoidal rule).
+
+    Each sample carries the monotonic time its registers were received and
+    the energy between two samples is the mean of their power times the
+    elapsed time, so slow cycles are not under-counted. Invalid
+    samples are skipped and bridged by the next valid one. Gaps longer than
+    ``max_gap`` (bridge outage, restart) are not integrated: they are logged
+    and counted in ``gaps``/``gap_seconds`` and integration restarts from
+    the next sample.
+    """
+
+    def __init__(self, max_gap: float = DEFAULT_ENERGY_MAX_GAP) -> None:
+        self.max_gap = max_gap
+        self._previous: Optional[Tuple[float, Dict[str, float]]] = None
+        self.gaps = 0
+        self.gap_seconds = 0.0
+
+    def update(
+        self, data: Dict[str, Any], state: Dict[str, Any], sampled_at: float
+    ) -> float:
+        """Add the energy since the previous sample to *state*.
+
+        Returns the number of seconds integrated.
+        """
+
+        _roll_daily_energy(state)
+        previous = self._previous
+        if sampled_at <= 0.0 or (previous and sampled_at <= previous[0]):
+            # Invalid, or the same block read as last time.
+            return 0.0
+        flows = energy_power_flows(data)
+        self._previous = (sampled_at, flows)
+        if previous is None:
+            return 0.0
+        elapsed = sampled_at - previous[0]
+        if elapsed > self.max_gap:
+            self.gaps += 1
+            self.gap_seconds += elapsed
+            logger.warning(
+                "No power samples for %.0f s; energy not integrated over the gap",
+                elapsed,
+            )
+            return 0.0
+        hours = elapsed / 3600.0
+        for slug, power in flows.items():
+            energy = (previous[1][slug] + power) / 2 / 1000.0 * hours
+            if energy > 0:
+                _add_energy(state, slug, energy)
+        return elapsed
+
+
+async def read_entities(
+    client: ModbusRTUOverTCPClient, slugs: Optional[Iterable[str]] = None
+) -> Tuple[Dict[str, Dict[str, Any]], RegisterSnapshot]:
+    """Read the registers behind *slugs* (every entity by default).
+
+    Returns the selected entities and the snapshot of the read. Registers
+    that could not be read are logged here, once each.
+    """
+
+    selected = {
+        slug: REGISTER_MAP[slug]
+        for slug in (REGISTER_MAP if slugs is None else slugs)
+    }
+    snapshot = await client.read_registers(
+        list(dict.fromkeys(info["register"] for info in selected.values()))
+    )
+    if snapshot.aborted:
+        logger.error(
+            "Bridge unreachable, %d registers not read; data is stale",
+            len(snapshot.errors),
+        )
+    else:
+        for register_name, error in snapshot.errors.items():
             logger.error(
-                "Failed to read register %s: %s; data is stale", register_name, exc
+                "Failed to read register %s: %s; data is stale", register_name, error
             )
-            value = None
-        results[slug] = value
-    add_derived_power_values(results)
-    return results, datetime.now(UTC).isoformat().replace("+00:00", "Z")
+    return selected, snapshot
 
 
-def publish_discovery(
-    client: mqtt.Client, prefix: str = "vevor_eml3500"
-) -> None:
-    """Publish Home Assistant MQTT discovery config with device metadata."""
-    device_info = {
+def _timestamp() -> str:
+    return datetime.now(UTC).isoformat().replace("+00:00", "Z")
+
+
+async def poll_cycle(
+    client: ModbusRTUOverTCPClient,
+    schedule: Optional[PollSchedule] = None,
+    instrumentation: Optional[Instrumentation] = None,
+) -> Tuple[Dict[str, Any], str]:
+    """Run one poll cycle and return every entity value with a timestamp.
+
+    Only the entities due in *schedule* are read (all of them without one)
+    and the schedule learns which reads succeeded. The snapshot only tells
+    what was read: values are decoded once, from the register image that
+    holds every entity. The decode and derived value steps are reported to
+    *instrumentation* when given.
+    """
+
+    selected, snapshot = await read_entities(
+        client, None if schedule is None else schedule.due()
+    )
+    last_update = _timestamp()
+    if schedule is not None and not snapshot.aborted:
+        schedule.mark_read(
+            slug
+            for slug, info in selected.items()
+            if info["register"] not in snapshot.errors
+        )
+        schedule.mark_failed(
+            slug
+            for slug, info in selected.items()
+            if info["register"] in snapshot.errors
+        )
+    instrumentation = instrumentation or Instrumentation()
+    with instrumentation.span(SPAN_DECODE, source="image"):
+        data = entity_values(client.image)
+    with instrumentation.span(SPAN_DERIVE):
+        add_derived_power_values(data)
+    return data, last_update
+
+
+def entity_values(
+    image: RegisterImage, slugs: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """Decode entity values from the client register image.
+
+    Static and config entities are only re-read when due; the image keeps
+    their last words, so every entity is available on every cycle. Entities
+    whose register was never read, or whose last read failed, are ``None``.
+    """
+
+    raw = image.decode_all(_image_decoder(image))
+    results: Dict[str, Any] = {}
+    for slug in REGISTER_MAP if slugs is None else slugs:
+        info = REGISTER_MAP[slug]
+        value = raw.get(info["register"])
+        results[slug] = None if value is None else _decode_value(info, value)
+    return results
+
+
+def _image_decoder(image: RegisterImage) -> BlockDecoder:
+    key = (image.start, image.end)
+    decoder = _IMAGE_DECODERS.get(key)
+    if decoder is None:
+        decoder = _IMAGE_DECODERS[key] = image_decoder(
+            (
+                RAW_REGISTERS[info["register"]]
+                for info in REGISTER_MAP.values()
+                if info["register"] in RAW_REGISTERS
+            ),
+            image,
+        )
+    return decoder
+
+
+_IMAGE_DECODERS: Dict[Tuple[int, int], BlockDecoder] = {}
+
+
+def _device_info(prefix: str) -> Dict[str, Any]:
+    return {
         "identifiers": [prefix],
         "manufacturer": "VEVOR",
         "model": "EML3500-24L",
         "name": "VEVOR EML3500-24L",
     }
+
+
+def _entity_discovery(
+    prefix: str,
+) -> Iterable[Tuple[str, str, Dict[str, Any]]]:
+    """Yield ``(component, slug, config)`` for every entity of the device."""
+    device_info = _device_info(prefix)
     for slug, info in ALL_SENSORS.items():
         writable = info.get("writable")
         entity_category = info.get("entity_category")
@@ -1312,9 +1586,6 @@ def publish_discovery(
         if entity_category:
             base["entity_category"] = entity_category
         if writable:
-            client.publish(
-                f"homeassistant/sensor/{prefix}_{slug}/config", "", retain=True
-            )
             command_topic = f"{prefix}/{slug}/set"
             if info.get("encoder") and info.get("decoder"):
                 decoder = info["decoder"]
@@ -1328,7 +1599,7 @@ def publish_discovery(
                     "command_topic": command_topic,
                     "options": options,
                 }
-                topic = f"homeassistant/select/{prefix}_{slug}/config"
+                component = "select"
             else:
                 payload = {
                     **base,
@@ -1342,7 +1613,7 @@ def publish_discovery(
                     payload["state_class"] = "measurement"
                 if device_class := info.get("device_class"):
                     payload["device_class"] = device_class
-                topic = f"homeassistant/number/{prefix}_{slug}/config"
+                component = "number"
         else:
             payload = base.copy()
             if unit := info.get("unit"):
@@ -1354,25 +1625,174 @@ def publish_discovery(
                 payload["state_class"] = "measurement"
             if device_class := info.get("device_class"):
                 payload["device_class"] = device_class
-            topic = f"homeassistant/sensor/{prefix}_{slug}/config"
-        client.publish(topic, json.dumps(payload), retain=True)
-        client.publish(
-            f"{prefix}/{slug}/attributes",
-            json.dumps(_build_attributes(slug, info)),
-            retain=True,
-        )
-    last_update_payload = {
+            component = "sensor"
+        yield component, slug, payload
+    yield "sensor", "last_update", {
         "name": "VEVOR Last Update",
         "state_topic": f"{prefix}/last_update",
         "unique_id": f"{prefix}_last_update",
         "device": device_info,
         "device_class": "timestamp",
     }
-    client.publish(
-        f"homeassistant/sensor/{prefix}_last_update/config",
-        json.dumps(last_update_payload),
-        retain=True,
+
+
+def discovery_config_topics(
+    prefix: str = "vevor_eml3500", mode: str = DISCOVERY_ENTITY
+) -> set[str]:
+    """Return the discovery config topics *mode* publishes a payload to."""
+    if mode == DISCOVERY_DEVICE:
+        return {f"homeassistant/device/{prefix}/config"}
+    return {
+        f"homeassistant/{component}/{prefix}_{slug}/config"
+        for component, slug, _ in _entity_discovery(prefix)
+    }
+
+
+def state_groups(classes: Dict[str, str]) -> Dict[str, str]:
+    """Assign every entity to a grouped state topic from its poll class."""
+    by_class = {
+        POLL_CLASS_STATIC: STATE_GROUP_DIAGNOSTICS,
+        POLL_CLASS_CONFIG: STATE_GROUP_SETTINGS,
+    }
+    groups = {
+        slug: by_class.get(classes.get(slug, POLL_CLASS_LIVE), STATE_GROUP_TELEMETRY)
+        for slug in ALL_SENSORS
+    }
+    groups.update(dict.fromkeys(ENERGY_SENSORS, STATE_GROUP_ENERGY))
+    groups["last_update"] = STATE_GROUP_TELEMETRY
+    return groups
+
+
+def history_slugs(classes: Dict[str, str], fast_lane: bool = False) -> List[str]:
+    """Return the entities the poll cycle records in the history store.
+
+    One entity per live register (aliases of the same register are
+    skipped), the derived power flows and the lifetime energy counters.
+    With *fast_lane* the power registers and the flows derived from them
+    are left out: the fast lane records them at their own read times.
+    """
+
+    skipped = (
+        {REGISTER_MAP[slug]["register"] for slug in FAST_LANE_SLUGS}
+        if fast_lane
+        else set()
     )
+    by_register: Dict[str, str] = {}
+    for slug, info in REGISTER_MAP.items():
+        if info["register"] in skipped:
+            continue
+        if classes.get(slug, POLL_CLASS_LIVE) == POLL_CLASS_LIVE:
+            by_register.setdefault(info["register"], slug)
+    derived: Dict[str, Any] = {}
+    if not fast_lane:
+        add_derived_power_values(derived)
+    return [*by_register.values(), *derived, *ENERGY_SENSOR_DAILY_MAP]
+
+
+def build_discovery_messages(
+    prefix: str = "vevor_eml3500",
+    mode: str = DISCOVERY_ENTITY,
+    groups: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """Return the retained discovery and attributes payloads keyed by topic.
+
+    In ``entity`` mode every entity has its own config topic and the sensor
+    topic of writable entities is cleared. In ``device`` mode a single
+    ``homeassistant/device/<prefix>/config`` payload lists all components
+    and their static attributes share one ``<prefix>/attributes`` topic,
+    picked per entity by a ``json_attributes_template``.
+    With *groups* (see :func:`state_groups`) entities read their value from
+    the grouped JSON state topic through a ``value_template``.
+    """
+
+    messages: Dict[str, str] = {}
+    components: Dict[str, Dict[str, Any]] = {}
+    attributes: Dict[str, Dict[str, Any]] = {}
+    for component, slug, payload in _entity_discovery(prefix):
+        if groups is not None:
+            group = groups.get(slug, STATE_GROUP_TELEMETRY)
+            payload["state_topic"] = group_topic(prefix, group)
+            payload["value_template"] = f"{{{{ value_json.{slug} }}}}"
+        if mode == DISCOVERY_DEVICE:
+            config = {k: v for k, v in payload.items() if k != "device"}
+            if slug in ALL_SENSORS:
+                attributes[slug] = _build_attributes(slug, ALL_SENSORS[slug])
+                config["json_attributes_topic"] = f"{prefix}/attributes"
+                config["json_attributes_template"] = (
+                    f"{{{{ value_json.{slug} | tojson }}}}"
+                )
+            components[payload["unique_id"]] = {"platform": component, **config}
+        else:
+            if component != "sensor":
+                messages[f"homeassistant/sensor/{prefix}_{slug}/config"] = ""
+            topic = f"homeassistant/{component}/{prefix}_{slug}/config"
+            messages[topic] = json.dumps(payload)
+            if slug in ALL_SENSORS:
+                messages[f"{prefix}/{slug}/attributes"] = json.dumps(
+                    _build_attributes(slug, ALL_SENSORS[slug])
+                )
+    if mode == DISCOVERY_DEVICE:
+        messages[f"{prefix}/attributes"] = json.dumps(attributes)
+        messages[f"homeassistant/device/{prefix}/config"] = json.dumps(
+            {
+                "device": _device_info(prefix),
+                "origin": DISCOVERY_ORIGIN,
+                "components": components,
+            }
+        )
+    return messages
+
+
+def publish_discovery(
+    client: mqtt.Client,
+    prefix: str = "vevor_eml3500",
+    cache: Optional[DiscoveryCache] = None,
+    force: bool = False,
+    mode: str = DISCOVERY_ENTITY,
+    groups: Optional[Dict[str, str]] = None,
+    configs_only: bool = False,
+) -> int:
+    """Publish Home Assistant MQTT discovery config with device metadata.
+
+    With a *cache*, only payloads that changed since the last publish are
+    sent (everything when *force* is set; with *configs_only* a forced
+    refresh skips the retained attributes, which the broker still holds
+    when Home Assistant restarts), and config topics of the other
+    discovery *mode* found in the cache are migrated to the new layout; in
+    device mode an empty cache is assumed to come from the per-entity
+    layout of earlier releases. Returns the number of messages sent.
+    """
+
+    messages = build_discovery_messages(prefix, mode, groups)
+    if cache is None:
+        return DiscoveryCache().publish(client, messages)
+    other = DISCOVERY_ENTITY if mode == DISCOVERY_DEVICE else DISCOVERY_DEVICE
+    migrate = discovery_config_topics(prefix, other)
+    if cache.hashes or mode != DISCOVERY_DEVICE:
+        migrate &= cache.hashes.keys()
+    return cache.publish(
+        client,
+        messages,
+        force=force,
+        migrate=migrate,
+        force_prefix=DISCOVERY_PREFIX if configs_only else "",
+    )
+
+
+def resolve_discovery_mode(mode: str, ha_version: Optional[str] = None) -> str:
+    """Pick the discovery mode, resolving ``auto`` from the Core version.
+
+    Device-based discovery (and migrating entities to it) needs Home
+    Assistant 2024.12 or newer; an unknown version falls back to the
+    per-entity layout every release understands.
+    """
+
+    if mode != DISCOVERY_AUTO:
+        return mode
+    match = re.match(r"(\d+)\.(\d+)", ha_version or "")
+    if match and (int(match[1]), int(match[2])) >= DEVICE_DISCOVERY_MIN_VERSION:
+        return DISCOVERY_DEVICE
+    return DISCOVERY_ENTITY
 
 
 def publish_telemetry(
@@ -1391,17 +1811,26 @@ async def handle_command(
     slug: str | None = None,
     mqtt_client: mqtt.Client | None = None,
     prefix: str = "vevor_eml3500",
-) -> None:
-    """Handle MQTT command payload to write registers and republish state."""
+    echo_state: bool = True,
+    schedule: Optional[PollSchedule] = None,
+) -> Dict[str, Any]:
+    """Handle MQTT command payload to write registers and republish state.
+
+    Returns the decoded values read back after the writes, keyed by slug.
+    The per-slug state topics are only republished with *echo_state*.
+    Entities on a written register are due again in *schedule*, so the
+    next cycle confirms what the inverter accepted.
+    """
     if slug is not None:
         data = {slug: payload}
     else:
         try:
             data = json.loads(payload)
         except json.JSONDecodeError:
-            return
+            return {}
         if not isinstance(data, dict):
-            return
+            return {}
+    written: list[str] = []
     for key, value in data.items():
         if key not in WRITABLE_REGISTERS:
             logger.warning("Unknown writable register: %s", key)
@@ -1432,16 +1861,127 @@ async def handle_command(
                     f"{prefix}/error", f"Write failed for {key}: {err}"
                 )
             continue
+        written.append(key)
 
-        if mqtt_client:
-            try:
-                new_value = await modbus.read_register(info["register"])
-            except Exception:
+    if schedule is not None:
+        registers = {REGISTER_MAP[key]["register"] for key in written}
+        for other, info in REGISTER_MAP.items():
+            if info["register"] in registers:
+                schedule.invalidate(other)
+
+    read_back: Dict[str, Any] = {}
+    if mqtt_client and written:
+        try:
+            snapshot = await modbus.read_registers(
+                [REGISTER_MAP[key]["register"] for key in written],
+                priority=Priority.REFRESH,
+            )
+        except Exception:
+            return read_back
+        for key in written:
+            info = REGISTER_MAP[key]
+            if info["register"] not in snapshot.values:
                 continue
-            new_value = _decode_value(info, new_value)
-            mqtt_client.publish(
-                f"{prefix}/{key}", str(new_value), retain=True
+            new_value = _decode_value(info, snapshot.values[info["register"]])
+            read_back[key] = new_value
+            if echo_state:
+                mqtt_client.publish(
+                    f"{prefix}/{key}", str(new_value), retain=True
+                )
+    return read_back
+
+
+def render_metrics(
+    modbus: ModbusRTUOverTCPClient,
+    cycles: CycleStats,
+    outbound: Optional[OutboundScheduler] = None,
+    fast_lane: Optional[FastLane] = None,
+    energy: Optional[EnergyIntegrator] = None,
+    now: Optional[float] = None,
+) -> str:
+    """Return the OpenMetrics exposition of the poller's live counters."""
+    now = time.monotonic() if now is None else now
+    stats = modbus.stats
+    out = OpenMetricsWriter("vevor")
+    out.counter("modbus_requests", "Modbus requests sent", stats.requests)
+    out.counter("modbus_retries", "Modbus requests that were retries", stats.retries)
+    out.counter("modbus_timeouts", "Modbus requests that timed out", stats.timeouts)
+    out.counter(
+        "modbus_errors", "Modbus requests failed by transport errors", stats.errors
+    )
+    out.counter(
+        "modbus_reconnects",
+        "Reconnections to the bridge after the first connect",
+        max(stats.connects - 1, 0),
+    )
+    for op, histogram in stats.latency.items():
+        out.histogram(
+            "modbus_request_duration_seconds",
+            "Duration of successful Modbus requests on the wire",
+            histogram,
+            op=op,
+        )
+    for priority, wait in modbus.arbiter.stats.items():
+        out.gauge(
+            "modbus_bus_wait_max_seconds",
+            "Longest wait for the bus per priority",
+            wait.max,
+            priority=priority.name.lower(),
+        )
+    out.gauge(
+        "modbus_circuit_open", "1 while the bridge circuit is open", modbus.circuit_open
+    )
+    for block in modbus.blocks():
+        read_at = modbus.image.read_time(block.address, block.count)
+        if read_at > 0:
+            out.gauge(
+                "modbus_block_read_age_seconds",
+                "Seconds since the register block was last read successfully",
+                round(now - read_at, 3),
+                block=f"{block.address}-{block.end - 1}",
             )
+    out.histogram(
+        "poll_cycle_duration_seconds", "Duration of poll cycles", cycles.duration
+    )
+    out.counter(
+        "poll_cycle_overruns",
+        "Poll cycles longer than the poll interval",
+        cycles.overruns,
+    )
+    if outbound is not None:
+        out.gauge(
+            "mqtt_connected", "1 while the broker is connected", outbound.connected
+        )
+        out.gauge(
+            "mqtt_queue_depth", "Messages waiting to be published", outbound.queue_depth
+        )
+        out.gauge(
+            "mqtt_queue_depth_max",
+            "Deepest outbound queue since startup",
+            outbound.max_queue_depth,
+        )
+        out.counter(
+            "mqtt_published", "Messages handed to the broker", outbound.published
+        )
+        out.counter(
+            "mqtt_coalesced",
+            "Queued messages replaced by a newer one for the same topic",
+            outbound.coalesced,
+        )
+        out.counter(
+            "mqtt_dropped",
+            "Queued messages dropped because the outbound queue was full",
+            outbound.dropped,
+        )
+    if fast_lane is not None:
+        out.counter(
+            "fast_lane_failures", "Failed fast lane power samples", fast_lane.failures
+        )
+    if energy is not None:
+        out.counter(
+            "energy_gaps", "Sample gaps too long to integrate energy over", energy.gaps
+        )
+    return out.render()
 
 
 async def main(args: argparse.Namespace) -> None:
@@ -1449,129 +1989,274 @@ async def main(args: argparse.Namespace) -> None:
         host=args.bridge_host,
         port=args.bridge_port,
         poll_interval=args.poll_interval,
+        max_gap=args.read_max_gap,
+        failure_threshold=args.failure_threshold,
+        max_probe_interval=args.max_probe_interval,
+        transport=args.modbus_transport,
     )
     loop = asyncio.get_running_loop()
+    instrumentation = modbus.instrumentation
 
-    mqtt_client: Optional[mqtt.Client] = None
+    mqtt_client: Optional[MQTTManager] = None
+    outbound: Optional[OutboundScheduler] = None
     prefix = "vevor_eml3500"
-    energy_state = load_energy_state()
-    if args.mqtt_host:
-        mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-        if args.mqtt_username:
-            mqtt_client.username_pw_set(
-                args.mqtt_username, args.mqtt_password or ""
+    poll_classes = resolve_poll_classes(parse_poll_class_overrides(args.poll_class))
+    groups = (
+        state_groups(poll_classes)
+        if args.state_topics == STATE_TOPICS_GROUPED
+        else None
+    )
+    publisher = StatePublisher(
+        mqtt_client,
+        prefix,
+        ALL_SENSORS,
+        deadbands=parse_deadband_overrides(args.deadband),
+        heartbeat_interval=args.heartbeat_interval,
+        groups=groups,
+    )
+    discovery_cache = DiscoveryCache(Path(args.discovery_cache))
+    discovery_mode = resolve_discovery_mode(args.discovery_mode, args.ha_version)
+    logger.info("Using %s-based MQTT discovery", discovery_mode)
+    journal = energy_journal(Path(args.energy_state_dir), args.energy_compact_every)
+    # Earlier releases kept the file in the working directory.
+    energy_state = await asyncio.to_thread(journal.load, legacy=ENERGY_STATE_FILE)
+    energy_flushed = time.monotonic()
+    energy = EnergyIntegrator(args.energy_max_gap)
+    recent = RecentHistory(args.recent_samples)
+    store: Optional[HistoryStore] = None
+    if args.history_store:
+        store = await asyncio.to_thread(
+            HistoryStore,
+            Path(args.history_store),
+            ENERGY_SENSOR_DAILY_MAP,
+            parse_retention_overrides(args.history_retention),
+        )
+    stored_slugs = history_slugs(poll_classes, args.fast_lane_interval > 0)
+    schedule = PollSchedule(
+        polled_classes(poll_classes),
+        config_refresh_interval=args.config_refresh_interval,
+    )
+
+    async def run_command(payload: str, slug: Optional[str]) -> None:
+        with outbound_priority(MessagePriority.COMMAND):
+            publisher.remember(
+                await handle_command(
+                    modbus,
+                    payload,
+                    slug,
+                    outbound,
+                    prefix,
+                    echo_state=groups is None,
+                    schedule=schedule,
+                )
             )
-        try:
-            mqtt_client.connect(
-                args.mqtt_host, args.mqtt_port, keepalive=args.mqtt_keepalive
+
+    def publish_discovery_now(
+        force: bool = False, configs_only: bool = False
+    ) -> None:
+        publish_discovery(
+            outbound,
+            prefix,
+            discovery_cache,
+            force=force,
+            mode=discovery_mode,
+            groups=groups,
+            configs_only=configs_only,
+        )
+
+    def on_connected(session_present: bool) -> None:
+        # A resumed session means the broker kept our subscriptions and the
+        # retained topics; a new one (first start, broker restart without
+        # persistence) gets everything again.
+        publish_discovery_now(force=not session_present)
+        if not session_present:
+            publisher.reset()
+        start_replay()
+
+    history = (
+        OutboundBuffer(
+            Path(args.history_buffer_dir),
+            max_bytes=int(args.history_buffer_max_mb * 1024 * 1024),
+            max_age=args.history_buffer_max_age * 3600,
+        )
+        if args.history_buffer_dir and args.history_buffer_max_mb > 0
+        else None
+    )
+    replay_task: Optional[asyncio.Task] = None
+
+    def start_replay() -> None:
+        nonlocal replay_task
+        if not history or not history.pending:
+            return
+        if replay_task is None or replay_task.done():
+            replay_task = loop.create_task(
+                history.replay(outbound, f"{prefix}/history")
             )
-            mqtt_client.loop_start()
-            mqtt_client.publish(
-                f"{prefix}/availability", "online", retain=True
+
+    commands: set[asyncio.Task] = set()
+    instrumentation_topic = f"{prefix}/instrumentation/set"
+    hook_switch = HookSwitch(
+        instrumentation,
+        Path(args.instrumentation_dir),
+        profile_every=args.profile_every,
+    )
+
+    def on_message(msg: mqtt.MQTTMessage) -> None:
+        topic = msg.topic
+        if topic == HA_STATUS_TOPIC:
+            # Only a live birth message means Home Assistant restarted; a
+            # retained copy is delivered on every subscribe.
+            if msg.payload == b"online" and not msg.retain:
+                logger.info("Home Assistant is online, republishing discovery")
+                publish_discovery_now(force=True, configs_only=True)
+                publisher.reset()
+            return
+        if topic == instrumentation_topic:
+            try:
+                state = hook_switch.apply(msg.payload.decode())
+            except (OSError, ValueError) as err:
+                logger.warning("%s", err)
+                state = hook_switch.state
+            outbound.publish(f"{prefix}/instrumentation", state)
+            return
+        slug = None if topic == f"{prefix}/set" else topic.split("/")[-2]
+        task = loop.create_task(run_command(msg.payload.decode(), slug))
+        commands.add(task)
+        task.add_done_callback(commands.discard)
+
+    if args.mqtt_host:
+        mqtt_client = MQTTManager(
+            args.mqtt_host,
+            args.mqtt_port,
+            client_id=args.mqtt_client_id,
+            username=args.mqtt_username,
+            password=args.mqtt_password,
+            keepalive=args.mqtt_keepalive,
+            availability_topic=f"{prefix}/availability",
+        )
+        mqtt_client.on_message = on_message
+        mqtt_client.on_connected = on_connected
+        # The instrumentation command topic is covered by "+/set".
+        for topic in (f"{prefix}/set", f"{prefix}/+/set", HA_STATUS_TOPIC):
+            mqtt_client.subscribe(topic)
+        outbound = OutboundScheduler(
+            mqtt_client, rate=args.mqtt_rate_limit, burst=args.mqtt_burst
+        )
+        publisher.reset(outbound)
+        outbound.start()
+        await mqtt_client.start()
+
+    async def wait_for_bridge() -> None:
+        # Every entity shares the availability topic, so one publish marks
+        # the whole device unavailable while the bridge is down.
+        if mqtt_client:
+            mqtt_client.set_available(False)
+        await modbus.wait_for_recovery()
+        if mqtt_client:
+            mqtt_client.set_available(True)
+
+    fast_lane: Optional[FastLane] = None
+    if args.fast_lane_interval > 0:
+        fast_lane_registers = [
+            REGISTER_MAP[slug]["register"] for slug in FAST_LANE_SLUGS
+        ]
+
+        async def sample_power() -> Optional[Tuple[float, Dict[str, Any]]]:
+            if modbus.circuit_open:
+                return None
+            snapshot = await modbus.read_registers(fast_lane_registers, retries=1)
+            if snapshot.errors:
+                return None
+            return (
+                energy_sample_time(modbus.image),
+                entity_values(modbus.image, FAST_LANE_SLUGS),
             )
-        except OSError as err:  # pragma: no cover - network error
-            print(f"MQTT connect failed: {err}")
-            mqtt_client = None
-        else:
-            data, last_update = await poll_once(modbus)
-            all_data = {**data, **energy_state, "last_update": last_update}
-            publish_discovery(mqtt_client, prefix)
-            for slug, value in all_data.items():
-                payload = "unknown" if value is None else str(value)
-                mqtt_client.publish(f"{prefix}/{slug}", payload, retain=True)
-            publish_telemetry(mqtt_client, prefix, all_data)
-            mqtt_client.subscribe(f"{prefix}/set")
-            mqtt_client.subscribe(f"{prefix}/+/set")
-
-            def on_message(
-                client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage
-            ) -> None:
-                topic = msg.topic
-                payload = msg.payload.decode()
-                if topic == f"{prefix}/set":
-                    asyncio.run_coroutine_threadsafe(
-                        handle_command(
-                            modbus, payload, mqtt_client=client, prefix=prefix
-                        ),
-                        loop,
-                    )
-                else:
-                    slug = topic.split("/")[-2]
-                    asyncio.run_coroutine_threadsafe(
-                        handle_command(modbus, payload, slug, client, prefix),
-                        loop,
-                    )
 
-            mqtt_client.on_message = on_message
+        def integrate_sample(values: Dict[str, Any], sampled_at: float) -> None:
+            data = dict(values)
+            add_derived_power_values(data)
+            energy.update(data, energy_state, sampled_at)
+            if store is not None:
+                # The only place the power registers and their flows are
+                # stored, back-dated to when the registers were read.
+                store.record(data, time.time() - (time.monotonic() - sampled_at))
+
+        fast_lane = FastLane(
+            sample_power, args.fast_lane_interval, integrate_sample, history=recent
+        )
+        fast_lane.start()
+
+    cycles = CycleStats()
+    metrics_server: Optional[MetricsServer] = None
+    if args.metrics_port:
+        metrics_server = MetricsServer(
+            lambda: render_metrics(modbus, cycles, outbound, fast_lane, energy),
+            port=args.metrics_port,
+        )
+        await metrics_server.start()
 
+    metrics_published = time.monotonic()
     try:
         while True:
-            data, last_update = await poll_once(modbus)
-            update_energy_state(data, energy_state, args.poll_interval)
-            all_data = {**data, **energy_state, "last_update": last_update}
-            if mqtt_client:
-                try:
-                    for slug, value in all_data.items():
-                        payload = "unknown" if value is None else str(value)
-                        mqtt_client.publish(
-                            f"{prefix}/{slug}", payload, retain=True
-                        )
-                    publish_telemetry(mqtt_client, prefix, all_data)
-                except OSError as err:  # pragma: no cover - network error
-                    print(f"MQTT publish failed: {err}")
-                    mqtt_client.loop_stop()
-                    mqtt_client = None
-            elif args.mqtt_host:
-                try:
-                    mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-                    if args.mqtt_username:
-                        mqtt_client.username_pw_set(
-                            args.mqtt_username, args.mqtt_password or ""
-                        )
-                    mqtt_client.connect(
-                        args.mqtt_host, args.mqtt_port, keepalive=args.mqtt_keepalive
-                    )
-                    mqtt_client.loop_start()
-                    mqtt_client.publish(
-                        f"{prefix}/availability", "online", retain=True
-                    )
-                except OSError as err:  # pragma: no cover - network error
-                    print(f"MQTT reconnect failed: {err}")
-                    mqtt_client = None
-                else:
-                    publish_discovery(mqtt_client, prefix)
-                    for slug, value in all_data.items():
-                        payload = "unknown" if value is None else str(value)
-                        mqtt_client.publish(
-                            f"{prefix}/{slug}", payload, retain=True
-                        )
-                    publish_telemetry(mqtt_client, prefix, all_data)
-                    mqtt_client.subscribe(f"{prefix}/set")
-                    mqtt_client.subscribe(f"{prefix}/+/set")
-                    mqtt_client.on_message = (
-                        lambda c, u, m: asyncio.run_coroutine_threadsafe(
-                            handle_command(
-                                modbus,
-                                m.payload.decode(),
-                                None
-                                if m.topic == f"{prefix}/set"
-                                else m.topic.split("/")[-2],
-                                c,
-                                prefix,
-                            ),
-                            loop,
+            with instrumentation.span(SPAN_CYCLE):
+                cycle_started = time.monotonic()
+                data, last_update = await poll_cycle(
+                    modbus, schedule, instrumentation
+                )
+                if modbus.circuit_open:
+                    await wait_for_bridge()
+                    continue
+                record_recent(recent, data, modbus.image)
+                if fast_lane is None:
+                    energy.update(data, energy_state, energy_sample_time(modbus.image))
+                all_data = {**data, **energy_state, "last_update": last_update}
+                if mqtt_client:
+                    if history and not mqtt_client.connected:
+                        # Kept on disk and replayed on the history topic; the
+                        # state topics catch up on the first cycle after.
+                        await asyncio.to_thread(history.append, all_data)
+                    else:
+                        # Published, or queued until the broker is back.
+                        with instrumentation.span(SPAN_PUBLISH, entities=len(all_data)):
+                            publisher.publish(all_data)
+                        if fast_lane is not None:
+                            outbound.publish(
+                                f"{prefix}/power_stats",
+                                json.dumps(fast_lane.window(args.poll_interval)),
+                            )
+                    now = time.monotonic()
+                    if now - metrics_published >= OUTBOUND_METRICS_INTERVAL:
+                        metrics_published = now
+                        outbound.publish(
+                            f"{prefix}/metrics/outbound",
+                            json.dumps(outbound.metrics()),
+                            priority=MessagePriority.BACKGROUND,
                         )
+                if store is not None:
+                    store.record(
+                        {slug: all_data.get(slug) for slug in stored_slugs}, time.time()
                     )
-            save_energy_state(energy_state)
+                    await asyncio.to_thread(store.maintain)
+                now = time.monotonic()
+                if now - energy_flushed >= args.energy_flush_interval:
+                    energy_flushed = now
+                    await asyncio.to_thread(journal.flush, dict(energy_state))
+                cycles.record(time.monotonic() - cycle_started, args.poll_interval)
             await asyncio.sleep(args.poll_interval)
     finally:
+        hook_switch.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        if fast_lane is not None:
+            await fast_lane.stop()
+        await asyncio.to_thread(journal.compact, dict(energy_state))
+        if store is not None:
+            await asyncio.to_thread(store.flush)
+            await asyncio.to_thread(store.close)
         await modbus.close()
         if mqtt_client:
-            mqtt_client.publish(
-                f"{prefix}/availability", "offline", retain=True
-            )
-            mqtt_client.loop_stop()
-            mqtt_client.disconnect()
+            await outbound.stop()
+            await mqtt_client.stop()
 
 
 if __name__ == "__main__":
@@ -1584,4 +2269,172 @@ if __name__ == "__main__":
     parser.add_argument("--mqtt-username", default="")
     parser.add_argument("--mqtt-password", default="")
     parser.add_argument("--mqtt-keepalive", type=int, default=60)
+    parser.add_argument(
+        "--mqtt-rate-limit",
+        type=float,
+        default=DEFAULT_RATE,
+        help="Maximum MQTT messages per second sent to the broker",
+    )
+    parser.add_argument(
+        "--mqtt-burst",
+        type=int,
+        default=DEFAULT_BURST,
+        help="Messages that may be sent at once before the rate limit applies",
+    )
+    parser.add_argument(
+        "--mqtt-client-id",
+        default="vevor_eml3500_poller",
+        help="Fixed MQTT client id; the broker keeps the session under this id",
+    )
+    parser.add_argument(
+        "--read-max-gap",
+        type=int,
+        default=DEFAULT_MAX_GAP,
+        help="Unused registers to read through instead of starting a new request",
+    )
+    parser.add_argument(
+        "--config-refresh-interval",
+        type=float,
+        default=DEFAULT_CONFIG_REFRESH_INTERVAL,
+        help="Seconds between re-reads of configuration registers",
+    )
+    parser.add_argument(
+        "--poll-class",
+        action="append",
+        default=[],
+        metavar="SLUG=CLASS",
+        help="Override the poll class (static, config, live) of an entity",
+    )
+    parser.add_argument(
+        "--failure-threshold",
+        type=int,
+        default=3,
+        help="Consecutive bridge failures before the rest of a cycle is skipped",
+    )
+    parser.add_argument(
+        "--max-probe-interval",
+        type=float,
+        default=60.0,
+        help="Upper bound in seconds for the reconnect probe backoff",
+    )
+    parser.add_argument(
+        "--history-buffer-dir",
+        help="Directory buffering telemetry while MQTT is down (disabled if unset)",
+    )
+    parser.add_argument(
+        "--history-buffer-max-mb",
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help="Maximum size of the telemetry buffer in MiB (0 disables it)",
+    )
+    parser.add_argument(
+        "--history-buffer-max-age",
+        type=float,
+        default=DEFAULT_MAX_AGE / 3600,
+        help="Hours after which buffered telemetry is dropped",
+    )
+    parser.add_argument(
+        "--energy-state-dir",
+        default=str(DATA_DIR),
+        help="Directory holding the energy counter snapshot and journal",
+    )
+    parser.add_argument(
+        "--energy-flush-interval",
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help="Seconds between energy journal writes (0 writes every cycle)",
+    )
+    parser.add_argument(
+        "--history-store",
+        default="",
+        help="SQLite file for the long-term history (empty disables it)",
+    )
+    parser.add_argument(
+        "--history-retention",
+        action="append",
+        default=[],
+        metavar="TIER=DAYS",
+        help="Days to keep raw, minute, hour or day history (0 keeps forever)",
+    )
+    parser.add_argument(
+        "--recent-samples",
+        type=int,
+        default=DEFAULT_RECENT_SAMPLES,
+        help="Samples of recent history kept in memory per sensor",
+    )
+    parser.add_argument(
+        "--fast-lane-interval",
+        type=float,
+        default=0.0,
+        help="Seconds between power register samples (0 disables the fast lane)",
+    )
+    parser.add_argument(
+        "--energy-max-gap",
+        type=float,
+        default=DEFAULT_ENERGY_MAX_GAP,
+        help="Seconds without power samples after which energy is not integrated",
+    )
+    parser.add_argument(
+        "--energy-compact-every",
+        type=int,
+        default=DEFAULT_COMPACT_EVERY,
+        help="Journal writes after which the energy snapshot is rewritten",
+    )
+    parser.add_argument(
+        "--discovery-cache",
+        default=str(DISCOVERY_CACHE_FILE),
+        help="File storing the hashes of the published discovery payloads",
+    )
+    parser.add_argument(
+        "--discovery-mode",
+        choices=DISCOVERY_MODES,
+        default=DISCOVERY_AUTO,
+        help="Publish one discovery config per device or per entity",
+    )
+    parser.add_argument(
+        "--state-topics",
+        choices=STATE_TOPIC_MODES,
+        default=STATE_TOPICS_ENTITY,
+        help="Publish one state topic per entity or grouped JSON state topics",
+    )
+    parser.add_argument(
+        "--ha-version",
+        help="Home Assistant Core version used to resolve --discovery-mode auto",
+    )
+    parser.add_argument(
+        "--deadband",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="State publish deadband for a device class or unit, e.g. power=10",
+    )
+    parser.add_argument(
+        "--heartbeat-interval",
+        type=float,
+        default=DEFAULT_HEARTBEAT_INTERVAL,
+        help="Seconds between full state refreshes (0 publishes every cycle)",
+    )
+    parser.add_argument(
+        "--modbus-transport",
+        choices=TRANSPORTS,
+        default=TRANSPORT_PYMODBUS,
+        help="Modbus client implementation used to talk to the bridge",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve OpenMetrics on this port at /metrics (0 disables it)",
+    )
+    parser.add_argument(
+        "--instrumentation-dir",
+        default=str(INSTRUMENTATION_DIR),
+        help="Directory for the trace and profiles enabled over MQTT",
+    )
+    parser.add_argument(
+        "--profile-every",
+        type=int,
+        default=DEFAULT_PROFILE_EVERY,
+        help="Profile one poll cycle in this many while profiling is on",
+    )
     asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""In-memory image of the inverter holding registers.
+
+Every successful block read is copied into one ``array('H')`` covering the
+documented register range (100-745), with a parallel ``array('d')`` holding
+the monotonic time each address was last read. Consumers decode values from
+views of the image instead of keeping their own per-register copies, so
+static and settings registers read long ago stay available next to the live
+telemetry of the current cycle.
+
+A timestamp of ``0.0`` marks an address that has never been read, or whose
+last read failed.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Sequence
+
+from .decode_plan import BlockDecoder, register_decoder
+from .read_planner import ReadBlock
+
+if TYPE_CHECKING:  # pragma: no cover - import only used for type hints
+    from .modbus_client import RegisterDefinition
+
+IMAGE_START = 100
+IMAGE_END = 746
+
+
+class RegisterImage:
+    """Register words and per-address read times for ``[start, end)``."""
+
+    def __init__(self, start: int = IMAGE_START, end: int = IMAGE_END) -> None:
+        self.start = start
+        self.end = end
+        size = end - start
+        self.words = array("H", bytes(2 * size))
+        self.timestamps = array("d", bytes(8 * size))
+
+    def _span(self, address: int, count: int) -> tuple[int, int]:
+        first = max(address, self.start)
+        last = min(address + count, self.end)
+        return first - self.start, max(last - self.start, first - self.start)
+
+    def covers(self, address: int, count: int = 1) -> bool:
+        return self.start <= address and address + count <= self.end
+
+    def update(self, address: int, words: Sequence[int], monotonic: float) -> None:
+        """Copy a block response into the image; words outside it are dropped."""
+        first, last = self._span(address, len(words))
+        if first == last:
+            return
+        skip = first + self.start - address
+        self.words[first:last] = array("H", words[skip : skip + last - first])
+        self.timestamps[first:last] = array("d", [monotonic]) * (last - first)
+
+    def invalidate(self, address: int, count: int = 1) -> None:
+        """Mark a range as not holding valid data."""
+        first, last = self._span(address, count)
+        self.timestamps[first:last] = array("d", bytes(8 * (last - first)))
+
+    def view(self, address: int, count: int = 1) -> memoryview:
+        """Return a zero-copy view of the words of a register."""
+        first, last = self._span(address, count)
+        return memoryview(self.words)[first:last]
+
+    def read_time(self, address: int, count: int = 1) -> float:
+        """Return when the range was last read in full, or ``0.0``."""
+        if not self.covers(address, count):
+            return 0.0
+        first, last = self._span(address, count)
+        return min(self.timestamps[first:last])
+
+    def valid(self, address: int, count: int = 1) -> bool:
+        return self.read_time(address, count) > 0.0
+
+    def decode(self, reg: "RegisterDefinition") -> Any:
+        """Decode *reg* from the image, or return ``None`` if not read."""
+        if not self.valid(reg.address, reg.count):
+            return None
+        return register_decoder(reg)(self.view(reg.address, reg.count))
+
+    def decode_all(self, decoder: BlockDecoder) -> Dict[str, Any]:
+        """Decode every valid register of an :func:`image_decoder` at once."""
+        values = decoder.decode(self.words)
+        return {
+            reg.name: values[reg.name]
+            for reg in decoder.block.registers
+            if self.valid(reg.address, reg.count)
+        }
+
+
+def image_decoder(
+    registers: Iterable["RegisterDefinition"], image: RegisterImage
+) -> BlockDecoder:
+    """Compile one decoder for *registers* spanning the whole image."""
+    members = sorted(
+        {
+            reg.name: reg
+            for reg in registers
+            if reg.count > 0 and image.covers(reg.address, reg.count)
+        }.values(),
+        key=lambda reg: (reg.address, reg.count),
+    )
+    block = ReadBlock(image.start, image.end - image.start, tuple(members))
+    return BlockDecoder(block)
@@ -0,0 +1,202 @@
+"""Recent per-sensor history in fixed-size arrays.
+
+Each poll result used to be dropped once it was published, so nothing could
+look at the last few minutes of a sensor. :class:`RecentHistory` keeps, per
+sensor, the last ``capacity`` numeric samples in two ring buffers, an
+``array('q')`` of millisecond timestamps and an ``array('d')`` of values
+(16 bytes per sample, allocated once).
+
+Rolling ``mean``/``min``/``max`` over a time window are kept up to date
+incrementally: a running sum plus monotonic queues for the extremes, so
+every sample enters and leaves each window once and a query is O(1). A
+window is tracked from the first time it is queried (or from the start when
+listed in ``windows``).
+
+Timestamps are seconds on the ``time.monotonic`` clock, the clock the
+register image records reads with.
+"""
+
+from __future__ import annotations
+
+import logging
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 720
+
+
+def _ms(timestamp: float) -> int:
+    return int(round(timestamp * 1000))
+
+
+class _Window:
+    """Incremental statistics of the samples newer than ``span`` ms."""
+
+    __slots__ = ("span", "start", "total", "count", "lows", "highs")
+
+    def __init__(self, span: int, start: int) -> None:
+        self.span = span
+        self.start = start  # sequence number of the oldest sample inside
+        self.total = 0.0
+        self.count = 0
+        self.lows: Deque[int] = deque()
+        self.highs: Deque[int] = deque()
+
+
+class SensorHistory:
+    """Ring buffer of one sensor's samples with rolling window statistics."""
+
+    def __init__(
+        self, capacity: int = DEFAULT_CAPACITY, windows: Iterable[float] = ()
+    ) -> None:
+        self.capacity = capacity
+        self.times = array("q", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self._next = 0  # sequence number of the next sample
+        self._windows: Dict[int, _Window] = {}
+        for window in windows:
+            self._window(_ms(window))
+
+    def __len__(self) -> int:
+        return min(self._next, self.capacity)
+
+    @property
+    def _oldest(self) -> int:
+        return self._next - len(self)
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """Return the newest ``(timestamp, value)`` or ``None``."""
+        if not self._next:
+            return None
+        slot = (self._next - 1) % self.capacity
+        return self.times[slot] / 1000, self.values[slot]
+
+    def append(self, timestamp: float, value: float) -> bool:
+        """Add a sample; older or repeated timestamps are ignored."""
+        at = _ms(timestamp)
+        if self._next and at <= self.times[(self._next - 1) % self.capacity]:
+            return False
+        seq = self._next
+        for window in self._windows.values():
+            # The slot about to be reused may still be inside the window.
+            if window.count and window.start == seq - self.capacity:
+                self._drop(window)
+        slot = seq % self.capacity
+        self.times[slot] = at
+        self.values[slot] = value
+        self._next += 1
+        for window in self._windows.values():
+            self._push(window, seq, value)
+            self._evict(window, at)
+        return True
+
+    def _push(self, window: _Window, seq: int, value: float) -> None:
+        window.total += value
+        window.count += 1
+        values, capacity = self.values, self.capacity
+        while window.lows and values[window.lows[-1] % capacity] >= value:
+            window.lows.pop()
+        window.lows.append(seq)
+        while window.highs and values[window.highs[-1] % capacity] <= value:
+            window.highs.pop()
+        window.highs.append(seq)
+
+    def _drop(self, window: _Window) -> None:
+        """Remove the oldest sample from *window*."""
+        seq = window.start
+        window.total -= self.values[seq % self.capacity]
+        window.count -= 1
+        if window.lows[0] == seq:
+            window.lows.popleft()
+        if window.highs[0] == seq:
+            window.highs.popleft()
+        window.start += 1
+        if not window.count:
+            # Reset the running sum so rounding errors do not accumulate.
+            window.total = 0.0
+
+    def _evict(self, window: _Window, now: int) -> None:
+        cutoff = now - window.span
+        while window.count and self.times[window.start % self.capacity] < cutoff:
+            self._drop(window)
+
+    def _window(self, span: int) -> _Window:
+        window = self._windows.get(span)
+        if window is None:
+            window = self._windows[span] = _Window(span, self._oldest)
+            for seq in range(self._oldest, self._next):
+                self._push(window, seq, self.values[seq % self.capacity])
+        return window
+
+    def stats(
+        self, window: float, now: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return ``count``/``mean``/``min``/``max`` of the last *window* seconds.
+
+        The window ends at *now*, or at the newest sample. ``None`` when the
+        window holds no samples.
+        """
+
+        tracked = self._window(_ms(window))
+        if now is not None:
+            self._evict(tracked, _ms(now))
+        elif self._next:
+            self._evict(tracked, self.times[(self._next - 1) % self.capacity])
+        if not tracked.count:
+            return None
+        return {
+            "count": tracked.count,
+            "mean": tracked.total / tracked.count,
+            "min": self.values[tracked.lows[0] % self.capacity],
+            "max": self.values[tracked.highs[0] % self.capacity],
+        }
+
+    def series(self, since: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Return the samples oldest first, optionally only newer than *since*."""
+        cutoff = None if since is None else _ms(since)
+        points = []
+        for seq in range(self._oldest, self._next):
+            slot = seq % self.capacity
+            if cutoff is None or self.times[slot] > cutoff:
+                points.append((self.times[slot] / 1000, self.values[slot]))
+        return points
+
+
+class RecentHistory:
+    """:class:`SensorHistory` per slug, created on the first numeric value."""
+
+    def __init__(
+        self, capacity: int = DEFAULT_CAPACITY, windows: Iterable[float] = ()
+    ) -> None:
+        self.capacity = capacity
+        self.windows = tuple(windows)
+        self._sensors: Dict[str, SensorHistory] = {}
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self._sensors
+
+    def sensor(self, slug: str) -> Optional[SensorHistory]:
+        return self._sensors.get(slug)
+
+    def add(self, slug: str, timestamp: float, value: Any) -> bool:
+        """Record *value* if it is a number; returns whether it was stored."""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        sensor = self._sensors.get(slug)
+        if sensor is None:
+            sensor = self._sensors[slug] = SensorHistory(self.capacity, self.windows)
+        return sensor.append(timestamp, float(value))
+
+    def record(self, values: Dict[str, Any], timestamp: float) -> None:
+        """Record every numeric value of a sample taken at *timestamp*."""
+        for slug, value in values.items():
+            self.add(slug, timestamp, value)
+
+    def stats(
+        self, slug: str, window: float, now: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        sensor = self._sensors.get(slug)
+        return None if sensor is None else sensor.stats(window, now)
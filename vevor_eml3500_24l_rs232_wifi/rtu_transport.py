@@ -0,0 +1,288 @@
+"""Lightweight Modbus RTU-over-TCP transport built on asyncio.
+
+The pymodbus client allocates several request, response and framer objects
+per transaction, which shows up on the small armv7/armhf boards the add-on
+runs on. This module implements just what the inverter needs (FC03, FC06 and
+FC16) on top of an :class:`asyncio.Protocol`: frames are built into a single
+``bytes`` object, CRCs are computed with a precomputed table and responses
+are parsed from a ``memoryview`` straight into an ``array('H')``.
+
+:class:`NativeRTUClient` mirrors the subset of the pymodbus client API used by
+:class:`~.modbus_client.ModbusRTUOverTCPClient`, so either can be plugged in.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from array import array
+import logging
+import socket
+import struct
+import sys
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+READ_HOLDING_REGISTERS = 0x03
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+# Same default as the pymodbus client, well below the kernel SYN timeout.
+DEFAULT_CONNECT_TIMEOUT = 3.0
+
+_SWAP_WORDS = sys.byteorder == "little"
+
+
+def _build_crc_table() -> array:
+    table = array("H")
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_TABLE = _build_crc_table()
+
+
+def crc16(data: bytes | bytearray | memoryview) -> int:
+    """Return the Modbus CRC16 of *data*."""
+    crc = 0xFFFF
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _frame(pdu: bytes) -> bytes:
+    return pdu + struct.pack("<H", crc16(pdu))
+
+
+def build_read_request(slave: int, address: int, count: int) -> bytes:
+    """Build an FC03 read holding registers request."""
+    return _frame(struct.pack(">BBHH", slave, READ_HOLDING_REGISTERS, address, count))
+
+
+def build_write_single_request(slave: int, address: int, value: int) -> bytes:
+    """Build an FC06 write single register request."""
+    return _frame(
+        struct.pack(">BBHH", slave, WRITE_SINGLE_REGISTER, address, value & 0xFFFF)
+    )
+
+
+def build_write_multiple_request(
+    slave: int, address: int, values: Sequence[int]
+) -> bytes:
+    """Build an FC16 write multiple registers request."""
+    words = array("H", (value & 0xFFFF for value in values))
+    if _SWAP_WORDS:
+        words.byteswap()
+    header = struct.pack(
+        ">BBHHB",
+        slave,
+        WRITE_MULTIPLE_REGISTERS,
+        address,
+        len(words),
+        len(words) * 2,
+    )
+    return _frame(header + words.tobytes())
+
+
+def words_from_bytes(data: bytes | memoryview) -> array:
+    """Convert big-endian register bytes into an ``array('H')``."""
+    words = array("H")
+    words.frombytes(data)
+    if _SWAP_WORDS:
+        words.byteswap()
+    return words
+
+
+class FrameError(ConnectionError):
+    """Raised for corrupted, truncated or unexpected RTU frames."""
+
+
+class RTUResponse:
+    """Minimal response object compatible with the pymodbus client API."""
+
+    __slots__ = ("function_code", "address", "registers", "exception_code")
+
+    def __init__(
+        self,
+        function_code: int,
+        registers: Optional[array] = None,
+        exception_code: Optional[int] = None,
+        address: Optional[int] = None,
+    ) -> None:
+        self.function_code = function_code
+        self.registers = registers if registers is not None else array("H")
+        self.exception_code = exception_code
+        self.address = address
+
+    def isError(self) -> bool:  # noqa: N802 - mirrors pymodbus
+        return self.exception_code is not None
+
+    def __repr__(self) -> str:
+        if self.exception_code is not None:
+            return (
+                f"ExceptionResponse(fc=0x{self.function_code:02X},"
+                f" code=0x{self.exception_code:02X})"
+            )
+        return (
+            f"RTUResponse(fc=0x{self.function_code:02X},"
+            f" {len(self.registers)} words)"
+        )
+
+
+def expected_length(frame: bytes | bytearray | memoryview) -> Optional[int]:
+    """Return the full length of the response starting *frame*, if known yet."""
+    if len(frame) < 2:
+        return None
+    function_code = frame[1]
+    if function_code & 0x80:
+        return 5
+    if function_code == READ_HOLDING_REGISTERS:
+        if len(frame) < 3:
+            return None
+        return 5 + frame[2]
+    if function_code in (WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_REGISTERS):
+        return 8
+    raise FrameError(f"Unsupported function code 0x{function_code:02X}")
+
+
+def parse_response(frame: memoryview, slave: int, function_code: int) -> RTUResponse:
+    """Validate a complete response frame and decode it."""
+    body = frame[:-2]
+    received_crc = frame[-2] | (frame[-1] << 8)
+    if crc16(body) != received_crc:
+        raise FrameError("CRC mismatch in response")
+    if frame[0] != slave:
+        raise FrameError(f"Response from unexpected slave {frame[0]}")
+    if frame[1] & 0x80:
+        return RTUResponse(frame[1] & 0x7F, exception_code=frame[2])
+    if frame[1] != function_code:
+        raise FrameError(f"Unexpected function code 0x{frame[1]:02X}")
+    if function_code == READ_HOLDING_REGISTERS:
+        return RTUResponse(function_code, words_from_bytes(body[3:]))
+    address = (frame[2] << 8) | frame[3]
+    return RTUResponse(function_code, address=address)
+
+
+class RTUFrameProtocol(asyncio.Protocol):
+    """Send one request at a time and resolve it with the parsed response."""
+
+    def __init__(self) -> None:
+        self.transport: Optional[asyncio.Transport] = None
+        self._buffer = bytearray()
+        self._pending: Optional[asyncio.Future] = None
+        self._slave = 0
+        self._function_code = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            except OSError as err:  # pragma: no cover - platform specific
+                logger.debug("Could not tune bridge socket: %s", err)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.transport = None
+        self._fail(ConnectionError(f"Connection to bridge lost: {exc}"))
+
+    def data_received(self, data: bytes) -> None:
+        if self._pending is None or self._pending.done():
+            # Late answer to a request that already timed out.
+            self._buffer.clear()
+            return
+        self._buffer += data
+        try:
+            length = expected_length(self._buffer)
+            if length is None or len(self._buffer) < length:
+                return
+            # Parse a copy: views into the buffer would stay exported through
+            # the FrameError traceback and make the buffer impossible to resize.
+            response = parse_response(
+                memoryview(bytes(self._buffer[:length])),
+                self._slave,
+                self._function_code,
+            )
+        except FrameError as err:
+            self._buffer.clear()
+            self._fail(err)
+            return
+        del self._buffer[:length]
+        self._pending.set_result(response)
+
+    def request(self, frame: bytes) -> asyncio.Future:
+        """Send *frame* and return a future resolved with the response."""
+        if self.transport is None:
+            raise ConnectionError("Not connected to bridge")
+        if self._pending is not None and not self._pending.done():
+            raise RuntimeError("A request is already in flight")
+        self._buffer.clear()
+        self._slave = frame[0]
+        self._function_code = frame[1]
+        self._pending = asyncio.get_running_loop().create_future()
+        self.transport.write(frame)
+        return self._pending
+
+    def _fail(self, exc: Exception) -> None:
+        if self._pending is not None and not self._pending.done():
+            self._pending.set_exception(exc)
+
+
+class NativeRTUClient:
+    """Asyncio RTU-over-TCP client exposing the pymodbus calls we use."""
+
+    def __init__(
+        self, host: str, port: int = 502, timeout: float = DEFAULT_CONNECT_TIMEOUT
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._protocol: Optional[RTUFrameProtocol] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._protocol is not None and self._protocol.transport is not None
+
+    async def connect(self) -> bool:
+        if self.connected:
+            return True
+        loop = asyncio.get_running_loop()
+        _, protocol = await asyncio.wait_for(
+            loop.create_connection(RTUFrameProtocol, self.host, self.port),
+            self.timeout,
+        )
+        self._protocol = protocol
+        return True
+
+    def close(self) -> None:
+        if self._protocol is not None and self._protocol.transport is not None:
+            self._protocol.transport.close()
+        self._protocol = None
+
+    async def _request(self, frame: bytes) -> RTUResponse:
+        if self._protocol is None:
+            raise ConnectionError("Not connected to bridge")
+        return await self._protocol.request(frame)
+
+    async def read_holding_registers(
+        self, address: int, *, count: int = 1, slave: int = 1
+    ) -> RTUResponse:
+        return await self._request(build_read_request(slave, address, count))
+
+    async def write_register(
+        self, address: int, value: int, *, slave: int = 1
+    ) -> RTUResponse:
+        return await self._request(build_write_single_request(slave, address, value))
+
+    async def write_registers(
+        self, address: int, values: Sequence[int], *, slave: int = 1
+    ) -> RTUResponse:
+        return await self._request(
+            build_write_multiple_request(slave, address, values)
+        )
@@ -11,6 +11,65 @@ MQTT_USER="$(bashio::config 'mqtt.username')"
 MQTT_PASS="$(bashio::config 'mqtt.password')"
 MQTT_KEEPALIVE="$(bashio::config 'mqtt.keepalive')"
 
+EXTRA_ARGS=()
+if bashio::config.has_value 'read_max_gap'; then
+    EXTRA_ARGS+=(--read-max-gap "$(bashio::config 'read_max_gap')")
+fi
+if bashio::config.has_value 'config_refresh_interval'; then
+    EXTRA_ARGS+=(--config-refresh-interval "$(bashio::config 'config_refresh_interval')")
+fi
+if bashio::config.has_value 'bridge_failure_threshold'; then
+    EXTRA_ARGS+=(--failure-threshold "$(bashio::config 'bridge_failure_threshold')")
+fi
+if bashio::config.has_value 'modbus_transport'; then
+    EXTRA_ARGS+=(--modbus-transport "$(bashio::config 'modbus_transport')")
+fi
+if bashio::config.has_value 'state_heartbeat_interval'; then
+    EXTRA_ARGS+=(--heartbeat-interval "$(bashio::config 'state_heartbeat_interval')")
+fi
+if bashio::config.has_value 'discovery_mode'; then
+    EXTRA_ARGS+=(--discovery-mode "$(bashio::config 'discovery_mode')")
+fi
+if bashio::config.has_value 'state_topics'; then
+    EXTRA_ARGS+=(--state-topics "$(bashio::config 'state_topics')")
+fi
+if bashio::config.has_value 'fast_lane_interval'; then
+    EXTRA_ARGS+=(--fast-lane-interval "$(bashio::config 'fast_lane_interval')")
+fi
+if bashio::config.has_value 'energy_flush_interval'; then
+    EXTRA_ARGS+=(--energy-flush-interval "$(bashio::config 'energy_flush_interval')")
+fi
+if bashio::config.has_value 'energy_max_gap'; then
+    EXTRA_ARGS+=(--energy-max-gap "$(bashio::config 'energy_max_gap')")
+fi
+if bashio::config.has_value 'history_buffer_max_mb'; then
+    EXTRA_ARGS+=(--history-buffer-max-mb "$(bashio::config 'history_buffer_max_mb')")
+fi
+if bashio::config.has_value 'history_buffer_max_age_hours'; then
+    EXTRA_ARGS+=(--history-buffer-max-age "$(bashio::config 'history_buffer_max_age_hours')")
+fi
+if bashio::config.has_value 'mqtt.rate_limit'; then
+    EXTRA_ARGS+=(--mqtt-rate-limit "$(bashio::config 'mqtt.rate_limit')")
+fi
+if bashio::config.true 'history_store'; then
+    EXTRA_ARGS+=(--history-store /data/history.sqlite3)
+fi
+if bashio::config.true 'metrics'; then
+    EXTRA_ARGS+=(--metrics-port 9105)
+fi
+if HA_VERSION="$(bashio::core.version 2>/dev/null)" && [ -n "${HA_VERSION}" ]; then
+    EXTRA_ARGS+=(--ha-version "${HA_VERSION}")
+fi
+while read -r override; do
+    [ -n "${override}" ] && EXTRA_ARGS+=(--poll-class "${override}")
+done <<< "$(bashio::config 'poll_class_overrides')"
+while read -r deadband; do
+    [ -n "${deadband}" ] && EXTRA_ARGS+=(--deadband "${deadband}")
+done <<< "$(bashio::config 'publish_deadbands')"
+while read -r retention; do
+    [ -n "${retention}" ] && EXTRA_ARGS+=(--history-retention "${retention}")
+done <<< "$(bashio::config 'history_retention')"
+
 bashio::log.info "Starting VEVOR EML3500-24L poller"
 exec python3 -m vevor_eml3500_24l_rs232_wifi.poller \
     --bridge-host "${BRIDGE_HOST}" \
@@ -20,4 +79,9 @@ exec python3 -m vevor_eml3500_24l_rs232_wifi.poller \
     --mqtt-port "${MQTT_PORT}" \
     --mqtt-username "${MQTT_USER}" \
     --mqtt-password "${MQTT_PASS}" \
-    --mqtt-keepalive "${MQTT_KEEPALIVE}"
+    --mqtt-keepalive "${MQTT_KEEPALIVE}" \
+    --discovery-cache /data/discovery_cache.json \
+    --energy-state-dir /data \
+    --history-buffer-dir /data/history_buffer \
+    --instrumentation-dir /share/vevor_eml3500 \
+    "${EXTRA_ARGS[@]}"
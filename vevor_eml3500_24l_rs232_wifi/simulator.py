@@ -0,0 +1,389 @@
+"""Local EML3500-24L stand-in speaking Modbus RTU over TCP.
+
+The simulator serves the holding registers described by the register CSV
+behind the same raw RTU framing the RS232-to-WiFi bridge forwards, so
+:class:`~.modbus_client.ModbusRTUOverTCPClient` and ``poller.main`` can be
+exercised without an inverter. It enforces the access column of the CSV and
+answers invalid writes with the vendor exception codes from
+``vevor_eml3500_24l_modbus_error_codes.csv``:
+
+* ``01H`` for writes to read-only or reserved registers,
+* ``03H`` for values outside the range documented in the register remark,
+* ``07H`` for registers that only accept writes outside off-grid mode.
+
+Reads of write-only or unknown addresses are answered with the standard
+``02H`` (illegal data address), as the vendor table only covers writes.
+An optional baud rate adds the time the frames would spend on the serial
+link, so latency measurements resemble the real bridge.
+
+Run ``python -m vevor_eml3500_24l_rs232_wifi.simulator --port 5020`` and
+point ``--bridge-host``/``--bridge-port`` at it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from array import array
+import contextlib
+import csv
+from dataclasses import dataclass
+import logging
+from pathlib import Path
+import re
+import struct
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from .modbus_client import (
+    DEFAULT_REGISTER_CSV,
+    RegisterDefinition,
+    decode_words,
+    load_register_definitions,
+)
+from .rtu_transport import (
+    READ_HOLDING_REGISTERS,
+    WRITE_MULTIPLE_REGISTERS,
+    WRITE_SINGLE_REGISTER,
+    crc16,
+    words_from_bytes,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ERROR_CODE_CSV = (
+    Path(__file__).resolve().parent.parent
+    / "docs"
+    / "vevor_eml3500_24l_modbus_error_codes.csv"
+)
+
+EXC_ILLEGAL_FUNCTION = 0x01
+EXC_READ_ONLY = 0x01
+EXC_ILLEGAL_ADDRESS = 0x02
+EXC_OUT_OF_RANGE = 0x03
+EXC_MODE_LOCKED = 0x07
+
+WORKING_MODE = "Working mode"
+OFF_GRID_MODE = 3
+
+# Start bit, eight data bits and one stop bit per byte on the serial link.
+BITS_PER_BYTE = 10
+
+_ENUM_RE = re.compile(r"(?:^|[|;\s])\s*(\d+)\s*(?:x\s*([0-9A-Fa-f]+))?\s*[:：]")
+_RANGE_RE = re.compile(
+    r"range:\s*(\d+(?:\.\d+)?)\s*[^\d\s~]*\s*~\s*(\d+(?:\.\d+)?)\s*[^\d\s]*\s*$",
+    re.IGNORECASE,
+)
+
+
+def load_error_codes(csv_path: Path = DEFAULT_ERROR_CODE_CSV) -> Dict[int, str]:
+    """Load the vendor exception codes (``01H`` -> 1) and their meaning."""
+    codes: Dict[int, str] = {}
+    with csv_path.open(newline="") as csvfile:
+        for row in csv.DictReader(csvfile):
+            code = (row.get("Code") or "").strip().rstrip("Hh")
+            if code:
+                codes[int(code, 16)] = (row.get("Explain") or "").strip()
+    return codes
+
+
+@dataclass(frozen=True)
+class WriteRule:
+    """Constraints applied to writes of a single-word register."""
+
+    allowed: Optional[FrozenSet[int]] = None
+    value_range: Optional[Tuple[int, int]] = None
+    off_grid_locked: bool = False
+
+    def accepts(self, raw: int) -> bool:
+        if self.allowed is not None:
+            return raw in self.allowed
+        if self.value_range is not None:
+            low, high = self.value_range
+            return low <= raw <= high
+        return True
+
+
+def parse_write_rule(reg: RegisterDefinition) -> WriteRule:
+    """Derive the accepted values of *reg* from its CSV remark.
+
+    Enumerations such as ``0: off | 1: on`` become a set of allowed raw values
+    and literal ranges such as ``Range: 1 ~ 900 min`` a raw range. Ranges that
+    depend on other settings (``Range: C ~ (A-1v)``) are not checked.
+    """
+
+    remark = reg.remark
+    off_grid_locked = "non-off-grid mode" in remark
+    allowed = set()
+    for match in _ENUM_RE.finditer(remark):
+        number, hex_digits = match.groups()
+        allowed.add(int(hex_digits, 16) if hex_digits else int(number))
+    if allowed:
+        return WriteRule(frozenset(allowed), off_grid_locked=off_grid_locked)
+    first = remark.split("|", 1)[0]
+    match = _RANGE_RE.search(first)
+    if match:
+        scale = reg.scale or 1.0
+        low = round(float(match.group(1)) / scale)
+        high = round(float(match.group(2)) / scale)
+        if "Set to 0" in remark:
+            low = 0
+        return WriteRule(value_range=(low, high), off_grid_locked=off_grid_locked)
+    return WriteRule(off_grid_locked=off_grid_locked)
+
+
+def encode_value(reg: RegisterDefinition, value: float | str) -> array:
+    """Encode a scaled value into the raw words of *reg*."""
+    words = array("H", [0] * reg.count)
+    if reg.data_format in {"ASC", "ASCII"}:
+        data = str(value).encode("ascii")[: reg.count * 2]
+        return words_from_bytes(data.ljust(reg.count * 2, b"\x00"))
+    raw = round(float(value) / (reg.scale or 1.0))
+    if reg.data_format == "ULong":
+        raw &= 0xFFFFFFFF
+        words[0], words[1] = raw >> 16, raw & 0xFFFF
+    else:
+        words[0] = raw & 0xFFFF
+    return words
+
+
+def frame_time(size: int, baudrate: Optional[int]) -> float:
+    """Return the seconds *size* bytes take on a serial link at *baudrate*."""
+    if not baudrate:
+        return 0.0
+    return size * BITS_PER_BYTE / baudrate
+
+
+def _frame(pdu: bytes) -> bytes:
+    return pdu + struct.pack("<H", crc16(pdu))
+
+
+class InverterSimulator:
+    """Serve the inverter register map over Modbus RTU over TCP."""
+
+    def __init__(
+        self,
+        register_csv: Path = DEFAULT_REGISTER_CSV,
+        unit: int = 1,
+        baudrate: Optional[int] = None,
+        turnaround: float = 0.0,
+    ) -> None:
+        self.unit = unit
+        self.baudrate = baudrate
+        self.turnaround = turnaround
+        self.registers = load_register_definitions(register_csv)
+        self.access: Dict[int, str] = {}
+        with register_csv.open(newline="") as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get("Data name") and (row.get("Address") or "").isdigit():
+                    access = (row.get("Read/Write") or "").strip()
+                    self.access[int(row["Address"])] = access
+        self.image = array("H", [0] * (max(self.access) + 1))
+        self.rules: Dict[int, WriteRule] = {
+            reg.address: parse_write_rule(reg)
+            for reg in self.registers.values()
+            if "W" in reg.access and reg.count == 1
+        }
+        self.requests = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    # ------------------------------------------------------------------
+    # Register image
+    # ------------------------------------------------------------------
+    def set_value(self, name: str, value: float | str) -> None:
+        """Store the scaled *value* of register *name*."""
+        reg = self.registers[name]
+        self.image[reg.address : reg.address + reg.count] = encode_value(reg, value)
+
+    def set_values(self, values: Dict[str, float | str]) -> None:
+        for name, value in values.items():
+            self.set_value(name, value)
+
+    def get_value(self, name: str) -> float | str:
+        """Return the decoded value of register *name*."""
+        reg = self.registers[name]
+        return decode_words(reg, self.image[reg.address : reg.address + reg.count])
+
+    @property
+    def off_grid(self) -> bool:
+        reg = self.registers.get(WORKING_MODE)
+        return reg is not None and self.image[reg.address] == OFF_GRID_MODE
+
+    # ------------------------------------------------------------------
+    # Request handling
+    # ------------------------------------------------------------------
+    def _check_read(self, address: int, count: int) -> Optional[int]:
+        if not 1 <= count <= 125:
+            return EXC_OUT_OF_RANGE
+        for addr in range(address, address + count):
+            access = self.access.get(addr)
+            if access is None or access == "W":
+                return EXC_ILLEGAL_ADDRESS
+        return None
+
+    def _check_write(self, address: int, values: Iterable[int]) -> Optional[int]:
+        for offset, raw in enumerate(values):
+            addr = address + offset
+            access = self.access.get(addr)
+            if access is None:
+                return EXC_ILLEGAL_ADDRESS
+            if "W" not in access:
+                return EXC_READ_ONLY
+            rule = self.rules.get(addr)
+            if rule is None:
+                continue
+            if rule.off_grid_locked and self.off_grid:
+                return EXC_MODE_LOCKED
+            if not rule.accepts(raw):
+                return EXC_OUT_OF_RANGE
+        return None
+
+    def handle_pdu(self, function_code: int, body: bytes) -> bytes:
+        """Return the response PDU (without slave id and CRC) for a request."""
+        self.requests += 1
+        if function_code == READ_HOLDING_REGISTERS:
+            address, count = struct.unpack(">HH", body[:4])
+            error = self._check_read(address, count)
+            if error is not None:
+                return bytes((function_code | 0x80, error))
+            words = self.image[address : address + count]
+            return struct.pack(f">BB{count}H", function_code, count * 2, *words)
+        if function_code == WRITE_SINGLE_REGISTER:
+            address, value = struct.unpack(">HH", body[:4])
+            error = self._check_write(address, (value,))
+            if error is not None:
+                return bytes((function_code | 0x80, error))
+            self.image[address] = value
+            return bytes((function_code,)) + body[:4]
+        if function_code == WRITE_MULTIPLE_REGISTERS:
+            address, count, size = struct.unpack(">HHB", body[:5])
+            values = words_from_bytes(body[5 : 5 + size])
+            if len(values) != count:
+                return bytes((function_code | 0x80, EXC_OUT_OF_RANGE))
+            error = self._check_write(address, values)
+            if error is not None:
+                return bytes((function_code | 0x80, error))
+            self.image[address : address + count] = values
+            return bytes((function_code,)) + body[:4]
+        return bytes((function_code | 0x80, EXC_ILLEGAL_FUNCTION))
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(2)
+                function_code = header[1]
+                if function_code in (READ_HOLDING_REGISTERS, WRITE_SINGLE_REGISTER):
+                    rest = await reader.readexactly(6)
+                elif function_code == WRITE_MULTIPLE_REGISTERS:
+                    rest = await reader.readexactly(5)
+                    rest += await reader.readexactly(rest[4] + 2)
+                else:
+                    # The frame length is unknown, so the stream cannot be
+                    # resynchronised; drop the connection like a confused
+                    # serial bridge would.
+                    logger.warning("Unsupported function code %d", function_code)
+                    break
+                request = header + rest
+                if crc16(request[:-2]) != struct.unpack("<H", request[-2:])[0]:
+                    logger.debug("Dropping request with bad CRC")
+                    continue
+                if header[0] != self.unit:
+                    continue
+                response = _frame(
+                    bytes((self.unit,)) + self.handle_pdu(function_code, rest[:-2])
+                )
+                delay = (
+                    frame_time(len(request), self.baudrate)
+                    + self.turnaround
+                    + frame_time(len(response), self.baudrate)
+                )
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening and return the bound TCP port."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            writers = list(self._writers)
+            for writer in writers:
+                writer.close()
+            # Let the handlers see EOF and finish before the loop shuts down.
+            for writer in writers:
+                with contextlib.suppress(ConnectionError):
+                    await writer.wait_closed()
+            await asyncio.sleep(0)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "InverterSimulator":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    @property
+    def port(self) -> Optional[int]:
+        if self._server is None:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    simulator = InverterSimulator(
+        unit=args.unit, baudrate=args.baudrate, turnaround=args.turnaround
+    )
+    for item in args.set:
+        name, _, value = item.partition("=")
+        try:
+            simulator.set_value(name, float(value))
+        except ValueError:
+            simulator.set_value(name, value)
+    port = await simulator.start(args.host, args.port)
+    logger.info("Simulator listening on %s:%d", args.host, port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VEVOR EML3500 simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--unit", type=int, default=1)
+    parser.add_argument(
+        "--baudrate",
+        type=int,
+        default=9600,
+        help="Serial baud rate to mimic (0 disables the frame delay)",
+    )
+    parser.add_argument(
+        "--turnaround",
+        type=float,
+        default=0.02,
+        help="Seconds the inverter takes to start answering a request",
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Initial scaled value of a register, by CSV data name",
+    )
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,252 @@
+"""Change-driven publishing of entity state topics.
+
+Publishing every retained state topic on every poll cycle floods the broker
+and the Home Assistant recorder with identical values. :class:`StatePublisher`
+remembers the last payload sent per topic and only publishes a value again
+when it moved by more than the deadband of its sensor, picked by
+``device_class`` or, failing that, by unit. A full refresh of every topic is
+sent on the first cycle after (re)connecting and then every
+``heartbeat_interval`` seconds.
+
+With *groups* the publisher instead sends a few retained JSON topics,
+``<prefix>/state/<group>``, each holding every entity of its group; a group
+is republished when any of its entities changed, and Home Assistant picks
+the values out with a ``value_template``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEARTBEAT_INTERVAL = 600.0
+
+STATE_GROUP_TELEMETRY = "telemetry"
+STATE_GROUP_SETTINGS = "settings"
+STATE_GROUP_ENERGY = "energy"
+STATE_GROUP_DIAGNOSTICS = "diagnostics"
+STATE_GROUPS = (
+    STATE_GROUP_TELEMETRY,
+    STATE_GROUP_SETTINGS,
+    STATE_GROUP_ENERGY,
+    STATE_GROUP_DIAGNOSTICS,
+)
+
+# Keys are Home Assistant device classes or units of measurement.
+DEFAULT_DEADBANDS: Dict[str, float] = {
+    "power": 5.0,
+    "apparent_power": 5.0,
+    "voltage": 0.5,
+    "current": 0.1,
+    "frequency": 0.05,
+    "temperature": 0.5,
+    "battery": 1.0,
+    "energy": 0.01,
+    "W": 5.0,
+    "VA": 5.0,
+    "V": 0.5,
+    "A": 0.1,
+    "Hz": 0.05,
+    "°C": 0.5,
+    "%": 1.0,
+    "kWh": 0.01,
+}
+
+
+def parse_deadband_overrides(items: Iterable[str]) -> Dict[str, float]:
+    """Parse ``key=value`` strings (device class or unit) into deadbands.
+
+    Raises ``ValueError`` for malformed entries or negative deadbands.
+    """
+
+    deadbands: Dict[str, float] = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        key = key.strip()
+        if not sep or not key:
+            raise ValueError(f"Invalid deadband {item!r}")
+        try:
+            deadband = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid deadband value in {item!r}") from None
+        if deadband < 0:
+            raise ValueError(f"Deadband for {key} must not be negative")
+        deadbands[key] = deadband
+    return deadbands
+
+
+def group_topic(prefix: str, group: str) -> str:
+    """Return the retained JSON state topic of *group*."""
+    return f"{prefix}/state/{group}"
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+class StatePublisher:
+    """Publish ``<prefix>/<slug>`` state topics only when they change.
+
+    *groups* maps slugs to a state group and switches to grouped topics;
+    slugs missing from it go to the telemetry group.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str,
+        sensors: Dict[str, Dict[str, Any]],
+        deadbands: Optional[Dict[str, float]] = None,
+        heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+        groups: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.groups = None if groups is None else dict(groups)
+        self._members: Dict[str, List[str]] = {}
+        for slug, group in (self.groups or {}).items():
+            self._members.setdefault(group, []).append(slug)
+        self._values: Dict[str, Any] = {}
+        self.heartbeat_interval = heartbeat_interval
+        self._clock = clock
+        merged = {**DEFAULT_DEADBANDS, **(deadbands or {})}
+        self._deadbands: Dict[str, float] = {}
+        for slug, info in sensors.items():
+            if info.get("writable"):
+                # Settings are echoed back exactly after a user change.
+                continue
+            for key in (info.get("device_class"), info.get("unit")):
+                if key in merged:
+                    self._deadbands[slug] = merged[key]
+                    break
+        self._last_payload: Dict[str, str] = {}
+        self._last_number: Dict[str, float] = {}
+        self._last_full: Optional[float] = None
+        self.published = 0
+        self.suppressed = 0
+
+    def reset(self, client: Any = None) -> None:
+        """Forget what was sent; the next :meth:`publish` refreshes everything."""
+        if client is not None:
+            self.client = client
+        self._last_payload.clear()
+        self._last_number.clear()
+        self._last_full = None
+
+    def remember(self, data: Dict[str, Any]) -> None:
+        """Record values published outside the publisher (command echoes).
+
+        Grouped entities do not read the per-slug echo, so their groups are
+        republished instead.
+        """
+        if self.groups is not None:
+            self._publish_groups(data, {self._group(slug) for slug in data})
+            return
+        for slug, value in data.items():
+            self._store(slug, value, self._payload(value))
+
+    def _group(self, slug: str) -> str:
+        group = self.groups.get(slug)
+        if group is None:
+            group = self.groups[slug] = STATE_GROUP_TELEMETRY
+            self._members.setdefault(group, []).append(slug)
+        return group
+
+    def _publish_groups(self, data: Dict[str, Any], groups: Iterable[str]) -> int:
+        self._values.update(data)
+        sent = 0
+        for group in sorted(groups):
+            values = {slug: self._values.get(slug) for slug in self._members[group]}
+            self.client.publish(
+                group_topic(self.prefix, group), json.dumps(values), retain=True
+            )
+            for slug, value in values.items():
+                self._store(slug, value, self._payload(value))
+            sent += 1
+        return sent
+
+    @staticmethod
+    def _payload(value: Any) -> str:
+        return "unknown" if value is None else str(value)
+
+    def _store(self, slug: str, value: Any, payload: str) -> None:
+        self._last_payload[slug] = payload
+        number = _as_number(value)
+        if number is None:
+            self._last_number.pop(slug, None)
+        else:
+            self._last_number[slug] = number
+
+    def _changed(self, slug: str, value: Any, payload: str) -> bool:
+        last = self._last_payload.get(slug)
+        if last is None:
+            return True
+        if last == payload:
+            return False
+        deadband = self._deadbands.get(slug)
+        number = _as_number(value)
+        previous = self._last_number.get(slug)
+        if not deadband or number is None or previous is None:
+            return True
+        return abs(number - previous) >= deadband
+
+    def publish(self, data: Dict[str, Any], force: bool = False) -> int:
+        """Publish changed state topics and return how many were sent.
+
+        The telemetry JSON is sent whenever any state topic other than
+        ``last_update`` was published. In grouped mode the return value is
+        the number of group topics sent and no telemetry JSON is published.
+        """
+
+        now = self._clock()
+        full = (
+            force
+            or self._last_full is None
+            or not self.heartbeat_interval
+            or now - self._last_full >= self.heartbeat_interval
+        )
+        if full:
+            self._last_full = now
+        if self.groups is not None:
+            return self._publish_changed_groups(data, full)
+        sent = 0
+        telemetry = full
+        for slug, value in data.items():
+            payload = self._payload(value)
+            if not full and not self._changed(slug, value, payload):
+                self.suppressed += 1
+                continue
+            self.client.publish(f"{self.prefix}/{slug}", payload, retain=True)
+            self._store(slug, value, payload)
+            sent += 1
+            if slug != "last_update":
+                telemetry = True
+        if telemetry:
+            self.client.publish(
+                f"{self.prefix}/telemetry", json.dumps(data), retain=False
+            )
+        self.published += sent
+        logger.debug("Published %d of %d state topics", sent, len(data))
+        return sent
+
+    def _publish_changed_groups(self, data: Dict[str, Any], full: bool) -> int:
+        changed: set[str] = set()
+        for slug, value in data.items():
+            group = self._group(slug)
+            if group in changed:
+                continue
+            if full or self._changed(slug, value, self._payload(value)):
+                changed.add(group)
+            else:
+                self.suppressed += 1
+        sent = self._publish_groups(data, changed)
+        self.published += sent
+        logger.debug("Published %d state groups", sent)
+        return sent